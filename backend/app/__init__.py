@@ -5,13 +5,17 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 import os
 from config import config
+from app.utils.db_profiles import RoutingSession, configure_database
+from app.utils.serializers import FastJSONProvider
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 
 def create_app(config_name='development'):
     app = Flask(__name__)
+    # 安装了 orjson 时 jsonify 使用 orjson 编码
+    app.json = FastJSONProvider(app)
     
     # Configuration
     if config_name == 'development':
@@ -20,11 +24,14 @@ def create_app(config_name='development'):
     elif config_name == 'testing':
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         app.config['SECRET_KEY'] = 'test-secret-key'
+        app.config['TESTING'] = True
     elif config_name == 'production':
         app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
         app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
     
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # 按数据库类型设置连接池 / SQLite pragma，并注册只读副本
+    configure_database(app)
     app.config['JWT_SECRET_KEY'] = app.config['SECRET_KEY']
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False
     
@@ -34,13 +41,18 @@ def create_app(config_name='development'):
     jwt.init_app(app)
     CORS(app)
     
+    # 请求级查询统计与 N+1 检测
+    from app.utils.query_budget import init_app as init_query_stats
+    init_query_stats(app)
+    
     # Register blueprints
-    from app.api import auth, projects, characters, comics, stories
+    from app.api import auth, projects, characters, comics, stories, images
     app.register_blueprint(auth.bp)
     app.register_blueprint(projects.bp)
     app.register_blueprint(characters.bp)
     app.register_blueprint(comics.bp)
     app.register_blueprint(stories.bp)
+    app.register_blueprint(images.bp)
     
     @app.route('/api/health')
     def health_check():
@@ -1,16 +1,22 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.character import CharacterTemplate
+from app.utils.db_profiles import read_replica
+from app.utils.query_budget import query_budget
+from app.utils.serializers import serializer_for
 from app import db
 
 bp = Blueprint('characters', __name__, url_prefix='/api/characters')
 
 @bp.route('', methods=['GET'])
 @jwt_required()
+@query_budget(1)
+@read_replica
 def get_characters():
     user_id = get_jwt_identity()
-    characters = CharacterTemplate.query.filter_by(owner_id=user_id).all()
-    return jsonify([c.to_dict() for c in characters])
+    serialize = serializer_for(CharacterTemplate)
+    rows = db.session.execute(serialize.select().where(CharacterTemplate.owner_id == user_id))
+    return jsonify(serialize.many(rows))
 
 @bp.route('', methods=['POST'])
 @jwt_required()
@@ -40,10 +46,11 @@ def create_character():
 
 @bp.route('/<int:character_id>', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_character(character_id):
     character = CharacterTemplate.query.get_or_404(character_id)
     
-    if character.owner_id != get_jwt_identity():
+    if str(character.owner_id) != str(get_jwt_identity()):
         return jsonify({'error': '无权限访问'}), 403
     
     return jsonify(character.to_dict())
@@ -53,7 +60,7 @@ def get_character(character_id):
 def update_character(character_id):
     character = CharacterTemplate.query.get_or_404(character_id)
     
-    if character.owner_id != get_jwt_identity():
+    if str(character.owner_id) != str(get_jwt_identity()):
         return jsonify({'error': '只有所有者可以编辑角色模板'}), 403
     
     data = request.get_json()
@@ -82,7 +89,7 @@ def update_character(character_id):
 def delete_character(character_id):
     character = CharacterTemplate.query.get_or_404(character_id)
     
-    if character.owner_id != get_jwt_identity():
+    if str(character.owner_id) != str(get_jwt_identity()):
         return jsonify({'error': '只有所有者可以删除角色模板'}), 403
     
     try:
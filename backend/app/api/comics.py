@@ -1,13 +1,36 @@
-from flask import Blueprint, request, jsonify
+import os
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import bindparam, select, update
 from app.models.comic import ComicImage
 from app.models.project import Project
-from app.models.character import CharacterTemplate
+from app.models.job import GenerationJob
+from app.services.derivatives import derivative_urls
 from app.services.gemini import get_gemini_service
+from app.services.http import transport_stats
+from app.services.jobs import enqueue_job
+from app.services.providers import get_provider_router
+from app.services.rate_limit import rate_limit_stats
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, page_size
+from app.utils.db_profiles import read_replica
+from app.utils.query_budget import query_budget
+from app.utils.serializers import iter_json_array, parse_fields, serializer_for
 from app import db
 
 bp = Blueprint('comics', __name__, url_prefix='/api/comics')
 
+# 不分页时逐批从数据库读取的行数
+LIST_BATCH_SIZE = 500
+PANEL_PAGE_SIZE = 200
+PANEL_MAX_PAGE_SIZE = 1000
+# 批量布局修改单次请求的最大条数
+LAYOUT_BATCH_MAX = int(os.getenv('LAYOUT_BATCH_MAX', '1000'))
+LAYOUT_FIELDS = ('position_x', 'position_y', 'width', 'height', 'layer_order')
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
 @bp.route('', methods=['POST'])
 @jwt_required()
 def create_comic_image():
@@ -16,9 +39,10 @@ def create_comic_image():
     
     if not data or not all(k in data for k in ('project_id', 'prompt')):
         return jsonify({'error': '缺少必要字段'}), 400
+    if any(not _is_int(data[field]) for field in LAYOUT_FIELDS if field in data):
+        return jsonify({'error': '位置、尺寸与图层顺序必须为整数'}), 400
     
-    project = Project.query.get(data['project_id'])
-    if not project or not project.has_access(user_id):
+    if not Project.check_access(data['project_id'], user_id):
         return jsonify({'error': '无权限访问项目'}), 403
     
     comic_image = ComicImage(
@@ -26,6 +50,8 @@ def create_comic_image():
         prompt=data['prompt'],
         character_template_id=data.get('character_template_id'),
         image_url=data.get('image_url'),
+        # 只记录本地已有的衍生图，不访问持久存储、不在请求线程中缩放
+        derivatives=derivative_urls(data.get('image_url'), render=False),
         midjourney_task_id=data.get('midjourney_task_id'),
         position_x=data.get('position_x', 0),
         position_y=data.get('position_y', 0),
@@ -45,41 +71,95 @@ def create_comic_image():
 
 @bp.route('/<int:image_id>', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_comic_image(image_id):
     comic_image = ComicImage.query.get_or_404(image_id)
     
-    if not comic_image.project.has_access(get_jwt_identity()):
+    if not Project.check_access(comic_image.project_id, get_jwt_identity()):
         return jsonify({'error': '无权限访问'}), 403
     
     return jsonify(comic_image.to_dict())
 
+@bp.route('/<int:image_id>/derivatives', methods=['GET'])
+@jwt_required()
+def get_comic_image_derivatives(image_id):
+    """获取缩略图，缺失时按需生成 (用于衍生图流水线之前保存的图片)"""
+    comic_image = ComicImage.query.get_or_404(image_id)
+    
+    if not Project.check_access(comic_image.project_id, get_jwt_identity()):
+        return jsonify({'error': '无权限访问'}), 403
+    
+    derivatives = derivative_urls(comic_image.image_url)
+    if derivatives != (comic_image.derivatives or {}):
+        comic_image.derivatives = derivatives
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': '更新缩略图失败'}), 500
+    
+    return jsonify({'id': comic_image.id, 'image_url': comic_image.image_url, 'derivatives': derivatives})
+
 @bp.route('/project/<int:project_id>', methods=['GET'])
 @jwt_required()
+@query_budget(3)
+@read_replica
 def get_project_comics(project_id):
     project = Project.query.get_or_404(project_id)
     
     if not project.has_access(get_jwt_identity()):
         return jsonify({'error': '无权限访问项目'}), 403
     
-    comic_images = ComicImage.query.filter_by(project_id=project_id).order_by(ComicImage.layer_order).all()
-    return jsonify([c.to_dict() for c in comic_images])
+    try:
+        serialize = serializer_for(ComicImage, parse_fields(ComicImage, request.args.get('fields')))
+    except KeyError as e:
+        return jsonify({'error': f"未知字段: {e.args[0]}"}), 400
+    
+    headers = {'X-Accel-Buffering': 'no'}
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    if paginated:
+        try:
+            cursor = decode_cursor(request.args.get('cursor'), 2)
+            after = (int(cursor[0]), int(cursor[1])) if cursor is not None else None
+        except (InvalidCursor, ValueError, TypeError):
+            return jsonify({'error': '无效的分页游标'}), 400
+        
+        limit = page_size(request.args.get('limit'), PANEL_PAGE_SIZE, PANEL_MAX_PAGE_SIZE)
+        query = ComicImage.project_listing_query(serialize, project_id, after)
+        rows = db.session.execute(query.limit(limit + 1)).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            # 下一页游标放在响应头中，响应体保持为数组
+            headers['X-Next-Cursor'] = encode_cursor(rows[-1].layer_order, rows[-1].id)
+            headers['Access-Control-Expose-Headers'] = 'X-Next-Cursor'
+    else:
+        query = ComicImage.project_listing_query(serialize, project_id)
+        rows = db.session.execute(query.execution_options(yield_per=LIST_BATCH_SIZE))
+    
+    return Response(
+        stream_with_context(iter_json_array(rows, serialize)), mimetype='application/json', headers=headers
+    )
 
 @bp.route('/<int:image_id>', methods=['PUT'])
 @jwt_required()
 def update_comic_image(image_id):
     comic_image = ComicImage.query.get_or_404(image_id)
     
-    if not comic_image.project.has_access(get_jwt_identity()):
+    if not Project.check_access(comic_image.project_id, get_jwt_identity()):
         return jsonify({'error': '无权限访问'}), 403
     
     data = request.get_json()
     if not data:
         return jsonify({'error': '无效请求数据'}), 400
+    # layer_order 为 NULL 时无法与 (layer_order, id) 分页游标对应
+    if any(not _is_int(data[field]) for field in LAYOUT_FIELDS if field in data):
+        return jsonify({'error': '位置、尺寸与图层顺序必须为整数'}), 400
     
     if 'prompt' in data:
         comic_image.prompt = data['prompt']
     if 'image_url' in data:
         comic_image.image_url = data['image_url']
+        comic_image.derivatives = derivative_urls(data['image_url'], render=False)
     if 'status' in data:
         comic_image.status = data['status']
     if 'position_x' in data:
@@ -106,7 +186,7 @@ def update_comic_image(image_id):
 def delete_comic_image(image_id):
     comic_image = ComicImage.query.get_or_404(image_id)
     
-    if not comic_image.project.has_access(get_jwt_identity()):
+    if not Project.check_access(comic_image.project_id, get_jwt_identity()):
         return jsonify({'error': '无权限访问'}), 403
     
     try:
@@ -118,25 +198,107 @@ def delete_comic_image(image_id):
     
     return jsonify({'message': '漫画图片已删除'})
 
+def _apply_layout_changes(project_id, changes):
+    """
+    在一个事务中批量写入布局修改
+
+    按修改的字段组合分组，每组一条 executemany 的 UPDATE，WHERE 同时限定项目，
+    其他项目的图片不会被修改
+
+    Args:
+        changes: [{'id': 图片 ID, 字段: 整数值, ...}]，字段为 LAYOUT_FIELDS 的子集
+    """
+    table = ComicImage.__table__
+    groups = {}
+    for change in changes:
+        fields = tuple(field for field in LAYOUT_FIELDS if field in change)
+        if fields:
+            groups.setdefault(fields, []).append(
+                {'b_id': change['id'], 'b_project_id': project_id, **{f'b_{field}': change[field] for field in fields}}
+            )
+
+    for fields, params in groups.items():
+        statement = update(table).where(
+            table.c.id == bindparam('b_id'),
+            table.c.project_id == bindparam('b_project_id')
+        ).values({field: bindparam(f'b_{field}') for field in fields})
+        db.session.execute(statement, params)
+    db.session.commit()
+
+@bp.route('/project/<int:project_id>/layout', methods=['PATCH'])
+@jwt_required()
+@query_budget(8)
+def patch_project_layout(project_id):
+    """
+    批量修改图片的位置、尺寸与图层顺序
+    请求体: {"changes": [{"id", "position_x", "position_y", "width", "height", "layer_order"}, ...]}，
+    除 id 外的字段均可省略；一次查询校验所有图片属于该项目，一个事务内写入
+    """
+    if not Project.check_access(project_id, get_jwt_identity()):
+        return jsonify({'error': '无权限访问项目'}), 403
+
+    data = request.get_json()
+    changes = data.get('changes') if isinstance(data, dict) else None
+    if not isinstance(changes, list) or not changes:
+        return jsonify({'error': '缺少必要字段'}), 400
+    if len(changes) > LAYOUT_BATCH_MAX:
+        return jsonify({'error': f'单次最多修改 {LAYOUT_BATCH_MAX} 个图片'}), 400
+
+    merged = {}
+    for change in changes:
+        if not isinstance(change, dict) or not _is_int(change.get('id')):
+            return jsonify({'error': '无效的修改项'}), 400
+        if any(not _is_int(change[field]) for field in LAYOUT_FIELDS if field in change):
+            return jsonify({'error': '位置、尺寸与图层顺序必须为整数'}), 400
+        # 同一图片的多次修改按顺序合并
+        merged.setdefault(change['id'], {'id': change['id']}).update(
+            {field: change[field] for field in LAYOUT_FIELDS if field in change}
+        )
+
+    found = set(db.session.scalars(
+        select(ComicImage.id).where(ComicImage.project_id == project_id, ComicImage.id.in_(list(merged)))
+    ))
+    missing = [image_id for image_id in merged if image_id not in found]
+    if missing:
+        return jsonify({'error': '图片不属于该项目', 'ids': missing}), 400
+
+    try:
+        _apply_layout_changes(project_id, list(merged.values()))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': '更新布局失败'}), 500
+
+    return jsonify({'updated': len(merged)})
+
 @bp.route('/reorder', methods=['POST'])
 @jwt_required()
+@query_budget(4)
 def reorder_comic_images():
     data = request.get_json()
     
     if not data or 'project_id' not in data or 'image_orders' not in data:
         return jsonify({'error': '缺少必要字段'}), 400
     
-    project = Project.query.get(data['project_id'])
-    if not project or not project.has_access(get_jwt_identity()):
+    image_orders = data['image_orders']
+    if not _is_int(data['project_id']) or not isinstance(image_orders, list):
+        return jsonify({'error': '无效的排序数据'}), 400
+    if len(image_orders) > LAYOUT_BATCH_MAX:
+        return jsonify({'error': f'单次最多修改 {LAYOUT_BATCH_MAX} 个图片'}), 400
+    if any(
+        not isinstance(order_data, dict)
+        or not _is_int(order_data.get('image_id'))
+        or not _is_int(order_data.get('order'))
+        for order_data in image_orders
+    ):
+        return jsonify({'error': '图片 ID 与图层顺序必须为整数'}), 400
+    
+    if not Project.check_access(data['project_id'], get_jwt_identity()):
         return jsonify({'error': '无权限访问项目'}), 403
     
     try:
-        for order_data in data['image_orders']:
-            comic_image = ComicImage.query.get(order_data['image_id'])
-            if comic_image and comic_image.project_id == data['project_id']:
-                comic_image.layer_order = order_data['order']
-        
-        db.session.commit()
+        # 不属于该项目的图片由 UPDATE 的项目条件过滤
+        changes = [{'id': order_data['image_id'], 'layer_order': order_data['order']} for order_data in image_orders]
+        _apply_layout_changes(data['project_id'], changes)
         return jsonify({'message': '图层顺序已更新'})
     except Exception as e:
         db.session.rollback()
@@ -145,20 +307,25 @@ def reorder_comic_images():
 @bp.route('/generate', methods=['POST'])
 @jwt_required()
 def generate_comic_image():
+    user_id = get_jwt_identity()
     data = request.get_json()
     
     if not data or not data.get('prompt'):
         return jsonify({'error': 'Prompt is required'}), 400
-        
-    gemini_service = get_gemini_service()
+    
+    project_id = data.get('project_id')
+    if project_id is not None:
+        if not Project.check_access(project_id, user_id):
+            return jsonify({'error': '无权限访问项目'}), 403
+    
     try:
-        character_template = None
-        if data.get('character_template_id'):
-            character_template = CharacterTemplate.query.get(data['character_template_id'])
-        
-        # 使用 Gemini 生成图片
-        result = gemini_service.generate_image(data['prompt'], character_template)
-        return jsonify(result)
+        # 入队后立即返回任务 ID，由 worker 异步生成
+        job = enqueue_job('generate_image', {
+            'prompt': data['prompt'],
+            'character_template_id': data.get('character_template_id'),
+            'bypass_cache': bool(data.get('bypass_cache'))
+        }, user_id=user_id, project_id=project_id)
+        return jsonify(job.to_dict()), 202
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -167,10 +334,49 @@ def generate_comic_image():
 @bp.route('/status/<task_id>', methods=['GET'])
 @jwt_required()
 def check_generation_status(task_id):
+    user_id = get_jwt_identity()
+    job = db.session.get(GenerationJob, task_id)
+    
+    if job:
+        if str(job.user_id) != str(user_id) and not (job.project_id and Project.check_access(job.project_id, user_id)):
+            return jsonify({'error': '无权限访问'}), 403
+        return jsonify(job.to_dict())
+    
+    # 兼容旧的同步生成结果 (gemini-/mock- 前缀的任务 ID)
     gemini_service = get_gemini_service()
     try:
-        # 使用 Gemini 检查任务状态
         result = gemini_service.check_task_status(task_id)
         return jsonify(result)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def get_generation_cache_stats():
+    """图像生成缓存命中统计 (当前进程)"""
+    image_cache = get_gemini_service().image_cache
+    if not image_cache:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **image_cache.stats()})
+
+
+@bp.route('/transport/stats', methods=['GET'])
+@jwt_required()
+def get_transport_stats():
+    """上游 HTTP 连接复用统计 (当前进程)"""
+    return jsonify(transport_stats())
+
+
+@bp.route('/ratelimit/stats', methods=['GET'])
+@jwt_required()
+def get_rate_limit_stats():
+    """上游调用配额与自适应并发状态 (当前进程)"""
+    return jsonify(rate_limit_stats())
+
+
+@bp.route('/providers/stats', methods=['GET'])
+@jwt_required()
+def get_provider_stats():
+    """各图像生成后端的耗时分位数、错误率与对冲统计 (当前进程)"""
+    return jsonify(get_provider_router().stats())
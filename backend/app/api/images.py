@@ -0,0 +1,50 @@
+from flask import Blueprint, abort, redirect, send_file
+from app.services.image_store import get_image_store
+import hashlib
+import os
+
+bp = Blueprint('images', __name__, url_prefix='/api/images')
+
+# 内容哈希命名的图片永不变化，可长期缓存
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# 旧版随机文件名的图片
+LEGACY_MAX_AGE = int(os.getenv('IMAGE_LEGACY_MAX_AGE', str(24 * 3600)))
+# 本节点缺少文件时: proxy 从持久存储读穿透到本地后返回；redirect 重定向到预签名 URL
+IMAGE_SERVE_MODE = os.getenv('IMAGE_SERVE_MODE', 'proxy').lower()
+# 重定向响应的缓存时间，需短于预签名 URL 的有效期
+REDIRECT_MAX_AGE = int(os.getenv('IMAGE_REDIRECT_MAX_AGE', '300'))
+
+@bp.route('/<path:filename>', methods=['GET', 'HEAD'])
+def serve_image(filename):
+    """
+    提供生成的图片 (本节点缓存未命中时从持久存储读取)
+    支持 If-None-Match / If-Modified-Since (304) 与 Range 请求；
+    文件体由 WSGI 服务器的 file_wrapper 发送 (gunicorn 下为 sendfile 零拷贝)
+    """
+    store = get_image_store()
+    path = store.resolve(filename)
+    if path is None:
+        abort(404)
+
+    if not path.is_file():
+        if IMAGE_SERVE_MODE == 'redirect':
+            url = store.read_url(filename)
+            if url:
+                response = redirect(url, 302)
+                response.headers['Cache-Control'] = f'private, max-age={REDIRECT_MAX_AGE}'
+                return response
+        path = store.ensure_local(filename)
+        if path is None:
+            abort(404)
+
+    if store.is_content_addressed(path.name):
+        # 文件名与内容一一对应，直接作为强 ETag，无需读取文件
+        etag = hashlib.sha256(path.name.encode('utf-8')).hexdigest()[:32]
+        response = send_file(path, conditional=True, etag=etag, max_age=IMMUTABLE_MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response = send_file(path, conditional=True, etag=True, max_age=LEGACY_MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={LEGACY_MAX_AGE}'
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
@@ -1,36 +1,78 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import func
+from datetime import datetime
+from sqlalchemy import and_, or_, type_coerce
 from app.models.project import Project
-from app.models.comic import ComicImage
 from app.models.user import User
+from app.services.compositor import COMPOSITOR_AVAILABLE, ExportError, render_project
+from app.services.project_archive import archive_pages, iter_project_archive
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, page_size
+from app.utils.db_profiles import read_replica
+from app.utils.query_budget import query_budget
+from app.utils.serializers import serializer_for
 from app import db
 
 bp = Blueprint('projects', __name__, url_prefix='/api/projects')
 
 @bp.route('', methods=['GET'])
 @jwt_required()
+@query_budget(1)
+@read_replica
 def get_projects():
     user_id = get_jwt_identity()
     
-    # 使用聚合查询获取项目及其图片数量，解决 N+1 问题
-    results = db.session.query(
-        Project,
-        func.count(ComicImage.id).label('image_count')
-    ).outerjoin(
-        ComicImage, Project.id == ComicImage.project_id
-    ).filter(
-        Project.owner_id == user_id
-    ).group_by(Project.id).all()
-    
-    projects_data = []
-    for project, image_count in results:
-        # 使用更新后的 to_dict 方法传入预先计算的 count，避免 N+1
-        # collaborators_count 暂时仍使用默认行为 (len)，如需优化可同样处理
-        data = project.to_dict(comic_images_count=image_count)
-        projects_data.append(data)
-    
-    return jsonify(projects_data)
+    # 图片数与协作者数在同一条查询中计算，只查询输出的列，不构建 ORM 对象
+    serialize = serializer_for(Project)
+    rows = db.session.execute(serialize.select().where(Project.owner_id == user_id))
+    return jsonify(serialize.many(rows))
+
+def _seek_timestamp(value):
+    """
+    游标中的 updated_at 转为比较值
+    SQLite 以文本保存时间 (server_default 为 'YYYY-MM-DD HH:MM:SS')，直接按相同格式的字符串比较；
+    绑定 datetime 会被格式化为带微秒的文本，与库中的值无法相等
+    按会话实际路由到的引擎判断方言 (@read_replica 接口为只读副本，可能与主库类型不同)
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return type_coerce(value, db.String)
+    return datetime.fromisoformat(value)
+
+@bp.route('/dashboard', methods=['GET'])
+@jwt_required()
+@query_budget(1)
+@read_replica
+def get_dashboard():
+    """
+    项目面板：自己拥有及参与协作的项目，按最近更新倒序
+    单条查询返回项目、图片数、协作者数与角色；按 (updated_at, id) 游标分页 (?cursor=&limit=)
+    """
+    user_id = int(get_jwt_identity())
+    limit = page_size(request.args.get('limit'))
+    
+    query = Project.dashboard_query(user_id)
+    try:
+        cursor = decode_cursor(request.args.get('cursor'), 2)
+        if cursor is not None:
+            updated_at, last_id = _seek_timestamp(cursor[0]), int(cursor[1])
+            query = query.where(or_(
+                Project.updated_at < updated_at,
+                and_(Project.updated_at == updated_at, Project.id < last_id)
+            ))
+    except (InvalidCursor, ValueError, TypeError):
+        return jsonify({'error': '无效的分页游标'}), 400
+    
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    projects_data = serializer_for(Project, Project.DASHBOARD_FIELDS).many(rows)
+    
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.updated_at.isoformat(sep=' ') if last.updated_at else None, last.id)
+    
+    return jsonify({'projects': projects_data, 'next_cursor': next_cursor})
 
 @bp.route('', methods=['POST'])
 @jwt_required()
@@ -59,6 +101,8 @@ def create_project():
 
 @bp.route('/<int:project_id>', methods=['GET'])
 @jwt_required()
+@query_budget(3)
+@read_replica
 def get_project(project_id):
     project = Project.query.get_or_404(project_id)
     
@@ -72,7 +116,7 @@ def get_project(project_id):
 def update_project(project_id):
     project = Project.query.get_or_404(project_id)
     
-    if project.owner_id != get_jwt_identity():
+    if str(project.owner_id) != str(get_jwt_identity()):
         return jsonify({'error': '只有项目所有者可以编辑项目'}), 403
     
     data = request.get_json()
@@ -97,7 +141,7 @@ def update_project(project_id):
 def delete_project(project_id):
     project = Project.query.get_or_404(project_id)
     
-    if project.owner_id != get_jwt_identity():
+    if str(project.owner_id) != str(get_jwt_identity()):
         return jsonify({'error': '只有项目所有者可以删除项目'}), 403
     
     try:
@@ -107,4 +151,62 @@ def delete_project(project_id):
         db.session.rollback()
         return jsonify({'error': '删除项目失败'}), 500
     
-    return jsonify({'message': '项目已删除'})
\ No newline at end of file
+    return jsonify({'message': '项目已删除'})
+
+@bp.route('/<int:project_id>/export', methods=['GET'])
+@jwt_required()
+def export_project(project_id):
+    """把画布合成为 PNG 或多页 PDF，未变化的画布直接返回缓存 (支持 If-None-Match)"""
+    project = Project.query.get_or_404(project_id)
+    
+    if not project.has_access(get_jwt_identity()):
+        return jsonify({'error': '无权限访问'}), 403
+    
+    if not COMPOSITOR_AVAILABLE:
+        return jsonify({'error': '服务器未安装 Pillow，无法导出'}), 501
+    
+    fmt = request.args.get('format', 'png').lower()
+    try:
+        scale = float(request.args.get('scale', 1))
+        page_height = int(request.args['page_height']) if request.args.get('page_height') else None
+    except ValueError:
+        return jsonify({'error': '无效的导出参数'}), 400
+    
+    try:
+        path, fingerprint = render_project(project.id, fmt, scale=scale, page_height=page_height)
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = send_file(
+        path,
+        mimetype='application/pdf' if fmt == 'pdf' else 'image/png',
+        as_attachment=request.args.get('download') in ('1', 'true'),
+        download_name=f"project-{project.id}.{fmt}",
+        conditional=True,
+        etag=fingerprint
+    )
+    # 画布可能随时变化，每次都用 ETag 重新验证
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@bp.route('/<int:project_id>/export.<any(cbz, zip):extension>', methods=['GET'])
+@jwt_required()
+def export_project_archive(project_id, extension):
+    """按分镜顺序流式打包项目图片为 CBZ / ZIP"""
+    project = Project.query.get_or_404(project_id)
+    
+    if not project.has_access(get_jwt_identity()):
+        return jsonify({'error': '无权限访问'}), 403
+    
+    # 元数据在请求上下文中一次性加载，打包过程中不再访问数据库
+    pages = archive_pages(project.id)
+    mimetype = 'application/vnd.comicbook+zip' if extension == 'cbz' else 'application/zip'
+    return Response(
+        iter_project_archive(project.name, project.description, pages),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="project-{project.id}.{extension}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
@@ -1,14 +1,24 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.project import Project
 from app.models.storyboard import Storyboard
-from app.models.comic import ComicImage
 from app.services.gemini import get_gemini_service
+from app.models.job import GenerationJob
+from app.services.events import job_channel, subscribe
+from app.services.jobs import enqueue_job
+from app.services.storyboard_sync import sync_storyboards
+from app.utils.db_profiles import read_replica
+from app.utils.query_budget import query_budget
+from app.utils.serializers import serializer_for
+from app.utils.sse import SSE_HEADERS, format_sse
 from app import db
 import uuid
 
 bp = Blueprint('stories', __name__, url_prefix='/api/stories')
 
+# SSE 保活与数据库兜底检查的间隔（秒）
+EVENT_KEEPALIVE_INTERVAL = 15
+
 @bp.route('/analyze', methods=['POST'])
 @jwt_required()
 def analyze_story():
@@ -21,42 +31,57 @@ def analyze_story():
 
     # 使用 Gemini 服务进行故事分析
     gemini_service = get_gemini_service()
-    scenes = gemini_service.analyze_story(story_text)
+    scenes = gemini_service.analyze_story(story_text, use_cache=not data.get('bypass_cache'))
         
     return jsonify({'scenes': scenes})
 
+@bp.route('/analyze/stream', methods=['POST'])
+@jwt_required()
+def analyze_story_stream():
+    """Step 1 (流式): 通过 Server-Sent Events 逐个推送分镜"""
+    data = request.get_json()
+    story_text = data.get('story_text') if data else None
+    
+    if not story_text:
+        return jsonify({'error': '请提供故事内容'}), 400
+    
+    gemini_service = get_gemini_service()
+    use_cache = not data.get('bypass_cache')
+    
+    def generate():
+        count = 0
+        try:
+            for scene in gemini_service.analyze_story_stream(story_text, use_cache=use_cache):
+                count += 1
+                yield format_sse(scene, event='scene')
+            yield format_sse({'count': count}, event='done')
+        except Exception as e:
+            yield format_sse({'error': str(e), 'count': count}, event='error')
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
 @bp.route('/save', methods=['POST'])
 @jwt_required()
+@query_budget(8)
 def save_storyboards():
-    """保存分镜脚本"""
+    """
+    保存分镜脚本 (增量)
+    与现有分镜按序号和内容指纹比对，只写入变化的行，未变化分镜的图片关联保留；
+    返回 {'changed': 新增或修改的分镜, 'deleted': 删除的分镜 ID, 'unchanged': 未变化的数量}
+    """
     user_id = get_jwt_identity()
     data = request.get_json()
     project_id = data.get('project_id')
     scenes = data.get('scenes', [])
     
-    project = Project.query.get(project_id)
-    if not project or not project.has_access(user_id):
+    if not Project.check_access(project_id, user_id):
         return jsonify({'error': '无权限访问项目'}), 403
         
     try:
-        saved_storyboards = []
-        # 先清除旧的分镜 (简单处理)
-        Storyboard.query.filter_by(project_id=project_id).delete()
-        
-        for scene in scenes:
-            storyboard = Storyboard(
-                project_id=project_id,
-                sequence=scene['sequence'],
-                description=scene['description'],
-                camera=scene.get('camera'),
-                dialogue=scene.get('dialogue'),
-                mood=scene.get('mood')
-            )
-            db.session.add(storyboard)
-            saved_storyboards.append(storyboard)
-            
-        db.session.commit()
-        return jsonify([s.to_dict() for s in saved_storyboards])
+        return jsonify(sync_storyboards(project_id, scenes))
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -64,13 +89,12 @@ def save_storyboards():
 @bp.route('/generate_all', methods=['POST'])
 @jwt_required()
 def generate_all_images():
-    """Step 3: 批量生成漫画图片 - 使用 Gemini AI"""
+    """Step 3: 批量生成漫画图片 - 提交后台任务，通过 /api/comics/status/<task_id> 查询进度"""
     user_id = get_jwt_identity()
     data = request.get_json()
     project_id = data.get('project_id')
     
-    project = Project.query.get(project_id)
-    if not project or not project.has_access(user_id):
+    if not Project.check_access(project_id, user_id):
         return jsonify({'error': '无权限访问项目'}), 403
         
     storyboards = Storyboard.query.filter_by(project_id=project_id).order_by(Storyboard.sequence).all()
@@ -78,52 +102,74 @@ def generate_all_images():
     if not storyboards:
         return jsonify({'error': '没有找到分镜脚本'}), 404
     
-    # 使用 Gemini 服务生成图片
-    gemini_service = get_gemini_service()
-    results = []
-    
+    # 入队后立即返回任务 ID，worker 以有界并发生成，每个分镜完成后单独提交
     try:
-        for sb in storyboards:
-            # 构建 Prompt (移除 Midjourney 特有的参数如 --ar 16:9)
-            full_prompt = f"{sb.description}, {sb.camera}, {sb.mood}"
-            
-            # 使用 Gemini 生成图片
-            # Gemini 的图片生成是同步的，直接返回结果
-            result = gemini_service.generate_image(full_prompt)
-            
-            image_url = result.get('image_url')
-
-            if image_url:
-                # 创建 ComicImage 记录
-                comic_image = ComicImage(
-                    project_id=project_id,
-                    prompt=full_prompt,
-                    image_url=image_url,
-                    midjourney_task_id=result.get('task_id'),  # 保留字段名以兼容
-                    position_x=0,
-                    position_y=0,
-                    width=400,
-                    height=225, # 16:9 比例
-                    layer_order=sb.sequence
-                )
-                db.session.add(comic_image)
-                db.session.flush() # 获取 ID
-                
-                # 关联到分镜
-                sb.comic_image_id = comic_image.id
-                results.append(comic_image.to_dict())
-        
-        db.session.commit()
-        return jsonify({'message': '批量生成完成', 'images': results})
-        
+        job = enqueue_job('generate_all', {
+            'project_id': project_id,
+            'concurrency': data.get('concurrency'),
+            'bypass_cache': bool(data.get('bypass_cache'))
+        }, user_id=user_id, project_id=project_id)
     except Exception as e:
-        db.session.rollback()
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+    return jsonify(job.to_dict()), 202
+
+@bp.route('/generate_all/<task_id>/events', methods=['GET'])
+@jwt_required()
+def generate_all_events(task_id):
+    """批量生成进度推送 (SSE)：先发送当前快照，之后每个分镜完成或失败时推送 panel 事件"""
+    user_id = get_jwt_identity()
+    job = db.session.get(GenerationJob, task_id)
+    
+    if not job or job.kind != 'generate_all':
+        return jsonify({'error': '任务不存在'}), 404
+    if not job.project_id or not Project.check_access(job.project_id, user_id):
+        return jsonify({'error': '无权限访问'}), 403
+    
+    def generate():
+        # 先订阅再读取快照，避免遗漏两者之间发布的事件
+        with subscribe(job_channel(task_id)) as subscription:
+            snapshot = job.to_dict()
+            db.session.rollback()
+            yield format_sse(snapshot, event='snapshot')
+            if snapshot['status'] in ('completed', 'failed'):
+                yield format_sse(snapshot, event='done')
+                return
+            
+            while True:
+                message = subscription.get(timeout=EVENT_KEEPALIVE_INTERVAL)
+                if message is not None:
+                    yield format_sse(message['data'], event=message['event'])
+                    if message['event'] == 'done':
+                        return
+                    continue
+                
+                # 超时：兜底读取数据库状态 (任务可能在其他进程内执行且无 Redis)
+                db.session.expire_all()
+                current = db.session.get(GenerationJob, task_id).to_dict()
+                db.session.rollback()
+                if current['status'] in ('completed', 'failed'):
+                    yield format_sse(current, event='done')
+                    return
+                if current['progress'] != snapshot['progress']:
+                    snapshot = current
+                    yield format_sse(current, event='snapshot')
+                else:
+                    yield ': keepalive\n\n'
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
 @bp.route('/list/<int:project_id>', methods=['GET'])
 @jwt_required()
+@query_budget(2)
+@read_replica
 def get_storyboards(project_id):
-    storyboards = Storyboard.query.filter_by(project_id=project_id).order_by(Storyboard.sequence).all()
-    return jsonify([s.to_dict() for s in storyboards])
+    if not Project.check_access(project_id, get_jwt_identity()):
+        return jsonify({'error': '无权限访问项目'}), 403
+    
+    # 关联图片的列通过 LEFT JOIN 在同一条查询中返回，不逐行懒加载
+    serialize = serializer_for(Storyboard)
+    rows = db.session.execute(Storyboard.project_listing_query(serialize, project_id))
+    return jsonify(serialize.many(rows))
@@ -1,4 +1,5 @@
 from app import db
+from app.utils.serializers import column, isoformat
 from datetime import datetime
 
 class CharacterTemplate(db.Model):
@@ -8,11 +9,20 @@ class CharacterTemplate(db.Model):
     description = db.Column(db.Text)
     features = db.Column(db.JSON)
     reference_images = db.Column(db.JSON)  # Array of image URLs
-    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     
     comic_images = db.relationship('ComicImage', backref='character_template', lazy=True)
     
+    DEFAULT_FIELDS = ('id', 'name', 'description', 'features', 'reference_images', 'owner_id', 'created_at')
+    
+    @classmethod
+    def serializer_fields(cls):
+        """行序列化器的字段声明，见 app.utils.serializers"""
+        fields = {name: column(getattr(cls, name)) for name in cls.DEFAULT_FIELDS}
+        fields['created_at'] = column(cls.created_at, isoformat)
+        return fields
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -1,22 +1,72 @@
+from sqlalchemy import and_, or_
 from app import db
+from app.utils.serializers import column, computed, isoformat, or_empty
 from datetime import datetime
 
 class ComicImage(db.Model):
     __tablename__ = 'comic_images'
+    __table_args__ = (
+        db.Index('ix_comic_images_project_layer', 'project_id', 'layer_order'),
+        db.Index('ix_comic_images_midjourney_task_id', 'midjourney_task_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
     character_template_id = db.Column(db.Integer, db.ForeignKey('character_templates.id'))
     prompt = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.String(500))
+    derivatives = db.Column(db.JSON)  # {宽度: WebP 缩略图 URL}
     midjourney_task_id = db.Column(db.String(100))
     status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
     position_x = db.Column(db.Integer, default=0)
     position_y = db.Column(db.Integer, default=0)
     width = db.Column(db.Integer, default=200)
     height = db.Column(db.Integer, default=200)
-    layer_order = db.Column(db.Integer, default=0)
+    layer_order = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 分页游标按 (layer_order, id) 定位，不允许 NULL
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     
+    # 列表接口的默认字段 (与 to_dict 一致)，fields= 另可选择 thumbnail_url
+    DEFAULT_FIELDS = (
+        'id', 'project_id', 'character_template_id', 'prompt', 'image_url', 'derivatives',
+        'midjourney_task_id', 'status', 'position_x', 'position_y',
+        'width', 'height', 'layer_order', 'created_at'
+    )
+    
+    @classmethod
+    def serializer_fields(cls):
+        """行序列化器的字段声明，见 app.utils.serializers"""
+        def thumbnail_url(row):
+            # 最小宽度的缩略图，尚无衍生图时使用原图
+            derivatives = row.derivatives
+            if derivatives:
+                return derivatives[min(derivatives, key=int)]
+            return row.image_url
+        
+        fields = {name: column(getattr(cls, name)) for name in cls.DEFAULT_FIELDS}
+        fields['derivatives'] = column(cls.derivatives, or_empty)
+        fields['created_at'] = column(cls.created_at, isoformat)
+        fields['thumbnail_url'] = computed((cls.image_url, cls.derivatives), thumbnail_url)
+        return fields
+    
+    @staticmethod
+    def project_listing_query(serialize, project_id, after=None):
+        """
+        项目画布图片列表 (GET /api/comics/project/<id>)：只查询 serialize 所需的列，
+        按 (layer_order, id) 排序，与 (project_id, layer_order) 索引一致
+        
+        Args:
+            after: 上一页最后一行的 (layer_order, id)，None 表示第一页
+        """
+        query = serialize.select(ComicImage.id, ComicImage.layer_order).where(
+            ComicImage.project_id == project_id
+        ).order_by(ComicImage.layer_order, ComicImage.id)
+        if after is not None:
+            layer_order, last_id = after
+            query = query.where(or_(
+                ComicImage.layer_order > layer_order,
+                and_(ComicImage.layer_order == layer_order, ComicImage.id > last_id)
+            ))
+        return query
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -24,6 +74,7 @@ class ComicImage(db.Model):
             'character_template_id': self.character_template_id,
             'prompt': self.prompt,
             'image_url': self.image_url,
+            'derivatives': self.derivatives or {},
             'midjourney_task_id': self.midjourney_task_id,
             'status': self.status,
             'position_x': self.position_x,
@@ -0,0 +1,41 @@
+from app import db
+from datetime import datetime
+
+class GenerationJob(db.Model):
+    __tablename__ = 'generation_jobs'
+    id = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # generate_image, generate_all
+    payload = db.Column(db.JSON)
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, completed, failed
+    progress = db.Column(db.Integer, default=0)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='SET NULL'))
+    worker_id = db.Column(db.String(100))
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)  # 重试退避后才可再次领取
+    heartbeat_at = db.Column(db.DateTime)
+    lease_expires_at = db.Column(db.DateTime)  # 可见性超时，过期后任务可被其他 worker 领取
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    project = db.relationship('Project')
+
+    def to_dict(self):
+        result = self.result or {}
+        return {
+            'task_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress or 0,
+            'error': self.error,
+            'attempts': self.attempts,
+            'image_url': result.get('image_url'),
+            'result': result,
+            'project_id': self.project_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -1,12 +1,19 @@
 from app import db
 from datetime import datetime
+from flask import g, has_request_context
+from sqlalchemy import case, func, or_, select, union
+from app.utils.serializers import column, isoformat, result_key, serializer_for
 
 project_collaborators = db.Table('project_collaborators',
     db.Column('id', db.Integer, primary_key=True),
     db.Column('project_id', db.Integer, db.ForeignKey('projects.id'), nullable=False),
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), nullable=False),
     db.Column('role', db.String(20), default='viewer'),
-    db.Column('invited_at', db.DateTime, server_default=db.func.now())
+    db.Column('invited_at', db.DateTime, server_default=db.func.now()),
+    # 权限检查按 (project_id, user_id) 走索引
+    db.Index('ix_project_collaborators_project_user', 'project_id', 'user_id', unique=True),
+    # 项目面板按用户查找参与协作的项目
+    db.Index('ix_project_collaborators_user_id', 'user_id')
 )
 
 class Project(db.Model):
@@ -14,7 +21,7 @@ class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
-    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
     
@@ -22,14 +29,100 @@ class Project(db.Model):
     collaborators = db.relationship('User', secondary=project_collaborators, backref='collaborating_projects')
     
     def has_access(self, user_id):
+        return Project.check_access(self.id, user_id, owner_id=self.owner_id)
+    
+    @staticmethod
+    def check_access(project_id, user_id, owner_id=None):
+        """
+        用户是否为项目所有者或协作者
+        使用单条 EXISTS 查询，不加载项目或协作者列表；结果在当前请求内缓存
+        
+        Args:
+            owner_id: 已知的项目所有者 ID，匹配时无需查询
+        """
         try:
             user_id = int(user_id)
         except (ValueError, TypeError):
             pass
-            
-        if self.owner_id == user_id:
+        
+        if owner_id is not None and owner_id == user_id:
             return True
-        return any(collab.id == user_id for collab in self.collaborators)
+        
+        memo = None
+        if has_request_context():
+            memo = g.setdefault('project_access', {})
+            if (project_id, user_id) in memo:
+                return memo[(project_id, user_id)]
+        
+        allowed = bool(db.session.scalar(Project.access_query(project_id, user_id)))
+        
+        if memo is not None:
+            memo[(project_id, user_id)] = allowed
+        return allowed
+    
+    @staticmethod
+    def access_query(project_id, user_id):
+        """check_access 执行的 EXISTS 查询：所有者或协作者"""
+        is_owner = select(Project.id).where(Project.id == project_id, Project.owner_id == user_id).exists()
+        is_collaborator = select(project_collaborators.c.id).where(
+            project_collaborators.c.project_id == project_id,
+            project_collaborators.c.user_id == user_id
+        ).exists()
+        return select(or_(is_owner, is_collaborator))
+    
+    # 列表接口输出的字段 (与 to_dict 一致)；项目面板额外包含当前用户的角色
+    DEFAULT_FIELDS = (
+        'id', 'name', 'description', 'owner_id', 'created_at', 'updated_at',
+        'comic_images_count', 'collaborators_count'
+    )
+    DASHBOARD_FIELDS = DEFAULT_FIELDS + ('role',)
+    
+    @classmethod
+    def serializer_fields(cls):
+        """行序列化器的字段声明，见 app.utils.serializers"""
+        image_count, collaborator_count = cls.count_columns()
+        return {
+            'id': column(cls.id),
+            'name': column(cls.name),
+            'description': column(cls.description),
+            'owner_id': column(cls.owner_id),
+            'created_at': column(cls.created_at, isoformat),
+            'updated_at': column(cls.updated_at, isoformat),
+            'comic_images_count': column(image_count),
+            'collaborators_count': column(collaborator_count),
+            'role': result_key('role'),
+        }
+    
+    @staticmethod
+    def count_columns():
+        """图片数与协作者数：按索引计数的关联子查询，与项目在同一条语句中返回"""
+        from app.models.comic import ComicImage
+        
+        image_count = select(func.count(ComicImage.id)).where(
+            ComicImage.project_id == Project.id
+        ).correlate(Project).scalar_subquery()
+        collaborator_count = select(func.count(project_collaborators.c.id)).where(
+            project_collaborators.c.project_id == Project.id
+        ).correlate(Project).scalar_subquery()
+        return image_count.label('comic_images_count'), collaborator_count.label('collaborators_count')
+    
+    @staticmethod
+    def dashboard_query(user_id):
+        """
+        用户拥有及参与协作的项目，附带图片数、协作者数与当前用户的角色
+        按 (updated_at, id) 倒序，调用方追加游标条件与 LIMIT
+        """
+        visible_ids = union(
+            select(Project.id).where(Project.owner_id == user_id),
+            select(project_collaborators.c.project_id).where(project_collaborators.c.user_id == user_id)
+        )
+        membership = project_collaborators.alias('membership')
+        role = case((Project.owner_id == user_id, 'owner'), else_=membership.c.role).label('role')
+        return serializer_for(Project, Project.DASHBOARD_FIELDS).select(role).outerjoin(
+            membership, (membership.c.project_id == Project.id) & (membership.c.user_id == user_id)
+        ).where(
+            Project.id.in_(visible_ids)
+        ).order_by(Project.updated_at.desc(), Project.id.desc())
     
     def to_dict(self, comic_images_count=None, collaborators_count=None):
         data = {
@@ -41,14 +134,15 @@ class Project(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
         
-        if comic_images_count is not None:
-            data['comic_images_count'] = comic_images_count
-        else:
-            data['comic_images_count'] = len(self.comic_images)
-            
-        if collaborators_count is not None:
-            data['collaborators_count'] = collaborators_count
-        else:
-            data['collaborators_count'] = len(self.collaborators)
+        # 未传入时用一条 COUNT 查询计算，不加载关联对象
+        if comic_images_count is None or collaborators_count is None:
+            counts = db.session.execute(
+                select(*Project.count_columns()).where(Project.id == self.id)
+            ).one()
+            comic_images_count = counts[0] if comic_images_count is None else comic_images_count
+            collaborators_count = counts[1] if collaborators_count is None else collaborators_count
+        
+        data['comic_images_count'] = comic_images_count
+        data['collaborators_count'] = collaborators_count
             
         return data
\ No newline at end of file
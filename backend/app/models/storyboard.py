@@ -1,8 +1,12 @@
 from app import db
+from app.utils.serializers import column, isoformat, or_empty
 from datetime import datetime
 
 class Storyboard(db.Model):
     __tablename__ = 'storyboards'
+    __table_args__ = (
+        db.Index('ix_storyboards_project_sequence', 'project_id', 'sequence'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
@@ -21,6 +25,34 @@ class Storyboard(db.Model):
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
     
     comic_image = db.relationship('ComicImage', backref='storyboard', uselist=False)
+    
+    DEFAULT_FIELDS = (
+        'id', 'project_id', 'sequence', 'description', 'camera', 'dialogue', 'mood',
+        'comic_image_id', 'image_url', 'image_derivatives', 'created_at'
+    )
+    
+    @classmethod
+    def serializer_fields(cls):
+        """行序列化器的字段声明 (见 app.utils.serializers)；图片字段需要查询时 LEFT JOIN comic_images"""
+        from app.models.comic import ComicImage
+        
+        fields = {
+            name: column(getattr(cls, name))
+            for name in ('id', 'project_id', 'sequence', 'description', 'camera', 'dialogue', 'mood', 'comic_image_id')
+        }
+        fields['image_url'] = column(ComicImage.image_url)
+        fields['image_derivatives'] = column(ComicImage.derivatives.label('image_derivatives'), or_empty)
+        fields['created_at'] = column(cls.created_at, isoformat)
+        return fields
+
+    @staticmethod
+    def project_listing_query(serialize, project_id):
+        """项目分镜列表 (GET /api/stories/list/<id>)：关联图片的列通过 LEFT JOIN 在同一条查询中返回"""
+        from app.models.comic import ComicImage
+        
+        return serialize.select().select_from(Storyboard).outerjoin(
+            ComicImage, Storyboard.comic_image_id == ComicImage.id
+        ).where(Storyboard.project_id == project_id).order_by(Storyboard.sequence)
 
     def to_dict(self):
         return {
@@ -33,5 +65,6 @@ class Storyboard(db.Model):
             'mood': self.mood,
             'comic_image_id': self.comic_image_id,
             'image_url': self.comic_image.image_url if self.comic_image else None,
+            'image_derivatives': (self.comic_image.derivatives or {}) if self.comic_image else {},
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
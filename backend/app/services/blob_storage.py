@@ -0,0 +1,252 @@
+"""
+Blob 存储后端模块
+图片的持久存储与各节点的本地目录解耦，多个后端副本共享同一份图片
+
+- local: 本地 / 共享挂载目录 (STORAGE_LOCAL_ROOT，默认与 IMAGE_SAVE_DIR 相同，此时上传为空操作)
+- s3: S3 兼容对象存储 (AWS S3、MinIO 等，S3_ENDPOINT_URL 可指向本地替身服务)，
+  通过 boto3 的 TransferConfig 以分块 multipart 方式流式上传 / 下载，读取可使用预签名 URL
+- 各节点的 IMAGE_SAVE_DIR 作为读穿透缓存，由 ImageStore 负责
+"""
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local').lower()
+STORAGE_LOCAL_ROOT = os.getenv('STORAGE_LOCAL_ROOT') or os.getenv('IMAGE_SAVE_DIR', 'static/images')
+
+S3_BUCKET = os.getenv('S3_BUCKET')
+S3_PREFIX = os.getenv('S3_PREFIX', 'images').strip('/')
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL') or None
+S3_REGION = os.getenv('S3_REGION') or None
+S3_PRESIGN_EXPIRY = int(os.getenv('S3_PRESIGN_EXPIRY', '3600'))
+S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', str(8 * 1024 ** 2)))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv('S3_MULTIPART_CHUNKSIZE', str(8 * 1024 ** 2)))
+S3_MAX_CONCURRENCY = int(os.getenv('S3_MAX_CONCURRENCY', '4'))
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def content_type_for(key):
+    return mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+
+class BlobBackend:
+    """Blob 存储后端接口，key 为 ImageStore 中的相对路径 (如 ab/cd/gemini-xxx.png)"""
+
+    name = None
+
+    def put_file(self, key, path, immutable=False):
+        """上传本地文件"""
+        raise NotImplementedError
+
+    def download_file(self, key, path):
+        """下载到本地路径，对象不存在时抛出 FileNotFoundError"""
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def iter_keys(self, prefix=None):
+        """
+        流式遍历对象，产出 (key, 字节数, 修改时间戳)
+
+        Args:
+            prefix: 只遍历该目录 (如 .quarantine) 下的对象；为 None 时遍历全部并跳过隐藏路径
+        """
+        raise NotImplementedError
+
+    def move(self, key, new_key):
+        """移动对象 (用于隔离)，移动后的修改时间为移动时刻"""
+        raise NotImplementedError
+
+    def read_url(self, key):
+        """可直接读取对象的 URL (预签名等)，不支持时返回 None"""
+        return None
+
+
+class LocalBackend(BlobBackend):
+    name = 'local'
+
+    def __init__(self, root=STORAGE_LOCAL_ROOT):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.root / key
+
+    def put_file(self, key, path, immutable=False):
+        target = self._path(key)
+        if Path(path).resolve() == target.resolve():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=target.parent, prefix='.upload-')
+        os.close(fd)
+        try:
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, target)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def download_file(self, key, path):
+        source = self._path(key)
+        if Path(path).resolve() == source.resolve():
+            if not source.is_file():
+                raise FileNotFoundError(key)
+            return
+        shutil.copyfile(source, path)
+
+    def exists(self, key):
+        return self._path(key).is_file()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def iter_keys(self, prefix=None):
+        top = self.root / prefix if prefix else self.root
+        for dirpath, dirnames, filenames in os.walk(top):
+            # 跳过临时目录与缓存索引等隐藏文件
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield os.path.relpath(path, self.root).replace(os.sep, '/'), stat.st_size, stat.st_mtime
+
+    def move(self, key, new_key):
+        target = self._path(new_key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self._path(key), target)
+        os.utime(target)
+
+
+class S3Backend(BlobBackend):
+    name = 's3'
+
+    def __init__(self, bucket=S3_BUCKET, prefix=S3_PREFIX, endpoint_url=S3_ENDPOINT_URL, region=S3_REGION):
+        if not bucket:
+            raise RuntimeError('STORAGE_BACKEND=s3 需要配置 S3_BUCKET')
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError('STORAGE_BACKEND=s3 需要安装 boto3')
+
+        from app.services.http import HTTP_CONNECT_TIMEOUT, HTTP_POOL_SIZE, HTTP_READ_TIMEOUT
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=Config(
+                max_pool_connections=max(HTTP_POOL_SIZE, S3_MAX_CONCURRENCY),
+                connect_timeout=HTTP_CONNECT_TIMEOUT,
+                read_timeout=HTTP_READ_TIMEOUT,
+                retries={'max_attempts': 3, 'mode': 'adaptive'},
+                # 自建 MinIO 等通常只支持 path 风格
+                s3={'addressing_style': 'path' if endpoint_url else 'auto'}
+            )
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=S3_MAX_CONCURRENCY
+        )
+
+    def _key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _is_not_found(self, error):
+        from botocore.exceptions import ClientError
+        return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def put_file(self, key, path, immutable=False):
+        extra_args = {'ContentType': content_type_for(key)}
+        if immutable:
+            extra_args['CacheControl'] = IMMUTABLE_CACHE_CONTROL
+        self.client.upload_file(str(path), self.bucket, self._key(key), ExtraArgs=extra_args, Config=self.transfer_config)
+
+    def download_file(self, key, path):
+        try:
+            self.client.download_file(self.bucket, self._key(key), str(path), Config=self.transfer_config)
+        except Exception as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError(key)
+            raise
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except Exception as e:
+            if self._is_not_found(e):
+                return False
+            raise
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def iter_keys(self, prefix=None):
+        base = f"{self.prefix}/" if self.prefix else ''
+        list_prefix = f"{base}{prefix.strip('/')}/" if prefix else base
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=list_prefix):
+            for item in page.get('Contents', []):
+                key = item['Key'][len(base):]
+                if any(part.startswith('.') for part in item['Key'][len(list_prefix):].split('/')):
+                    continue
+                yield key, item['Size'], item['LastModified'].timestamp()
+
+    def move(self, key, new_key):
+        self.client.copy_object(
+            Bucket=self.bucket, Key=self._key(new_key),
+            CopySource={'Bucket': self.bucket, 'Key': self._key(key)}
+        )
+        self.delete(key)
+
+    def read_url(self, key):
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._key(key)},
+            ExpiresIn=S3_PRESIGN_EXPIRY
+        )
+
+
+BACKEND_CLASSES = {
+    LocalBackend.name: LocalBackend,
+    S3Backend.name: S3Backend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_blob_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_class = BACKEND_CLASSES.get(STORAGE_BACKEND)
+                if backend_class is None:
+                    raise RuntimeError(f'未知的 STORAGE_BACKEND: {STORAGE_BACKEND}')
+                _backend = backend_class()
+    return _backend
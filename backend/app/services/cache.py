@@ -0,0 +1,145 @@
+"""
+共享键值缓存模块
+所有 gunicorn worker 共享同一份缓存：优先使用 Redis，不可用时退回到本地 SQLite 文件
+两种后端都支持 TTL 过期与按最近使用时间 (LRU) 淘汰，值以 JSON 存储
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from flask import current_app, has_app_context
+
+from app.services.redis_client import get_redis
+
+# 未配置时放在应用的 instance 目录下，与进程的启动目录无关
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH') or None
+
+
+class RedisCache:
+    def __init__(self, client, namespace, ttl, max_entries):
+        self.client = client
+        self.prefix = f'comic:cache:{namespace}:'
+        self.lru_key = f'comic:cache:{namespace}:__lru__'
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.client.zrem(self.lru_key, key)
+            return None
+        self.client.zadd(self.lru_key, {key: time.time()})
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ex=ttl or self.ttl)
+        pipe.zadd(self.lru_key, {key: time.time()})
+        pipe.zcard(self.lru_key)
+        size = pipe.execute()[-1]
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = [member for member, _ in self.client.zpopmin(self.lru_key, overflow)]
+            if evicted:
+                self.client.delete(*[self.prefix + member.decode() for member in evicted])
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+        self.client.zrem(self.lru_key, key)
+
+
+class SQLiteCache:
+    def __init__(self, path, namespace, ttl, max_entries):
+        self.path = Path(path)
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS kv_cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_kv_cache_lru ON kv_cache (namespace, last_used_at)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value, expires_at FROM kv_cache WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute('DELETE FROM kv_cache WHERE namespace = ? AND key = ?', (self.namespace, key))
+                return None
+            conn.execute(
+                'UPDATE kv_cache SET last_used_at = ? WHERE namespace = ? AND key = ?',
+                (now, self.namespace, key)
+            )
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO kv_cache (namespace, key, value, expires_at, last_used_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (self.namespace, key, json.dumps(value, ensure_ascii=False), now + (ttl or self.ttl), now)
+            )
+            conn.execute('DELETE FROM kv_cache WHERE namespace = ? AND expires_at < ?', (self.namespace, now))
+            conn.execute("""
+                DELETE FROM kv_cache WHERE namespace = ? AND key IN (
+                    SELECT key FROM kv_cache WHERE namespace = ?
+                    ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.namespace, self.namespace, self.max_entries))
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM kv_cache WHERE namespace = ? AND key = ?', (self.namespace, key))
+
+
+def get_cache(namespace, ttl, max_entries):
+    """
+    创建命名空间缓存
+
+    Args:
+        namespace: 缓存命名空间，不同用途的缓存互不干扰
+        ttl: 默认过期时间（秒）
+        max_entries: 最大条目数，超出后按 LRU 淘汰
+    """
+    redis_client = get_redis()
+    if redis_client is not None:
+        return RedisCache(redis_client, namespace, ttl, max_entries)
+    return SQLiteCache(_sqlite_cache_path(), namespace, ttl, max_entries)
+
+
+def _sqlite_cache_path():
+    if CACHE_DB_PATH:
+        return CACHE_DB_PATH
+    if has_app_context():
+        return os.path.join(current_app.instance_path, 'cache.db')
+    return str(Path(__file__).resolve().parents[2] / 'instance' / 'cache.db')
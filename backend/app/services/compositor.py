@@ -0,0 +1,279 @@
+"""
+画布合成导出模块
+按图层顺序把项目中的所有漫画图片合成为一张 PNG，或按页高切分为多页 PDF
+
+- 与前端画布一致：按 position/width/height 绘制，图片以 cover 方式裁剪填充，无图片的图层绘制为浅灰占位
+- 画布按水平条带 (EXPORT_TILE_HEIGHT) 逐条渲染并流式编码，内存只保留当前条带及与其相交的面板；
+  面板在线程池中并行解码、缩放，并预取下一条带需要的面板
+- 输出以 (图层列表, 图片内容哈希, 导出参数) 的指纹缓存，未变化的画布不会重复渲染
+"""
+import hashlib
+import io
+import json
+import os
+import posixpath
+import struct
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from app.models.comic import ComicImage
+from app.services.image_store import atomic_write, get_image_store
+
+try:
+    import PIL  # noqa: F401
+    COMPOSITOR_AVAILABLE = True
+except ImportError:
+    COMPOSITOR_AVAILABLE = False
+
+EXPORT_FORMATS = ('png', 'pdf')
+EXPORT_TILE_HEIGHT = int(os.getenv('EXPORT_TILE_HEIGHT', '512'))
+EXPORT_WORKERS = max(1, int(os.getenv('EXPORT_WORKERS', '4')))
+EXPORT_MAX_SCALE = float(os.getenv('EXPORT_MAX_SCALE', '4'))
+# 整个画布与单个 PDF 页面的像素上限
+EXPORT_MAX_PIXELS = int(os.getenv('EXPORT_MAX_PIXELS', str(400 * 1024 ** 2)))
+EXPORT_MAX_PAGE_PIXELS = int(os.getenv('EXPORT_MAX_PAGE_PIXELS', str(40 * 1024 ** 2)))
+EXPORT_CACHE_MAX_AGE = int(os.getenv('EXPORT_CACHE_MAX_AGE', str(7 * 24 * 3600)))
+EXPORT_JPEG_QUALITY = int(os.getenv('EXPORT_JPEG_QUALITY', '90'))
+
+_BACKGROUND = (255, 255, 255, 255)
+_PLACEHOLDER = (245, 245, 245, 255)
+_CACHE_DIR = '.exports'
+
+Panel = namedtuple('Panel', 'id x y width height relative')
+
+
+class ExportError(Exception):
+    """导出参数无效或画布过大"""
+
+
+def _load_panels(project_id, store):
+    images = ComicImage.query.filter_by(project_id=project_id).order_by(
+        ComicImage.layer_order, ComicImage.id
+    ).all()
+    return [
+        Panel(
+            image.id, image.position_x or 0, image.position_y or 0,
+            image.width or 0, image.height or 0,
+            store.relative_from_url(image.image_url)
+        )
+        for image in images
+        if (image.width or 0) > 0 and (image.height or 0) > 0
+    ]
+
+
+def _image_token(store, relative):
+    """图片内容的标识：内容寻址文件直接使用摘要，旧文件使用大小与修改时间"""
+    if relative is None:
+        return None
+    digest = store.content_digest(posixpath.basename(relative))
+    if digest:
+        return digest
+    path = store.ensure_local(relative)
+    if path is None:
+        return None
+    stat = path.stat()
+    return f"{relative}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def fingerprint(store, panels, fmt, scale, page_height):
+    raw = json.dumps({
+        'format': fmt,
+        'scale': scale,
+        'page_height': page_height,
+        'panels': [list(panel[:5]) + [_image_token(store, panel.relative)] for panel in panels]
+    }, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def _scaled(value, scale):
+    return int(round(value * scale))
+
+
+def _load_panel(store, panel, scale):
+    """解码并按 cover 方式缩放到显示尺寸"""
+    from PIL import Image, ImageOps
+
+    size = (max(1, _scaled(panel.width, scale)), max(1, _scaled(panel.height, scale)))
+    path = store.ensure_local(panel.relative) if panel.relative else None
+    if path is None:
+        return Image.new('RGBA', size, _PLACEHOLDER)
+    try:
+        with Image.open(path) as image:
+            image.draft('RGB', size)  # JPEG 可在解码时直接降采样
+            return ImageOps.fit(image.convert('RGBA'), size, Image.LANCZOS)
+    except Exception as e:
+        print(f"Compositor: failed to decode {path}: {e}")
+        return Image.new('RGBA', size, _PLACEHOLDER)
+
+
+def _render_bands(store, panels, width, height, scale, band_height):
+    """逐条带渲染画布，产出 (条带顶部 y, RGB 条带图像)"""
+    from PIL import Image
+
+    boxes = [
+        (_scaled(p.x, scale), _scaled(p.y, scale), _scaled(p.x + p.width, scale), _scaled(p.y + p.height, scale))
+        for p in panels
+    ]
+    # 按顶部 y 调度解码，按列表顺序 (图层顺序) 绘制
+    schedule = sorted(range(len(panels)), key=lambda i: boxes[i][1])
+    next_index = 0
+    loaded = {}
+
+    with ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='compositor') as pool:
+        for top in range(0, height, band_height):
+            bottom = min(height, top + band_height)
+            # 提交与本条带及下一条带相交的面板
+            while next_index < len(schedule) and boxes[schedule[next_index]][1] < bottom + band_height:
+                i = schedule[next_index]
+                loaded[i] = pool.submit(_load_panel, store, panels[i], scale)
+                next_index += 1
+
+            band = Image.new('RGBA', (width, bottom - top), _BACKGROUND)
+            for i in sorted(loaded):
+                left, panel_top, _, panel_bottom = boxes[i]
+                if panel_bottom <= top or panel_top >= bottom:
+                    continue
+                image = loaded[i].result()
+                band.alpha_composite(image, dest=(max(0, left), max(0, panel_top - top)),
+                                     source=(max(0, -left), max(0, top - panel_top)))
+
+            # 释放已完全绘制完的面板
+            for i in [i for i in loaded if boxes[i][3] <= bottom]:
+                del loaded[i]
+
+            yield top, band.convert('RGB')
+
+
+def _png_chunk(f, kind, data):
+    f.write(struct.pack('>I', len(data)))
+    f.write(kind)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+def _write_png(f, width, height, bands):
+    """按条带流式编码 PNG (RGB 8 位)，无需整张画布驻留内存"""
+    f.write(b'\x89PNG\r\n\x1a\n')
+    _png_chunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+    compressor = zlib.compressobj(6)
+    stride = width * 3
+    for _, band in bands:
+        raw = band.tobytes()
+        rows = b''.join(b'\x00' + raw[row * stride:(row + 1) * stride] for row in range(band.height))
+        data = compressor.compress(rows)
+        if data:
+            _png_chunk(f, b'IDAT', data)
+    _png_chunk(f, b'IDAT', compressor.flush())
+    _png_chunk(f, b'IEND', b'')
+
+
+def _write_pdf(f, width, height, page_height, bands):
+    """每个条带为一页，页面图像以 JPEG 嵌入，逐页写出"""
+    page_count = (height + page_height - 1) // page_height
+    offsets = {}
+
+    def begin(number):
+        offsets[number] = f.tell()
+        f.write(f"{number} 0 obj\n".encode('ascii'))
+
+    f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    begin(1)
+    f.write(b'<< /Type /Catalog /Pages 2 0 R >>\nendobj\n')
+    begin(2)
+    kids = ' '.join(f"{3 + 3 * i} 0 R" for i in range(page_count))
+    f.write(f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>\nendobj\n".encode('ascii'))
+
+    for index, (_, band) in enumerate(bands):
+        page, contents, image = 3 + 3 * index, 4 + 3 * index, 5 + 3 * index
+        # 96 DPI: 1 像素 = 0.75 pt
+        page_width_pt, page_height_pt = band.width * 0.75, band.height * 0.75
+
+        buffer = io.BytesIO()
+        band.save(buffer, 'JPEG', quality=EXPORT_JPEG_QUALITY)
+        jpeg = buffer.getvalue()
+
+        begin(page)
+        f.write((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width_pt:.2f} {page_height_pt:.2f}] "
+            f"/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {contents} 0 R >>\nendobj\n"
+        ).encode('ascii'))
+
+        stream = f"q {page_width_pt:.2f} 0 0 {page_height_pt:.2f} 0 0 cm /Im0 Do Q".encode('ascii')
+        begin(contents)
+        f.write(f"<< /Length {len(stream)} >>\nstream\n".encode('ascii') + stream + b'\nendstream\nendobj\n')
+
+        begin(image)
+        f.write((
+            f"<< /Type /XObject /Subtype /Image /Width {band.width} /Height {band.height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>\nstream\n"
+        ).encode('ascii'))
+        f.write(jpeg)
+        f.write(b'\nendstream\nendobj\n')
+
+    xref = f.tell()
+    count = 3 + 3 * page_count
+    f.write(f"xref\n0 {count}\n0000000000 65535 f \n".encode('ascii'))
+    for number in range(1, count):
+        f.write(f"{offsets[number]:010d} 00000 n \n".encode('ascii'))
+    f.write(f"trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('ascii'))
+
+
+def _prune_cache(cache_dir):
+    cutoff = time.time() - EXPORT_CACHE_MAX_AGE
+    for entry in os.scandir(cache_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def render_project(project_id, fmt='png', scale=1.0, page_height=None):
+    """
+    渲染项目画布
+
+    Args:
+        fmt: png (单张) 或 pdf (按 page_height 分页，未指定时为单页)
+        scale: 输出缩放比例
+        page_height: PDF 页高 (画布坐标，缩放前)
+
+    Returns:
+        tuple: (输出文件路径, 指纹)，指纹可作为 ETag
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f'不支持的导出格式: {fmt}')
+    if not 0 < scale <= EXPORT_MAX_SCALE:
+        raise ExportError(f'缩放比例需在 (0, {EXPORT_MAX_SCALE}] 之间')
+    if page_height is not None and page_height <= 0:
+        raise ExportError('页高必须为正数')
+
+    store = get_image_store()
+    panels = _load_panels(project_id, store)
+    width = max([_scaled(p.x + p.width, scale) for p in panels] + [1])
+    height = max([_scaled(p.y + p.height, scale) for p in panels] + [1])
+    if width * height > EXPORT_MAX_PIXELS:
+        raise ExportError('画布过大，请降低缩放比例')
+
+    if fmt == 'pdf':
+        band_height = min(height, _scaled(page_height, scale) if page_height else height)
+        if width * band_height > EXPORT_MAX_PAGE_PIXELS:
+            raise ExportError('单页过大，请指定更小的页高或降低缩放比例')
+    else:
+        band_height = EXPORT_TILE_HEIGHT
+
+    key = fingerprint(store, panels, fmt, scale, page_height)
+    cache_dir = store.root / _CACHE_DIR
+    path = cache_dir / f"{key}.{fmt}"
+    if path.is_file():
+        return path, key
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    bands = _render_bands(store, panels, width, height, scale, max(1, band_height))
+    if fmt == 'png':
+        atomic_write(path, store.temp_dir, lambda f: _write_png(f, width, height, bands))
+    else:
+        atomic_write(path, store.temp_dir, lambda f: _write_pdf(f, width, height, band_height, bands))
+    _prune_cache(cache_dir)
+    return path, key
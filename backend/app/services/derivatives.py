@@ -0,0 +1,126 @@
+"""
+图片衍生图模块
+为本地保存的漫画图片生成固定宽度的 WebP 缩略图，画布与分镜列表按显示尺寸选用，不再加载原图
+
+- 衍生图文件名为 <原文件名>.w<宽度>.webp，同样经 ImageStore 分片、原子写入并上传到持久存储
+- 缩放与编码在进程池中执行，不占用 Web / worker 进程的 GIL
+- 新图片在保存时生成；旧图片通过 GET /api/comics/<id>/derivatives 按需补生成
+- 未安装 Pillow 或图片不是本站图片 (模拟图、远端 URL) 时不生成衍生图
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.services.image_store import atomic_write, get_image_store
+
+DERIVATIVE_WIDTHS = sorted({
+    int(width) for width in os.getenv('DERIVATIVE_WIDTHS', '160,400,800').split(',') if width.strip()
+})
+DERIVATIVE_QUALITY = int(os.getenv('DERIVATIVE_QUALITY', '80'))
+DERIVATIVE_WORKERS = max(1, int(os.getenv('DERIVATIVE_WORKERS', '2')))
+
+try:
+    import PIL  # noqa: F401
+    DERIVATIVES_ENABLED = os.getenv('DERIVATIVES_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+except ImportError:
+    DERIVATIVES_ENABLED = False
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _render(source_path, targets, temp_dir, quality):
+    """
+    在子进程中生成衍生图
+
+    Args:
+        targets: [(宽度, 目标路径)]，宽度不小于原图的跳过 (不放大)
+
+    Returns:
+        list: 实际生成的宽度
+    """
+    from PIL import Image
+
+    rendered = []
+    with Image.open(source_path) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        for width, target in targets:
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            atomic_write(target, temp_dir, lambda f: resized.save(f, 'WEBP', quality=quality, method=4))
+            rendered.append(width)
+    return rendered
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawn 避免在已有线程的进程中 fork
+                _executor = ProcessPoolExecutor(
+                    max_workers=DERIVATIVE_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _executor
+
+
+def derivative_name(source_name, width):
+    return f"{source_name}.w{width}.webp"
+
+
+def derivative_urls(image_url, render=True):
+    """
+    获取图片的衍生图 URL
+
+    Args:
+        image_url: ComicImage.image_url
+        render: 为 True 时检查持久存储并在进程池中补生成缺失的衍生图；
+            为 False 时只检查本地缓存目录，不访问持久存储 (用于请求路径，缺失的由 worker
+            或 GET /api/comics/<id>/derivatives 补齐)
+
+    Returns:
+        dict: {宽度字符串: URL}，无可用衍生图时为空字典
+    """
+    if not DERIVATIVES_ENABLED or not image_url:
+        return {}
+
+    store = get_image_store()
+    relative = store.relative_from_url(image_url)
+    if relative is None:
+        return {}
+
+    source_name = Path(relative).name
+    urls = {}
+    missing = []
+    for width in DERIVATIVE_WIDTHS:
+        name = derivative_name(source_name, width)
+        if store.exists(name) if render else store.path_for(name).is_file():
+            urls[str(width)] = store.url_for(name)
+        else:
+            missing.append((width, str(store.path_for(name))))
+
+    if render and missing:
+        # 原图可能由其他节点写入，先读穿透到本地
+        source_path = store.ensure_local(relative)
+        rendered = []
+        if source_path is not None:
+            try:
+                rendered = _get_executor().submit(
+                    _render, str(source_path), missing, str(store.temp_dir), DERIVATIVE_QUALITY
+                ).result()
+            except Exception as e:
+                print(f"Derivatives: render failed for {source_path}: {e}")
+        for width in rendered:
+            name = derivative_name(source_name, width)
+            store.publish(name)
+            urls[str(width)] = store.url_for(name)
+
+    return dict(sorted(urls.items(), key=lambda item: int(item[0])))
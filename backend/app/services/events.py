@@ -0,0 +1,94 @@
+"""
+事件推送模块
+后台任务通过 publish 发布进度事件，SSE 接口通过 subscribe 订阅
+有 Redis 时使用 pub/sub 跨进程分发（worker 与 Web 进程分离部署）；
+否则退回到进程内分发，适用于在 Web 进程内运行 worker 线程的本地模式
+"""
+import json
+import queue
+import threading
+from contextlib import contextmanager
+
+from app.services.redis_client import get_redis
+
+CHANNEL_PREFIX = 'comic:events:'
+
+_local_subscribers = {}
+_local_lock = threading.Lock()
+
+
+def job_channel(job_id):
+    return f'job:{job_id}'
+
+
+def publish(channel, event, data):
+    """发布事件，失败时只记录日志，不影响任务执行"""
+    message = {'event': event, 'data': data}
+
+    redis_client = get_redis()
+    if redis_client is not None:
+        try:
+            redis_client.publish(CHANNEL_PREFIX + channel, json.dumps(message, ensure_ascii=False))
+            return
+        except Exception as e:
+            print(f"Events: Redis publish failed: {e}")
+
+    with _local_lock:
+        subscribers = list(_local_subscribers.get(channel, ()))
+    for subscriber in subscribers:
+        subscriber.queue.put(message)
+
+
+class _LocalSubscription:
+    def __init__(self, channel):
+        self.channel = channel
+        self.queue = queue.Queue()
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class _RedisSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        if not message or message.get('type') != 'message':
+            return None
+        return json.loads(message['data'])
+
+
+@contextmanager
+def subscribe(channel):
+    """
+    订阅频道
+
+    Yields:
+        subscription: 调用 subscription.get(timeout) 获取下一条事件，超时返回 None
+    """
+    redis_client = get_redis()
+    if redis_client is not None:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL_PREFIX + channel)
+        try:
+            yield _RedisSubscription(pubsub)
+        finally:
+            pubsub.close()
+        return
+
+    subscription = _LocalSubscription(channel)
+    with _local_lock:
+        _local_subscribers.setdefault(channel, []).append(subscription)
+    try:
+        yield subscription
+    finally:
+        with _local_lock:
+            subscribers = _local_subscribers.get(channel, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                _local_subscribers.pop(channel, None)
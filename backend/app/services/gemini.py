@@ -2,15 +2,53 @@
 Gemini AI 服务模块
 使用新版 google-genai SDK
 支持 gemini-3-flash-preview 模型 (文本) 和 gemini-2.5-flash-image (图像生成)
-通过环境变量配置代理
+通过环境变量配置代理，连接池与超时由共享传输层 (app.services.http) 提供
 """
 import os
 import json
 import re
-import base64
+import hashlib
+import unicodedata
 import uuid
 from pathlib import Path
 
+from app.services.cache import get_cache
+from app.services.http import HTTP_READ_TIMEOUT, genai_client_args, get_proxy
+from app.services.rate_limit import call_with_limits, rate_limited
+from app.services.image_cache import CACHE_ENABLED, ImageCache, make_cache_key
+from app.services.image_store import get_image_store
+from app.utils.json_stream import IncrementalArrayParser
+
+ANALYZE_PROMPT_TEMPLATE = """你是一位专业的漫画分镜师。请分析以下故事内容，将其拆分成适合漫画表现的分镜脚本。
+
+故事内容：
+{story_text}
+
+请按照以下JSON格式返回分镜脚本（直接返回JSON数组，不要包含其他文字）：
+[
+  {{
+    "sequence": 1,
+    "description": "详细描述这个画面的场景、人物动作、表情等，用于AI绘图",
+    "camera": "镜头类型，如：全景(Wide Shot)、中景(Medium Shot)、特写(Close Up)、仰拍(Low Angle)、俯拍(High Angle)",
+    "dialogue": "该画面中的对话或旁白，如果没有则写'无'",
+    "mood": "画面的情绪氛围，如：紧张、欢快、悲伤、神秘等"
+  }}
+]
+
+要求：
+1. 根据故事内容合理拆分，通常3-8个分镜为宜
+2. 每个分镜的description要详细具体，便于AI绘图理解
+3. 镜头类型要多样化，增加视觉变化
+4. 保持故事的连贯性和节奏感
+
+只返回JSON数组，不要有其他任何文字说明。"""
+
+# 模板内容变化时自动失效旧的分析缓存
+ANALYZE_PROMPT_VERSION = hashlib.sha256(ANALYZE_PROMPT_TEMPLATE.encode('utf-8')).hexdigest()[:12]
+
+ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', str(24 * 3600)))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '1000'))
+
 class GeminiService:
     def __init__(self):
         self.api_key = os.getenv('GEMINI_API_KEY')
@@ -18,22 +56,35 @@ class GeminiService:
         self.model_name = "gemini-3-flash-preview"
         self.image_model_name = "gemini-2.5-flash-image"
         
-        # 设置图片保存目录
-        self.image_save_dir = Path(os.getenv('IMAGE_SAVE_DIR', 'static/images'))
-        self.image_save_dir.mkdir(parents=True, exist_ok=True)
+        # 图片按哈希前缀分片保存，原子写入
+        self.image_store = get_image_store()
+        self.image_save_dir = self.image_store.root
+        
+        # 图像生成缓存 (相同模型 + prompt + 宽高比 + 角色特征 直接复用已生成的图片)
+        self.image_cache = None
+        if CACHE_ENABLED:
+            try:
+                self.image_cache = ImageCache(self.image_save_dir / '.generation_cache.db')
+            except Exception as e:
+                print(f"Gemini: Image cache disabled: {e}")
+        
+        # 分镜分析缓存 (Redis 或 SQLite，所有 worker 共享)
+        self.analysis_cache = None
+        if ANALYSIS_CACHE_TTL > 0:
+            try:
+                self.analysis_cache = get_cache('analysis', ANALYSIS_CACHE_TTL, ANALYSIS_CACHE_MAX_ENTRIES)
+            except Exception as e:
+                print(f"Gemini: Analysis cache disabled: {e}")
         
-        # 配置代理环境变量 (httpx 会自动读取)
-        http_proxy = os.getenv('HTTPS_PROXY') or os.getenv('HTTP_PROXY')
+        # 代理通过共享传输层显式传给 httpx 客户端
+        http_proxy = get_proxy()
         if http_proxy:
-            os.environ['HTTP_PROXY'] = http_proxy
-            os.environ['HTTPS_PROXY'] = http_proxy
-            os.environ['ALL_PROXY'] = http_proxy
             print(f"Gemini: Using proxy {http_proxy}")
         
         if self.api_key:
             try:
                 from google import genai
-                self.client = genai.Client(api_key=self.api_key)
+                self.client = genai.Client(api_key=self.api_key, http_options=self._build_http_options())
                 print(f"Gemini: Initialized with model {self.model_name}")
             except Exception as e:
                 print(f"Gemini: Failed to initialize client: {e}")
@@ -41,12 +92,23 @@ class GeminiService:
         else:
             print("Warning: No GEMINI_API_KEY found. Story analysis will use mock data.")
     
-    def analyze_story(self, story_text):
+    def _build_http_options(self):
+        """共享连接池、keep-alive 与超时配置"""
+        from google.genai import types
+        
+        options = {'timeout': int(HTTP_READ_TIMEOUT * 1000)}  # SDK 超时单位为毫秒
+        client_args = genai_client_args('gemini')
+        if client_args:
+            options['client_args'] = client_args
+        return types.HttpOptions(**options)
+    
+    def analyze_story(self, story_text, use_cache=True):
         """
         分析故事文本，生成分镜脚本
         
         Args:
             story_text: 用户输入的故事描述
+            use_cache: 是否使用分析缓存
             
         Returns:
             list: 分镜场景列表
@@ -54,41 +116,27 @@ class GeminiService:
         if not self.client:
             return self._mock_analyze(story_text)
         
-        prompt = f"""你是一位专业的漫画分镜师。请分析以下故事内容，将其拆分成适合漫画表现的分镜脚本。
-
-故事内容：
-{story_text}
-
-请按照以下JSON格式返回分镜脚本（直接返回JSON数组，不要包含其他文字）：
-[
-  {{
-    "sequence": 1,
-    "description": "详细描述这个画面的场景、人物动作、表情等，用于AI绘图",
-    "camera": "镜头类型，如：全景(Wide Shot)、中景(Medium Shot)、特写(Close Up)、仰拍(Low Angle)、俯拍(High Angle)",
-    "dialogue": "该画面中的对话或旁白，如果没有则写'无'",
-    "mood": "画面的情绪氛围，如：紧张、欢快、悲伤、神秘等"
-  }}
-]
-
-要求：
-1. 根据故事内容合理拆分，通常3-8个分镜为宜
-2. 每个分镜的description要详细具体，便于AI绘图理解
-3. 镜头类型要多样化，增加视觉变化
-4. 保持故事的连贯性和节奏感
-
-只返回JSON数组，不要有其他任何文字说明。"""
+        cache_key = self._analysis_cache_key(story_text)
+        if use_cache:
+            cached = self._get_cached_analysis(cache_key)
+            if cached is not None:
+                return cached
+        
+        prompt = ANALYZE_PROMPT_TEMPLATE.format(story_text=story_text)
 
         try:
-            response = self.client.models.generate_content(
+            response = call_with_limits('text', lambda: self.client.models.generate_content(
                 model=self.model_name,
                 contents=prompt
-            )
+            ))
             result_text = response.text.strip()
             
             # 尝试提取JSON
             scenes = self._parse_json_response(result_text)
             
             if scenes:
+                # 只缓存成功解析的结果，模拟数据不入缓存
+                self._set_cached_analysis(cache_key, scenes)
                 return scenes
             else:
                 print("Failed to parse Gemini response, falling back to mock")
@@ -98,6 +146,93 @@ class GeminiService:
             print(f"Gemini API error: {e}")
             return self._mock_analyze(story_text)
     
+    def analyze_story_stream(self, story_text, use_cache=True):
+        """
+        流式分析故事文本，每个分镜对象完整到达后立即产出
+        
+        Args:
+            story_text: 用户输入的故事描述
+            use_cache: 是否使用分析缓存
+            
+        Yields:
+            dict: 分镜场景
+        """
+        if not self.client:
+            yield from self._mock_analyze(story_text)
+            return
+        
+        cache_key = self._analysis_cache_key(story_text)
+        if use_cache:
+            cached = self._get_cached_analysis(cache_key)
+            if cached is not None:
+                yield from cached
+                return
+        
+        prompt = ANALYZE_PROMPT_TEMPLATE.format(story_text=story_text)
+        parser = IncrementalArrayParser()
+        scenes = []
+        chunks = []
+        
+        try:
+            with rate_limited('text'):
+                for chunk in self.client.models.generate_content_stream(
+                    model=self.model_name,
+                    contents=prompt
+                ):
+                    text = getattr(chunk, 'text', None)
+                    if not text:
+                        continue
+                    chunks.append(text)
+                    for scene in parser.feed(text):
+                        scenes.append(scene)
+                        yield scene
+        except Exception as e:
+            print(f"Gemini API stream error: {e}")
+            if scenes:
+                # 已经输出了部分分镜，无法再整体回退
+                raise
+            yield from self._mock_analyze(story_text)
+            return
+        
+        if not scenes:
+            # 增量解析失败时对完整文本再做一次兜底解析
+            scenes = self._parse_json_response(''.join(chunks).strip())
+            if not scenes:
+                print("Failed to parse Gemini stream, falling back to mock")
+                yield from self._mock_analyze(story_text)
+                return
+            yield from scenes
+        elif not parser.finished:
+            # 流在数组闭合前结束 (如输出 token 用尽)，分镜不完整，不写入缓存
+            print(f"Gemini stream ended before the scene array closed ({len(scenes)} scenes), not caching")
+            return
+        
+        self._set_cached_analysis(cache_key, scenes)
+    
+    def _analysis_cache_key(self, story_text):
+        """分析缓存键：规范化的故事文本 + 模型名 + prompt 模板版本"""
+        normalized = unicodedata.normalize('NFKC', story_text)
+        normalized = '\n'.join(' '.join(line.split()) for line in normalized.strip().splitlines() if line.strip())
+        raw = f"{self.model_name}\x00{ANALYZE_PROMPT_VERSION}\x00{normalized}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def _get_cached_analysis(self, cache_key):
+        if not self.analysis_cache:
+            return None
+        try:
+            return self.analysis_cache.get(cache_key)
+        except Exception as e:
+            print(f"Gemini: Analysis cache read failed: {e}")
+            return None
+    
+    def _set_cached_analysis(self, cache_key, scenes):
+        if not self.analysis_cache or not isinstance(scenes, list):
+            return
+        try:
+            self.analysis_cache.set(cache_key, scenes)
+        except Exception as e:
+            print(f"Gemini: Analysis cache write failed: {e}")
+    
     def _parse_json_response(self, text):
         """解析Gemini返回的JSON"""
         try:
@@ -126,18 +261,22 @@ class GeminiService:
         
         return None
     
-    def generate_image(self, prompt, character_template=None):
+    def generate_image(self, prompt, character_template=None, use_cache=True, strict=False):
         """
         使用 Gemini 生成图像
         
         Args:
             prompt: 图像描述提示词
             character_template: 可选的角色模板，用于保持角色一致性
+            use_cache: 是否使用生成缓存，为 False 时强制重新生成
+            strict: 为 True 时失败直接抛出异常，不退回模拟图片（供多后端路由使用）
             
         Returns:
             dict: 包含 image_url 和 task_id 的结果
         """
         if not self.client:
+            if strict:
+                raise RuntimeError('Gemini 客户端未初始化')
             print("Warning: No Gemini client. Using mock image generation.")
             return self._mock_generate_image(prompt)
         
@@ -147,22 +286,38 @@ class GeminiService:
         
         # 增强 prompt 以适应漫画风格
         enhanced_prompt = f"{prompt}, anime style, manga art, high quality illustration, detailed artwork"
+        aspect_ratio = "16:9"  # 漫画常用宽高比
+        
+        cache_key = None
+        if self.image_cache:
+            cache_key = make_cache_key(self.image_model_name, enhanced_prompt, aspect_ratio, character_template)
+            cached = self.image_cache.get(cache_key) if use_cache else None
+            if cached:
+                print(f"Gemini: Image cache hit {cached['image_url']}")
+                return {
+                    "task_id": Path(cached['path']).stem,
+                    "status": "completed",
+                    "image_url": cached['image_url'],
+                    "progress": 100,
+                    "cached": True
+                }
         
         try:
             from google.genai import types
             
             # 关键：必须设置 response_modalities 为 ['Image'] 才能生成图片
             # 同时设置 image_config 来控制图片宽高比
-            response = self.client.models.generate_content(
+            # 限流 + 429/5xx 退避重试
+            response = call_with_limits('image', lambda: self.client.models.generate_content(
                 model=self.image_model_name,
                 contents=enhanced_prompt,
                 config=types.GenerateContentConfig(
                     response_modalities=['Image'],
                     image_config=types.ImageConfig(
-                        aspect_ratio="16:9",  # 漫画常用宽高比
+                        aspect_ratio=aspect_ratio,
                     )
                 )
-            )
+            ))
             
             # 处理响应，提取图像
             if response.candidates and len(response.candidates) > 0:
@@ -174,25 +329,15 @@ class GeminiService:
                             image_data = part.inline_data.data
                             mime_type = getattr(part.inline_data, 'mime_type', None) or 'image/png'
                             
-                            # 生成唯一文件名
-                            task_id = f"gemini-{uuid.uuid4()}"
+                            # 按内容哈希命名，解码与原子写入在 I/O 线程池中完成
                             extension = 'png' if 'png' in mime_type else 'jpg'
-                            filename = f"{task_id}.{extension}"
-                            filepath = self.image_save_dir / filename
-                            
-                            # 保存图像文件
-                            with open(filepath, 'wb') as f:
-                                if isinstance(image_data, str):
-                                    # Base64 编码的数据
-                                    f.write(base64.b64decode(image_data))
-                                else:
-                                    # 二进制数据
-                                    f.write(image_data)
+                            filepath, image_url = self.image_store.save(image_data, extension, prefix='gemini-')
+                            task_id = filepath.stem
                             
                             print(f"Gemini: Image saved to {filepath}")
                             
-                            # 返回相对 URL 路径
-                            image_url = f"/static/images/{filename}"
+                            if cache_key:
+                                self.image_cache.put(cache_key, image_url, filepath)
                             
                             return {
                                 "task_id": task_id,
@@ -203,9 +348,13 @@ class GeminiService:
             
             # 如果没有找到图像数据
             print(f"No image data in Gemini response. Response: {response}")
+            if strict:
+                raise RuntimeError('Gemini 响应中没有图像数据')
             return self._mock_generate_image(prompt)
             
         except Exception as e:
+            if strict:
+                raise
             import traceback
             print(f"Gemini image generation error: {e}")
             traceback.print_exc()
@@ -0,0 +1,135 @@
+"""
+分镜批量出图模块
+以有界并发的方式为项目中的每个分镜生成图片
+每个分镜完成后立即提交，单个分镜失败不会回滚其他分镜
+"""
+import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app import db
+from app.models.comic import ComicImage
+from app.models.storyboard import Storyboard
+from app.services.derivatives import derivative_urls
+from app.services.providers import get_provider_router
+
+# 全局并发上限（单个进程内同时进行的图像生成调用数）
+GLOBAL_CONCURRENCY = max(1, int(os.getenv('GENERATION_GLOBAL_CONCURRENCY', '8')))
+# 单个项目的并发上限（同一项目的多个批量请求共享）
+PROJECT_CONCURRENCY = max(1, int(os.getenv('GENERATION_PROJECT_CONCURRENCY', '4')))
+
+_global_slots = threading.BoundedSemaphore(GLOBAL_CONCURRENCY)
+_project_slots = {}
+_project_slots_lock = threading.Lock()
+
+
+@contextmanager
+def _project_slot(project_id):
+    """获取项目级并发槽位，项目无活跃任务时释放对应的信号量"""
+    with _project_slots_lock:
+        entry = _project_slots.get(project_id)
+        if entry is None:
+            entry = _project_slots[project_id] = [threading.BoundedSemaphore(PROJECT_CONCURRENCY), 0]
+        entry[1] += 1
+
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _project_slots_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _project_slots.pop(project_id, None)
+
+
+def build_storyboard_prompt(storyboard):
+    """构建分镜的出图 Prompt (不包含 Midjourney 特有的参数如 --ar 16:9)"""
+    return f"{storyboard.description}, {storyboard.camera}, {storyboard.mood}"
+
+
+def _generate_panel(app, project_id, storyboard_id, sequence, prompt, use_cache=True):
+    """在工作线程中生成单个分镜的图片并立即提交"""
+    with app.app_context():
+        try:
+            with _project_slot(project_id), _global_slots:
+                result = get_provider_router().generate(prompt, use_cache=use_cache)
+
+            image_url = result.get('image_url')
+            if not image_url:
+                return sequence, storyboard_id, None, '未返回图片地址'
+
+            derivatives = result.get('derivatives') or derivative_urls(image_url)
+
+            comic_image = ComicImage(
+                project_id=project_id,
+                prompt=prompt,
+                image_url=image_url,
+                derivatives=derivatives,
+                midjourney_task_id=result.get('task_id'),  # 保留字段名以兼容
+                status='completed',
+                position_x=0,
+                position_y=0,
+                width=400,
+                height=225,  # 16:9 比例
+                layer_order=sequence
+            )
+            db.session.add(comic_image)
+            db.session.flush()  # 获取 ID
+
+            # 关联到分镜
+            storyboard = db.session.get(Storyboard, storyboard_id)
+            if storyboard:
+                storyboard.comic_image_id = comic_image.id
+
+            db.session.commit()
+            return sequence, storyboard_id, comic_image.to_dict(), None
+        except Exception as e:
+            db.session.rollback()
+            print(f"Panel generation failed (project={project_id}, sequence={sequence}): {e}")
+            return sequence, storyboard_id, None, str(e)
+
+
+def generate_storyboard_images(app, project_id, storyboards, concurrency=None, use_cache=True, on_panel=None):
+    """
+    并发生成一组分镜的图片
+
+    Args:
+        app: Flask 应用实例，工作线程需要在其上下文中访问数据库
+        project_id: 项目 ID
+        storyboards: 需要生成图片的分镜列表
+        concurrency: 本次请求的并发数，不超过 PROJECT_CONCURRENCY
+        use_cache: 是否使用图像生成缓存
+        on_panel: 可选回调 on_panel(sequence, storyboard_id, image, error)，
+            每个分镜完成时在调用线程中触发
+
+    Returns:
+        tuple: (按 sequence 排序的 ComicImage 字典列表, 失败分镜列表)
+    """
+    tasks = [(sb.id, sb.sequence, build_storyboard_prompt(sb)) for sb in storyboards]
+    if not tasks:
+        return [], []
+
+    try:
+        concurrency = int(concurrency) if concurrency else PROJECT_CONCURRENCY
+    except (TypeError, ValueError):
+        concurrency = PROJECT_CONCURRENCY
+
+    workers = max(1, min(concurrency, PROJECT_CONCURRENCY, len(tasks)))
+    outcomes = []
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'generate-{project_id}') as pool:
+        futures = [
+            pool.submit(_generate_panel, app, project_id, storyboard_id, sequence, prompt, use_cache)
+            for storyboard_id, sequence, prompt in tasks
+        ]
+        for future in as_completed(futures):
+            outcome = future.result()
+            outcomes.append(outcome)
+            if on_panel:
+                on_panel(*outcome)
+
+    outcomes.sort(key=lambda outcome: outcome[0])
+    images = [image for _, _, image, _ in outcomes if image]
+    errors = [{'sequence': sequence, 'error': error} for sequence, _, _, error in outcomes if error]
+    return images, errors
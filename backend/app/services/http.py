@@ -0,0 +1,161 @@
+"""
+共享 HTTP 传输层
+为 Gemini 与 Midjourney 服务提供进程内复用的长连接池，避免每次调用都重新进行 TCP+TLS 握手
+
+- Midjourney: 共享 requests.Session + 可配置大小的 urllib3 连接池
+- Gemini: 为 google-genai SDK 提供 httpx 客户端参数 (连接池上限、keep-alive、可用时启用 HTTP/2)
+- 连接与读取超时分别配置；统计请求数与新建连接数，用于观察连接复用率
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 每个 worker 进程内单个上游的连接池大小
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '120'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60'))
+
+_lock = threading.Lock()
+_sessions = {}
+_httpx_metrics = {}
+
+
+def get_proxy():
+    return os.getenv('HTTPS_PROXY') or os.getenv('HTTP_PROXY')
+
+
+def http_timeout(read=None):
+    """返回 requests 使用的 (连接超时, 读取超时)"""
+    return (HTTP_CONNECT_TIMEOUT, read or HTTP_READ_TIMEOUT)
+
+
+def get_http_session(name):
+    """获取指定上游共享的 requests.Session"""
+    session = _sessions.get(name)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            proxy = get_proxy()
+            if proxy:
+                session.proxies.update({'http': proxy, 'https': proxy})
+            _sessions[name] = session
+    return session
+
+
+class _HttpxMetrics:
+    """通过 httpcore 的 trace 扩展统计新建连接数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def _trace(self, event_name, info):
+        if event_name == 'connection.connect_tcp.complete':
+            with self._lock:
+                self.new_connections += 1
+
+    def on_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions['trace'] = self._trace
+
+
+def genai_client_args(name):
+    """
+    构建传给 google-genai SDK 的 httpx 客户端参数
+
+    SDK 会按 HttpOptions.timeout 为每个请求设置统一的超时，
+    因此这里的连接超时只在 SDK 未指定超时时生效
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+
+    metrics = _httpx_metrics.setdefault(name, _HttpxMetrics())
+    client_args = {
+        'limits': httpx.Limits(
+            max_connections=HTTP_POOL_SIZE,
+            max_keepalive_connections=HTTP_POOL_SIZE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        'timeout': httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        'event_hooks': {'request': [metrics.on_request]}
+    }
+
+    try:
+        import h2  # noqa: F401
+        client_args['http2'] = True
+    except ImportError:
+        pass
+
+    proxy = get_proxy()
+    if proxy:
+        client_args['proxy'] = proxy
+    return client_args
+
+
+def _pool_managers(adapter):
+    """适配器的直连连接池管理器，以及配置代理 (HTTPS_PROXY) 时按代理创建的 ProxyManager"""
+    managers = [getattr(adapter, 'poolmanager', None)]
+    managers.extend((getattr(adapter, 'proxy_manager', None) or {}).values())
+    return [manager for manager in managers if manager is not None]
+
+
+def _connection_pools(manager):
+    """连接池管理器中当前的连接池；只使用 urllib3 的公开接口，接口变化时返回空列表而不是报错"""
+    container = getattr(manager, 'pools', None)
+    try:
+        keys = list(container.keys())
+    except Exception:
+        return []
+
+    pools = []
+    for key in keys:
+        try:
+            pools.append(container[key])
+        except KeyError:
+            # 读取期间被 LRU 淘汰
+            continue
+    return pools
+
+
+def transport_stats():
+    """各上游的请求数、新建连接数与连接复用率"""
+    stats = {}
+
+    for name, session in list(_sessions.items()):
+        requests_count = connections = 0
+        for adapter in set(session.adapters.values()):
+            for manager in _pool_managers(adapter):
+                for pool in _connection_pools(manager):
+                    requests_count += getattr(pool, 'num_requests', 0)
+                    connections += getattr(pool, 'num_connections', 0)
+        stats[name] = _summarize(requests_count, connections)
+
+    for name, metrics in list(_httpx_metrics.items()):
+        stats[name] = _summarize(metrics.requests, metrics.new_connections)
+
+    return stats
+
+
+def _summarize(requests_count, connections):
+    reused = max(requests_count - connections, 0)
+    return {
+        'requests': requests_count,
+        'new_connections': connections,
+        'reused_connections': reused,
+        'reuse_rate': round(reused / requests_count, 4) if requests_count else 0.0,
+        'pool_size': HTTP_POOL_SIZE
+    }
@@ -0,0 +1,158 @@
+"""
+图像生成缓存模块
+以 (模型名, 增强后的 prompt, 宽高比, 角色模板特征) 的哈希作为键，
+命中时直接返回 IMAGE_SAVE_DIR 下已保存的图片，不再调用图像模型
+
+索引保存在图片目录旁的 SQLite 文件中，同一节点上的所有 gunicorn worker 共享。
+淘汰只删除索引记录，不删除图片文件：图片可能仍被 ComicImage 引用，
+磁盘回收由孤儿文件清理负责
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+CACHE_ENABLED = os.getenv('IMAGE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# 最大缓存总字节数与最长保留时间
+CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+CACHE_MAX_AGE = int(os.getenv('IMAGE_CACHE_MAX_AGE', str(7 * 24 * 3600)))
+
+
+def make_cache_key(model_name, prompt, aspect_ratio, character_template=None):
+    """计算生成缓存键"""
+    features = None
+    if character_template is not None:
+        features = {
+            'features': getattr(character_template, 'features', None) or {},
+            'description': getattr(character_template, 'description', None) or ''
+        }
+    raw = json.dumps([model_name, prompt, aspect_ratio, features], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ImageCache:
+    def __init__(self, index_path, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE):
+        self.index_path = Path(index_path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS generation_cache (
+                    key TEXT PRIMARY KEY,
+                    image_url TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_generation_cache_last_used ON generation_cache (last_used_at)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.index_path), timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """
+        查找缓存
+
+        Returns:
+            dict: 命中时返回 {'image_url', 'path'}，否则返回 None
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT image_url, path, created_at FROM generation_cache WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is None:
+                self._count(False)
+                return None
+
+            image_url, path, created_at = row
+            # 过期或文件已被清理时视为未命中
+            if now - created_at > self.max_age or not os.path.exists(path):
+                conn.execute('DELETE FROM generation_cache WHERE key = ?', (key,))
+                self._count(False)
+                return None
+
+            conn.execute('UPDATE generation_cache SET last_used_at = ? WHERE key = ?', (now, key))
+
+        self._count(True)
+        return {'image_url': image_url, 'path': path}
+
+    def put(self, key, image_url, path):
+        """写入缓存，并按大小与时间淘汰旧记录"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO generation_cache (key, image_url, path, size, created_at, last_used_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, image_url, str(path), size, now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM generation_cache WHERE created_at < ?', (now - self.max_age,))
+
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM generation_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # 按最近使用时间从旧到新淘汰，直到低于上限
+        doomed = []
+        for key, size in conn.execute('SELECT key, size FROM generation_cache ORDER BY last_used_at'):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM generation_cache WHERE key = ?', doomed)
+
+    def image_urls(self):
+        """遍历缓存中仍引用的图片 URL (供孤儿文件清理使用)"""
+        with self._connect() as conn:
+            for (image_url,) in conn.execute('SELECT image_url FROM generation_cache'):
+                yield image_url
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, total = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generation_cache'
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'max_age': self.max_age
+        }
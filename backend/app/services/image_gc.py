@@ -0,0 +1,277 @@
+"""
+图片孤儿文件清理与去重模块 (python manage.py gc)
+
+删除 ComicImage / 项目只删除数据库记录，图片文件会一直留在存储中；本模块负责回收：
+- 去重: 按文件大小取模分成 IMAGE_GC_DEDUP_BUCKETS 轮遍历存储，每轮只在内存中保留一个桶的键；
+  只对大小相同的文件计算内容哈希 (内容寻址的文件直接使用文件名中的摘要)，
+  字节完全相同的文件保留一份，ComicImage.image_url / derivatives 与 CharacterTemplate.reference_images
+  中的引用批量改写为保留的副本。被生成任务结果或生成缓存索引引用的文件 (这些引用不改写) 始终保留，并优先作为保留的副本
+- 生成任务的结果只在任务排队 / 执行中或结束不超过宽限期时视为引用：之后图片要么已保存为 ComicImage，
+  要么已被重新生成替换；任务表不清理，否则历史任务会让所有被替换或删除的图片永远无法回收
+- 孤儿清理: 一次性把所有被引用的文件名加载为集合，再流式遍历存储逐个比对，不对每个文件查询数据库；
+  未被引用且超过宽限期的文件被删除或移入隔离目录。衍生图随原图一起判断
+- 隔离目录中超过 IMAGE_GC_QUARANTINE_DAYS 天的文件在每次清理时永久删除
+"""
+import hashlib
+import os
+import posixpath
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, or_, update
+
+from app import db
+from app.models.character import CharacterTemplate
+from app.models.comic import ComicImage
+from app.models.job import GenerationJob
+from app.services.derivatives import derivative_urls
+from app.services.image_cache import ImageCache
+from app.services.image_store import LEGACY_URL_PREFIX, get_image_store
+
+# 新写入的文件可能尚未被数据库引用 (生成任务进行中、客户端尚未保存)，宽限期内不清理
+GC_GRACE_HOURS = float(os.getenv('IMAGE_GC_GRACE_HOURS', '24'))
+QUARANTINE_DIR = '.quarantine'
+GC_QUARANTINE_DAYS = float(os.getenv('IMAGE_GC_QUARANTINE_DAYS', '7'))
+# 去重时把存储按文件大小分成多轮遍历，内存中同时只保留一个桶的键
+GC_DEDUP_BUCKETS = max(1, int(os.getenv('IMAGE_GC_DEDUP_BUCKETS', '16')))
+
+_DERIVATIVE = re.compile(r'^(?P<source>.+)\.w\d+\.webp$')
+_HASH_CHUNK = 1024 * 1024
+
+
+def _source_name(name):
+    """衍生图对应的原图文件名，原图返回自身"""
+    match = _DERIVATIVE.match(name)
+    return match.group('source') if match else name
+
+
+def _name_collector(store, names):
+    def add(url):
+        if isinstance(url, str):
+            relative = store.relative_from_url(url)
+            if relative:
+                names.add(posixpath.basename(relative))
+    return add
+
+
+def pinned_names(store, grace_hours=GC_GRACE_HOURS):
+    """被进行中 / 近期结束的生成任务结果或生成缓存索引引用的文件名，去重时不改写这些引用"""
+    names = set()
+    add = _name_collector(store, names)
+
+    # 单张生成任务的结果在客户端保存为 ComicImage 之前只记录在任务中；批量任务的结果列出各分镜图片
+    finished_after = datetime.utcnow() - timedelta(hours=grace_hours)
+    jobs = db.session.query(GenerationJob.result).filter(
+        GenerationJob.result.isnot(None),
+        or_(
+            GenerationJob.status.in_(('queued', 'running')),
+            func.coalesce(GenerationJob.finished_at, GenerationJob.updated_at) >= finished_after
+        )
+    )
+    for (result,) in jobs.yield_per(1000):
+        result = result or {}
+        add(result.get('image_url'))
+        for image in result.get('images') or []:
+            add((image or {}).get('image_url'))
+
+    # 生成缓存命中时会直接返回已有图片
+    cache_index = store.root / '.generation_cache.db'
+    if cache_index.exists():
+        for image_url in ImageCache(cache_index).image_urls():
+            add(image_url)
+
+    return names
+
+
+def referenced_names(store, grace_hours=GC_GRACE_HOURS):
+    """所有被引用的图片文件名集合"""
+    names = pinned_names(store, grace_hours)
+    add = _name_collector(store, names)
+
+    rows = db.session.query(ComicImage.image_url).filter(ComicImage.image_url.isnot(None))
+    for (image_url,) in rows.yield_per(1000):
+        add(image_url)
+
+    for (reference_images,) in db.session.query(CharacterTemplate.reference_images).yield_per(1000):
+        for url in reference_images or []:
+            add(url)
+
+    return names
+
+
+def _file_digest(store, key):
+    digest = store.content_digest(posixpath.basename(key))
+    if digest:
+        return digest
+    path = store.ensure_local(key)
+    if path is None:
+        return None
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            sha.update(chunk)
+    return sha.hexdigest()[:32]
+
+
+def _url_variants(store, key):
+    urls = [f"{store.url_prefix}/{key}"]
+    if '/' not in key:
+        urls.append(f"{LEGACY_URL_PREFIX}/{key}")
+    return urls
+
+
+def _rewrite_references(canonical_urls):
+    """把重复文件的 URL 改写为保留副本的 URL，返回改写的记录数"""
+    rewritten = 0
+    for canonical_url, urls in canonical_urls.items():
+        rewritten += db.session.query(ComicImage).filter(
+            ComicImage.image_url.in_(urls)
+        ).update({
+            ComicImage.image_url: canonical_url,
+            ComicImage.derivatives: derivative_urls(canonical_url, render=False)
+        }, synchronize_session=False)
+
+    replacements = {url: canonical_url for canonical_url, urls in canonical_urls.items() for url in urls}
+    changed = []
+    rows = db.session.query(CharacterTemplate.id, CharacterTemplate.reference_images).filter(
+        CharacterTemplate.reference_images.isnot(None)
+    )
+    for character_id, reference_images in rows.yield_per(1000):
+        if not isinstance(reference_images, list):
+            continue
+        updated = [replacements.get(url, url) if isinstance(url, str) else url for url in reference_images]
+        if updated != reference_images:
+            changed.append({'b_id': character_id, 'reference_images': updated})
+    if changed:
+        db.session.execute(
+            update(CharacterTemplate.__table__)
+            .where(CharacterTemplate.__table__.c.id == bindparam('b_id'))
+            .values(reference_images=bindparam('reference_images')),
+            changed
+        )
+        rewritten += len(changed)
+
+    db.session.commit()
+    return rewritten
+
+
+def deduplicate(store, dry_run=False, buckets=GC_DEDUP_BUCKETS, grace_hours=GC_GRACE_HOURS):
+    """合并字节相同的图片，返回统计信息；重复文件在随后的孤儿清理中回收"""
+    stats = {'duplicate_files': 0, 'duplicate_bytes': 0, 'rewritten_images': 0}
+    pinned = pinned_names(store, grace_hours)
+
+    # 大小相同才可能重复，按大小取模分桶，每轮遍历只保留一个桶的键
+    for bucket in range(buckets):
+        by_size = defaultdict(list)
+        for key, size, _ in store.backend.iter_keys():
+            if size % buckets != bucket or _DERIVATIVE.match(posixpath.basename(key)):
+                continue
+            by_size[size].append(key)
+
+        canonical_urls = {}
+        for size, keys in by_size.items():
+            if len(keys) < 2:
+                continue
+
+            by_digest = defaultdict(list)
+            for key in keys:
+                digest = _file_digest(store, key)
+                if digest:
+                    by_digest[digest].append(key)
+
+            for group in by_digest.values():
+                if len(group) < 2:
+                    continue
+                # 优先保留被任务结果 / 生成缓存引用的文件 (这些引用不改写)，其次是内容寻址的文件
+                group.sort(key=lambda k: (
+                    posixpath.basename(k) not in pinned,
+                    not store.is_content_addressed(posixpath.basename(k)),
+                    len(k), k
+                ))
+                canonical = group[0]
+                duplicates = [key for key in group[1:] if posixpath.basename(key) not in pinned]
+                if not duplicates:
+                    continue
+                stats['duplicate_files'] += len(duplicates)
+                stats['duplicate_bytes'] += size * len(duplicates)
+                canonical_urls[f"{store.url_prefix}/{canonical}"] = [
+                    url for key in duplicates for url in _url_variants(store, key)
+                ]
+
+        if canonical_urls and not dry_run:
+            stats['rewritten_images'] += _rewrite_references(canonical_urls)
+
+    return stats
+
+
+def purge_quarantine(store, max_age_days=GC_QUARANTINE_DAYS, dry_run=False):
+    """永久删除隔离超过 max_age_days 天的文件，返回删除的文件数"""
+    cutoff = time.time() - max_age_days * 86400
+    purged = 0
+    for key, _, mtime in store.backend.iter_keys(prefix=QUARANTINE_DIR):
+        if mtime > cutoff:
+            continue
+        if not dry_run:
+            try:
+                store.backend.delete(key)
+            except Exception as e:
+                print(f"GC: failed to purge {key}: {e}")
+                continue
+        purged += 1
+    return purged
+
+
+def collect_garbage(dry_run=False, quarantine=False, grace_hours=GC_GRACE_HOURS, dedup=True,
+                    quarantine_days=GC_QUARANTINE_DAYS):
+    """
+    清理孤儿图片
+
+    Args:
+        dry_run: 只统计不修改
+        quarantine: 移入隔离目录而不是直接删除
+        grace_hours: 修改时间在该小时数以内的文件、结束不超过该小时数的任务结果引用的文件不清理
+        dedup: 是否先合并重复图片
+        quarantine_days: 隔离目录中文件的保留天数
+
+    Returns:
+        dict: 统计信息
+    """
+    store = get_image_store()
+    stats = {'scanned_files': 0, 'scanned_bytes': 0, 'orphan_files': 0, 'orphan_bytes': 0, 'removed_files': 0}
+    stats['purged_files'] = purge_quarantine(store, quarantine_days, dry_run=dry_run)
+    if dedup:
+        stats.update(deduplicate(store, dry_run=dry_run, grace_hours=grace_hours))
+
+    names = referenced_names(store, grace_hours)
+    cutoff = time.time() - grace_hours * 3600
+
+    for key, size, mtime in store.backend.iter_keys():
+        stats['scanned_files'] += 1
+        stats['scanned_bytes'] += size
+        if _source_name(posixpath.basename(key)) in names or mtime > cutoff:
+            continue
+
+        stats['orphan_files'] += 1
+        stats['orphan_bytes'] += size
+        if dry_run:
+            continue
+
+        try:
+            if quarantine:
+                store.backend.move(key, f"{QUARANTINE_DIR}/{key}")
+            else:
+                store.backend.delete(key)
+        except Exception as e:
+            print(f"GC: failed to remove {key}: {e}")
+            continue
+        stats['removed_files'] += 1
+
+        # 同时移除本节点的读穿透缓存副本
+        if store.remote:
+            local_path = store.resolve(key)
+            if local_path is not None and local_path.is_file():
+                os.remove(local_path)
+
+    return stats
@@ -0,0 +1,261 @@
+"""
+图片存储模块
+生成的图片按内容哈希命名、按文件名哈希前缀分片保存，避免单个目录下堆积海量文件
+
+- 文件名: <前缀><内容 sha256 前 32 位>.<扩展名>，内容不变则 URL 不变，可被 CDN / 浏览器长期缓存
+- 目录结构: IMAGE_SAVE_DIR/ab/cd/<name>，ab/cd 取自文件名 sha256 的前四位
+- 原子写入: 先写入同一文件系统下的 .tmp 目录，fsync 后 os.replace 到目标路径，
+  进程中途退出只会留下临时文件，不会出现半截图片；启动时清理过期的临时文件
+- 解码与写盘在后台 I/O 线程池中完成；base64 数据分块解码后直接写入文件，
+  不在内存中保留完整的解码副本
+- 持久存储由 Blob 后端 (app.services.blob_storage) 负责；使用远端后端时，
+  IMAGE_SAVE_DIR 作为本节点的读穿透缓存，其他节点写入的图片按需下载
+"""
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.services.blob_storage import get_blob_backend
+
+IMAGE_SAVE_DIR = os.getenv('IMAGE_SAVE_DIR', 'static/images')
+IMAGE_URL_PREFIX = os.getenv('IMAGE_URL_PREFIX', '/api/images').rstrip('/')
+# 旧版本保存在 IMAGE_SAVE_DIR 根目录下的图片 URL 前缀
+LEGACY_URL_PREFIX = '/static/images'
+IMAGE_IO_WORKERS = max(1, int(os.getenv('IMAGE_IO_WORKERS', '4')))
+# 分片层数，每层两位十六进制 (256 个子目录)
+IMAGE_SHARD_DEPTH = int(os.getenv('IMAGE_SHARD_DEPTH', '2'))
+# 超过该时间 (秒) 的临时文件视为中断写入的残留
+IMAGE_TEMP_MAX_AGE = int(os.getenv('IMAGE_TEMP_MAX_AGE', '3600'))
+
+# base64 分块解码的块大小 (字符数，必须是 4 的倍数)
+_DECODE_CHUNK = 4 * 256 * 1024
+_TEMP_DIR = '.tmp'
+# 内容哈希文件名 (衍生图在原图文件名后追加后缀，同样视为内容寻址)
+_CONTENT_NAME = re.compile(r'(?:^|-)([0-9a-f]{32})\.')
+
+
+class _HashingWriter:
+    """写入文件的同时计算内容哈希"""
+
+    def __init__(self, f):
+        self._f = f
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        self.hash.update(data)
+        return self._f.write(data)
+
+
+def _write_base64(f, data):
+    """分块解码 base64 字符串并写入文件，只在内存中保留一个块的解码结果"""
+    # 含换行等空白时分块边界无法对齐，整体解码
+    if '\n' in data or '\r' in data or ' ' in data:
+        f.write(binascii.a2b_base64(data))
+        return
+
+    for start in range(0, len(data), _DECODE_CHUNK):
+        f.write(binascii.a2b_base64(data[start:start + _DECODE_CHUNK]))
+
+
+def atomic_write(target, temp_dir, write):
+    """
+    原子写入文件：write(f) 写入 temp_dir 下的临时文件，fsync 后替换为 target
+    temp_dir 必须与 target 位于同一文件系统
+    """
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(prefix=f'{target.name}.', dir=temp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, target)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ImageStore:
+    def __init__(self, root=IMAGE_SAVE_DIR, url_prefix=IMAGE_URL_PREFIX, shard_depth=IMAGE_SHARD_DEPTH, backend=None):
+        self.root = Path(root)
+        self.url_prefix = url_prefix
+        self.shard_depth = shard_depth
+        self.temp_dir = self.root / _TEMP_DIR
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self.backend = backend or get_blob_backend()
+        # 本地后端且目录相同时，本地文件即为持久存储
+        backend_root = getattr(self.backend, 'root', None)
+        self.remote = backend_root is None or Path(backend_root).resolve() != self.root.resolve()
+        self._executor = ThreadPoolExecutor(max_workers=IMAGE_IO_WORKERS, thread_name_prefix='image-io')
+        self._cleanup_temp_files()
+
+    def _cleanup_temp_files(self):
+        cutoff = time.time() - IMAGE_TEMP_MAX_AGE
+        for entry in os.scandir(self.temp_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def relative_path(self, name):
+        """文件名对应的分片相对路径，如 ab/cd/gemini-xxx.png"""
+        digest = hashlib.sha256(name.encode('utf-8')).hexdigest()
+        shards = [digest[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return '/'.join(shards + [name])
+
+    def path_for(self, name):
+        return self.root / self.relative_path(name)
+
+    def url_for(self, name):
+        return f"{self.url_prefix}/{self.relative_path(name)}"
+
+    def resolve(self, relative):
+        """根目录下的相对路径对应的文件路径，越界或指向隐藏文件 (临时目录、缓存索引) 时返回 None"""
+        if any(part.startswith('.') for part in relative.split('/')):
+            return None
+        root = self.root.resolve()
+        path = (root / relative).resolve()
+        if root not in path.parents:
+            return None
+        return path
+
+    def relative_from_url(self, url):
+        """本站图片 URL 对应的相对路径，外部或越界的 URL 返回 None"""
+        if not url:
+            return None
+        for prefix in (self.url_prefix, LEGACY_URL_PREFIX):
+            if url.startswith(prefix + '/'):
+                relative = url[len(prefix) + 1:].split('?', 1)[0]
+                return relative if self.resolve(relative) is not None else None
+        return None
+
+    def path_from_url(self, url):
+        """本站图片 URL 对应的本地文件路径 (不保证文件已在本地)"""
+        relative = self.relative_from_url(url)
+        return self.resolve(relative) if relative is not None else None
+
+    @staticmethod
+    def content_digest(name):
+        """内容哈希文件名中的摘要，非内容寻址的文件名返回 None"""
+        match = _CONTENT_NAME.search(name)
+        return match.group(1) if match else None
+
+    @classmethod
+    def is_content_addressed(cls, name):
+        """文件名是否由内容哈希生成 (内容永不变化)"""
+        return cls.content_digest(name) is not None
+
+    def _write(self, prefix, extension, data, encoded):
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer = _HashingWriter(f)
+                if encoded:
+                    _write_base64(writer, data)
+                else:
+                    writer.write(memoryview(data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, 0o644)
+
+            name = f"{prefix}{writer.hash.hexdigest()[:32]}.{extension}"
+            target = self.path_for(name)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # 相同内容的文件已存在时直接覆盖，结果一致
+            os.replace(temp_path, target)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self.publish(name)
+        return target, self.url_for(name)
+
+    def publish(self, name):
+        """把本地已写入的文件上传到持久存储"""
+        if self.remote:
+            self.backend.put_file(self.relative_path(name), self.path_for(name), immutable=self.is_content_addressed(name))
+
+    def exists(self, name):
+        """文件是否存在于本地缓存或持久存储"""
+        if self.path_for(name).is_file():
+            return True
+        return self.remote and self.backend.exists(self.relative_path(name))
+
+    def ensure_local(self, relative):
+        """
+        确保相对路径对应的文件在本地可读，必要时从持久存储下载 (读穿透)
+
+        Returns:
+            Path: 本地文件路径，不存在时返回 None
+        """
+        path = self.resolve(relative)
+        if path is None:
+            return None
+        if path.is_file() or not self.remote:
+            return path if path.is_file() else None
+
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir)
+        os.close(fd)
+        try:
+            self.backend.download_file(relative, temp_path)
+            os.chmod(temp_path, 0o644)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temp_path, path)
+        except FileNotFoundError:
+            return None
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return path
+
+    def read_url(self, relative):
+        """持久存储提供的直接读取 URL (如 S3 预签名 URL)，不支持时返回 None"""
+        if not self.remote:
+            return None
+        return self.backend.read_url(relative)
+
+    def save_async(self, data, extension, prefix=''):
+        """
+        在 I/O 线程池中保存图片，文件名由内容哈希决定
+
+        Args:
+            data: 二进制图片数据 (bytes)，或 base64 编码的 str
+            extension: 扩展名，如 png
+            prefix: 文件名前缀，如 gemini-
+
+        Returns:
+            Future: 结果为 (文件路径, 图片 URL)
+        """
+        return self._executor.submit(self._write, prefix, extension, data, isinstance(data, str))
+
+    def save(self, data, extension, prefix=''):
+        """保存图片并等待写入完成，返回 (文件路径, 图片 URL)"""
+        return self.save_async(data, extension, prefix).result()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_image_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ImageStore()
+    return _store
@@ -0,0 +1,450 @@
+"""
+后台任务队列模块
+任务状态持久化在 generation_jobs 表中，作为所有 worker 共享的唯一事实来源；
+Redis 列表只用于及时唤醒 worker。未配置 Redis 时退回到数据库轮询，
+并在 Web 进程内启动 worker 线程，便于本地运行。
+
+可靠性保证：
+- 领取任务使用条件 UPDATE，多个 worker 之间不会重复领取
+- 执行期间 worker 定期心跳续租；worker 崩溃后租约（可见性超时）过期，任务会被重新领取
+- 执行失败按指数退避重试，超过最大次数后标记为 failed
+"""
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from app import db
+from app.models.job import GenerationJob
+from app.services.events import job_channel, publish
+from app.services.redis_client import get_redis
+
+QUEUE_KEY = 'comic:jobs:queue'
+
+# 可见性超时：worker 超过该时间未心跳，任务即可被其他 worker 重新领取
+VISIBILITY_TIMEOUT = int(os.getenv('JOB_VISIBILITY_TIMEOUT', '120'))
+HEARTBEAT_INTERVAL = int(os.getenv('JOB_HEARTBEAT_INTERVAL', '15'))
+POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '2'))
+MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+RETRY_BACKOFF = float(os.getenv('JOB_RETRY_BACKOFF', '5'))
+
+_handlers = {}
+_local_wakeup = threading.Event()
+_inprocess_lock = threading.Lock()
+_inprocess_started = False
+
+
+def job_handler(kind):
+    """注册任务处理函数，处理函数签名为 handler(payload, ctx) -> result"""
+    def decorator(f):
+        _handlers[kind] = f
+        return f
+    return decorator
+
+
+class JobContext:
+    """传递给任务处理函数的上下文，用于汇报进度和保存阶段性结果"""
+
+    def __init__(self, job_id, worker_id, attempts, max_attempts, result=None):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.result = dict(result or {})
+
+    @property
+    def is_last_attempt(self):
+        return self.attempts >= self.max_attempts
+
+    def update(self, progress=None, result=None):
+        """更新进度与阶段性结果，重试时处理函数可据此跳过已完成的部分"""
+        values = {'heartbeat_at': datetime.utcnow(), 'updated_at': datetime.utcnow()}
+        if progress is not None:
+            values['progress'] = int(progress)
+        if result is not None:
+            self.result = dict(result)
+            values['result'] = self.result
+
+        db.session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == self.job_id, GenerationJob.worker_id == self.worker_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+
+def _claimable(now):
+    return or_(
+        and_(GenerationJob.status == 'queued', GenerationJob.available_at <= now),
+        and_(
+            GenerationJob.status == 'running',
+            GenerationJob.lease_expires_at < now,
+            GenerationJob.attempts < GenerationJob.max_attempts
+        )
+    )
+
+
+def claimable_query(now, limit=10):
+    """可领取任务的 ID，按创建时间排序 (claim_next_job 在没有提示任务时执行)"""
+    return select(GenerationJob.id).where(_claimable(now)).order_by(GenerationJob.created_at).limit(limit)
+
+
+def _try_claim(job_id, worker_id):
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(GenerationJob)
+        .where(GenerationJob.id == job_id, _claimable(now))
+        .values(
+            status='running',
+            worker_id=worker_id,
+            attempts=GenerationJob.attempts + 1,
+            heartbeat_at=now,
+            lease_expires_at=now + timedelta(seconds=VISIBILITY_TIMEOUT),
+            updated_at=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def claim_next_job(worker_id, hinted_job_id=None):
+    """领取一个可执行的任务，返回任务 ID；没有可领取的任务时返回 None"""
+    if hinted_job_id and _try_claim(hinted_job_id, worker_id):
+        return hinted_job_id
+
+    candidates = db.session.execute(claimable_query(datetime.utcnow())).scalars().all()
+
+    for job_id in candidates:
+        if _try_claim(job_id, worker_id):
+            return job_id
+    return None
+
+
+def reap_expired_jobs():
+    """将租约过期且重试次数耗尽的任务标记为失败"""
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(GenerationJob)
+        .where(
+            GenerationJob.status == 'running',
+            GenerationJob.lease_expires_at < now,
+            GenerationJob.attempts >= GenerationJob.max_attempts
+        )
+        .values(status='failed', error='任务执行超时（worker 失联）', finished_at=now, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def _notify(job_id):
+    redis_client = get_redis()
+    if redis_client is not None:
+        try:
+            redis_client.lpush(QUEUE_KEY, job_id)
+            return
+        except Exception as e:
+            print(f"Jobs: Failed to notify Redis queue: {e}")
+    _local_wakeup.set()
+
+
+def enqueue_job(kind, payload, user_id=None, project_id=None, max_attempts=None):
+    """
+    创建任务并通知 worker
+
+    Returns:
+        GenerationJob: 已提交的任务记录
+    """
+    if kind not in _handlers:
+        raise ValueError(f'未知任务类型: {kind}')
+
+    job = GenerationJob(
+        id=str(uuid.uuid4()),
+        kind=kind,
+        payload=payload,
+        status='queued',
+        progress=0,
+        attempts=0,
+        max_attempts=max_attempts or MAX_ATTEMPTS,
+        user_id=int(user_id) if user_id is not None else None,
+        project_id=project_id,
+        available_at=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _notify(job.id)
+    from flask import current_app
+    ensure_inprocess_workers(current_app._get_current_object())
+    return job
+
+
+def _finish(job_id, owner_id, **values):
+    """更新任务状态，仅当任务仍由 owner_id 持有时生效"""
+    now = datetime.utcnow()
+    values.setdefault('updated_at', now)
+    db.session.execute(
+        update(GenerationJob)
+        .where(GenerationJob.id == job_id, GenerationJob.worker_id == owner_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _fail_or_retry(job_id, worker_id, error):
+    db.session.rollback()
+    job = db.session.get(GenerationJob, job_id)
+    now = datetime.utcnow()
+
+    if job.attempts < job.max_attempts:
+        # 指数退避 + 抖动
+        delay = RETRY_BACKOFF * (2 ** (job.attempts - 1)) * random.uniform(0.8, 1.2)
+        _finish(
+            job_id, worker_id,
+            status='queued', error=error, worker_id=None, lease_expires_at=None,
+            available_at=now + timedelta(seconds=delay)
+        )
+        publish(job_channel(job_id), 'retry', {'error': error, 'attempts': job.attempts, 'delay': round(delay, 1)})
+        print(f"Jobs: {job_id} failed (attempt {job.attempts}/{job.max_attempts}), retrying in {delay:.1f}s: {error}")
+    else:
+        _finish(job_id, worker_id, status='failed', error=error, finished_at=now)
+        publish(job_channel(job_id), 'done', _job_snapshot(job_id))
+        print(f"Jobs: {job_id} failed permanently: {error}")
+
+
+def _job_snapshot(job_id):
+    db.session.expire_all()
+    job = db.session.get(GenerationJob, job_id)
+    return job.to_dict() if job else {'task_id': job_id}
+
+
+def _heartbeat_loop(app, job_id, worker_id, stop_event):
+    """执行期间定期续租，防止任务被其他 worker 抢走"""
+    while not stop_event.wait(HEARTBEAT_INTERVAL):
+        with app.app_context():
+            try:
+                now = datetime.utcnow()
+                db.session.execute(
+                    update(GenerationJob)
+                    .where(
+                        GenerationJob.id == job_id,
+                        GenerationJob.worker_id == worker_id,
+                        GenerationJob.status == 'running'
+                    )
+                    .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=VISIBILITY_TIMEOUT))
+                    .execution_options(synchronize_session=False)
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Jobs: Heartbeat failed for {job_id}: {e}")
+
+
+def execute_job(app, job_id, worker_id):
+    """执行已领取的任务"""
+    job = db.session.get(GenerationJob, job_id)
+    ctx = JobContext(job_id, worker_id, job.attempts, job.max_attempts, job.result)
+    handler = _handlers.get(job.kind)
+    payload = dict(job.payload or {})
+
+    stop_event = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat_loop, args=(app, job_id, worker_id, stop_event),
+        name=f'heartbeat-{job_id[:8]}', daemon=True
+    )
+    heartbeat.start()
+
+    try:
+        if handler is None:
+            raise ValueError(f'未知任务类型: {job.kind}')
+        result = handler(payload, ctx)
+        _finish(
+            job_id, worker_id,
+            status='completed', progress=100, result=result, error=None,
+            lease_expires_at=None, finished_at=datetime.utcnow()
+        )
+        publish(job_channel(job_id), 'done', _job_snapshot(job_id))
+    except Exception as e:
+        traceback.print_exc()
+        _fail_or_retry(job_id, worker_id, str(e))
+    finally:
+        stop_event.set()
+        heartbeat.join()
+
+
+class Worker:
+    """任务执行者：等待通知、领取任务、执行，直到 stop_event 被设置"""
+
+    def __init__(self, app, name=None):
+        self.app = app
+        self.worker_id = name or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    def _wait_for_job(self):
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                item = redis_client.brpop(QUEUE_KEY, timeout=max(1, int(POLL_INTERVAL)))
+                return item[1].decode() if item else None
+            except Exception as e:
+                print(f"Jobs: Redis wait failed: {e}")
+                time.sleep(POLL_INTERVAL)
+                return None
+
+        if _local_wakeup.wait(POLL_INTERVAL):
+            _local_wakeup.clear()
+        return None
+
+    def run(self, stop_event):
+        print(f"Jobs: Worker {self.worker_id} started")
+        hinted_job_id = None
+        last_reap = 0.0
+
+        while not stop_event.is_set():
+            with self.app.app_context():
+                try:
+                    if time.monotonic() - last_reap > VISIBILITY_TIMEOUT:
+                        reap_expired_jobs()
+                        last_reap = time.monotonic()
+
+                    job_id = claim_next_job(self.worker_id, hinted_job_id)
+                    hinted_job_id = None
+                    if job_id:
+                        execute_job(self.app, job_id, self.worker_id)
+                        continue
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Jobs: Worker loop error: {e}")
+
+            hinted_job_id = self._wait_for_job()
+
+        print(f"Jobs: Worker {self.worker_id} stopped")
+
+
+def _inprocess_worker_count():
+    configured = os.getenv('JOB_INPROCESS_WORKERS')
+    if configured not in (None, ''):
+        return int(configured)
+    # 有 Redis 时由独立的 manage.py worker 进程执行任务
+    return 0 if get_redis() is not None else 2
+
+
+def ensure_inprocess_workers(app):
+    """未部署独立 worker 时，在 Web 进程内启动 worker 线程"""
+    global _inprocess_started
+
+    if _inprocess_started or app.config.get('TESTING'):
+        return
+
+    with _inprocess_lock:
+        if _inprocess_started:
+            return
+        _inprocess_started = True
+        stop_event = threading.Event()
+        for i in range(_inprocess_worker_count()):
+            worker = Worker(app)
+            threading.Thread(target=worker.run, args=(stop_event,), name=f'job-worker-{i}', daemon=True).start()
+
+
+def run_worker(app, threads=1):
+    """独立 worker 进程入口（manage.py worker），收到 SIGTERM/SIGINT 后处理完当前任务再退出"""
+    stop_event = threading.Event()
+
+    def _shutdown(signum, frame):
+        print("Jobs: Shutting down worker...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    workers = [
+        threading.Thread(target=Worker(app).run, args=(stop_event,), name=f'job-worker-{i}')
+        for i in range(max(1, threads))
+    ]
+    for thread in workers:
+        thread.start()
+    while any(thread.is_alive() for thread in workers):
+        for thread in workers:
+            thread.join(timeout=1)
+
+
+# ---------------------------------------------------------------------------
+# 任务处理函数
+# ---------------------------------------------------------------------------
+
+@job_handler('generate_image')
+def _run_generate_image(payload, ctx):
+    from app.models.character import CharacterTemplate
+    from app.services.derivatives import derivative_urls
+    from app.services.providers import get_provider_router
+
+    character_template = None
+    if payload.get('character_template_id'):
+        character_template = db.session.get(CharacterTemplate, payload['character_template_id'])
+
+    result = get_provider_router().generate(
+        payload['prompt'], character_template, use_cache=not payload.get('bypass_cache')
+    )
+    if not result.get('image_url'):
+        raise RuntimeError('未返回图片地址')
+    return {**result, 'derivatives': derivative_urls(result['image_url'])}
+
+
+@job_handler('generate_all')
+def _run_generate_all(payload, ctx):
+    from flask import current_app
+    from app.models.storyboard import Storyboard
+    from app.services.generation import generate_storyboard_images
+
+    project_id = payload['project_id']
+    storyboards = Storyboard.query.filter_by(project_id=project_id).order_by(Storyboard.sequence).all()
+
+    # 重试时跳过之前已经成功的分镜，避免重复出图
+    state = {
+        'images': list(ctx.result.get('images', [])),
+        'done_storyboard_ids': list(ctx.result.get('done_storyboard_ids', [])),
+        'errors': []
+    }
+    done = set(state['done_storyboard_ids'])
+    pending = [sb for sb in storyboards if sb.id not in done]
+    total = len(storyboards) or 1
+
+    def on_panel(sequence, storyboard_id, image, error):
+        if image:
+            state['images'].append(image)
+            state['done_storyboard_ids'].append(storyboard_id)
+        else:
+            state['errors'].append({'sequence': sequence, 'error': error})
+        progress = len(state['done_storyboard_ids']) * 100 // total
+        ctx.update(progress=progress, result=state)
+        publish(job_channel(ctx.job_id), 'panel', {
+            'sequence': sequence,
+            'storyboard_id': storyboard_id,
+            'image': image,
+            'error': error,
+            'progress': progress
+        })
+
+    generate_storyboard_images(
+        current_app._get_current_object(),
+        project_id,
+        pending,
+        concurrency=payload.get('concurrency'),
+        use_cache=not payload.get('bypass_cache'),
+        on_panel=on_panel
+    )
+
+    if state['errors'] and not ctx.is_last_attempt:
+        raise RuntimeError(f"{len(state['errors'])} 个分镜生成失败")
+
+    state['images'].sort(key=lambda image: image.get('layer_order') or 0)
+    return state
@@ -4,16 +4,24 @@ import os
 import uuid
 from app import db
 from app.models.comic import ComicImage
+from app.services.http import get_http_session, http_timeout
 
 class MidjourneyService:
     def __init__(self):
-        self.api_url = "https://api.midjourney.com/v2"
+        self.api_url = os.getenv('MIDJOURNEY_API_URL', 'https://api.midjourney.com/v2').rstrip('/')
         self.api_key = os.getenv('MIDJOURNEY_API_KEY')
+        # 共享的长连接会话，避免每次调用重新握手
+        self.session = get_http_session('midjourney')
     
-    def generate_image(self, prompt, character_template=None):
-        """生成图片，支持角色一致性"""
+    def generate_image(self, prompt, character_template=None, strict=False):
+        """
+        生成图片，支持角色一致性
+        strict 为 True 时失败直接抛出异常，不退回模拟任务（供多后端路由使用）
+        """
         # 如果没有API Key，使用模拟生成
         if not self.api_key:
+            if strict:
+                raise RuntimeError('未配置 MIDJOURNEY_API_KEY')
             print("Warning: No MIDJOURNEY_API_KEY found. Using mock generation.")
             return self._mock_generate(prompt)
 
@@ -33,21 +41,26 @@ class MidjourneyService:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.api_url}/imagine",
                 json=payload,
                 headers=headers,
-                timeout=30
+                timeout=http_timeout(read=30)
             )
             
             if response.status_code == 200:
                 return response.json()
+            elif strict:
+                response.raise_for_status()
+                raise RuntimeError(f"Midjourney 返回异常状态 {response.status_code}")
             else:
                 # Fallback to mock if the API is unreachable (likely given the URL)
                 print(f"API Error {response.status_code}. Fallback to mock.")
                 return self._mock_generate(prompt)
                 
         except requests.exceptions.RequestException as e:
+            if strict:
+                raise
             print(f"Request failed: {e}. Fallback to mock.")
             return self._mock_generate(prompt)
     
@@ -62,10 +75,10 @@ class MidjourneyService:
         }
         
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.api_url}/task/{task_id}",
                 headers=headers,
-                timeout=10
+                timeout=http_timeout(read=10)
             )
             
             if response.status_code == 200:
@@ -78,6 +91,19 @@ class MidjourneyService:
                  return self._mock_check_status(task_id)
              raise Exception(f"网络请求失败: {str(e)}")
 
+    def cancel_task(self, task_id):
+        """取消任务（尽力而为，失败只记录日志）"""
+        if not self.api_key or str(task_id).startswith('mock-'):
+            return
+        try:
+            self.session.post(
+                f"{self.api_url}/task/{task_id}/cancel",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=http_timeout(read=5)
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"Midjourney: cancel task {task_id} failed: {e}")
+
     def _mock_generate(self, prompt):
         """模拟生成"""
         task_id = f"mock-{uuid.uuid4()}"
@@ -0,0 +1,348 @@
+"""
+图像生成后端路由模块
+Gemini 与 Midjourney 实现统一的 ImageProvider 接口，由 ProviderRouter 统一调度
+
+- 每个后端维护最近 PROVIDER_STATS_WINDOW 次调用的耗时与成败，计算 p50/p95 与错误率
+- 每次请求优先路由到健康且 p50 最低的后端，失败时依次切换到下一个后端
+- 对冲请求：首个请求耗时超过其后端的 p95 (可配置) 仍未返回时，向下一个后端再发一次，
+  先成功者胜出，另一个通过取消事件终止 (Midjourney 停止轮询并取消任务；
+  Gemini 为同步调用，无法中途打断，落败后仍会完成，图片保留在生成缓存中供相同 Prompt 复用，
+  并计入 late_results 统计)
+- 所有后端都不可用时抛出 ProviderError，不把模拟图片当作生成结果保存；
+  本地开发未配置任何 API Key 时可设置 IMAGE_MOCK_FALLBACK=true 使用模拟图片
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from types import SimpleNamespace
+
+# 参与路由的后端及默认优先级 (样本不足时按此顺序选择)
+IMAGE_PROVIDERS = [name.strip() for name in os.getenv('IMAGE_PROVIDERS', 'gemini,midjourney').split(',') if name.strip()]
+PROVIDER_STATS_WINDOW = int(os.getenv('PROVIDER_STATS_WINDOW', '100'))
+# 样本数达到该值后才参与按耗时排序与健康判断
+PROVIDER_MIN_SAMPLES = int(os.getenv('PROVIDER_MIN_SAMPLES', '5'))
+PROVIDER_MAX_ERROR_RATE = float(os.getenv('PROVIDER_MAX_ERROR_RATE', '0.5'))
+
+IMAGE_HEDGE_ENABLED = os.getenv('IMAGE_HEDGE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# 对冲触发点：首个后端的耗时分位数 (p50 / p95)
+IMAGE_HEDGE_PERCENTILE = os.getenv('IMAGE_HEDGE_PERCENTILE', 'p95')
+# 样本不足时的对冲等待时间，以及对冲等待的下限（秒）
+IMAGE_HEDGE_DEFAULT_DELAY = float(os.getenv('IMAGE_HEDGE_DEFAULT_DELAY', '30'))
+IMAGE_HEDGE_MIN_DELAY = float(os.getenv('IMAGE_HEDGE_MIN_DELAY', '2'))
+
+# 没有任何可用后端时退回到模拟图片 (仅用于本地开发)
+IMAGE_MOCK_FALLBACK = os.getenv('IMAGE_MOCK_FALLBACK', 'false').lower() in ('1', 'true', 'yes')
+
+MIDJOURNEY_POLL_INTERVAL = float(os.getenv('MIDJOURNEY_POLL_INTERVAL', '2'))
+MIDJOURNEY_TIMEOUT = float(os.getenv('MIDJOURNEY_TIMEOUT', '300'))
+
+
+class ProviderError(Exception):
+    """所有后端都未能生成图片"""
+
+
+class ProviderCancelled(Exception):
+    """请求在对冲中落败，已被取消"""
+
+
+class ProviderStats:
+    """滚动窗口内的耗时分位数与错误率"""
+
+    def __init__(self, window=PROVIDER_STATS_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._samples.append((latency, ok))
+
+    def _percentile(self, latencies, q):
+        if not latencies:
+            return None
+        latencies = sorted(latencies)
+        index = min(len(latencies) - 1, int(round(q * (len(latencies) - 1))))
+        return latencies[index]
+
+    def snapshot(self):
+        with self._lock:
+            samples = list(self._samples)
+        latencies = [latency for latency, ok in samples if ok]
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            'samples': len(samples),
+            'p50': self._percentile(latencies, 0.5),
+            'p95': self._percentile(latencies, 0.95),
+            'error_rate': round(errors / len(samples), 4) if samples else 0.0
+        }
+
+
+class ImageProvider:
+    """图像生成后端接口"""
+
+    name = None
+
+    def __init__(self):
+        self.stats = ProviderStats()
+
+    @property
+    def available(self):
+        """是否已配置，可以参与路由"""
+        raise NotImplementedError
+
+    def generate(self, prompt, character_template=None, use_cache=True, cancel_event=None):
+        """
+        生成图片，失败时抛出异常
+
+        Args:
+            cancel_event: threading.Event，被设置时应尽快放弃本次请求
+
+        Returns:
+            dict: 至少包含 task_id、image_url
+        """
+        raise NotImplementedError
+
+    def healthy(self):
+        snapshot = self.stats.snapshot()
+        return snapshot['samples'] < PROVIDER_MIN_SAMPLES or snapshot['error_rate'] <= PROVIDER_MAX_ERROR_RATE
+
+
+class GeminiProvider(ImageProvider):
+    name = 'gemini'
+
+    def __init__(self, service=None):
+        super().__init__()
+        self._service = service
+
+    @property
+    def service(self):
+        if self._service is None:
+            from app.services.gemini import get_gemini_service
+            self._service = get_gemini_service()
+        return self._service
+
+    @property
+    def available(self):
+        return self.service.client is not None
+
+    def generate(self, prompt, character_template=None, use_cache=True, cancel_event=None):
+        if cancel_event is not None and cancel_event.is_set():
+            raise ProviderCancelled(self.name)
+        return self.service.generate_image(prompt, character_template, use_cache=use_cache, strict=True)
+
+
+class MidjourneyProvider(ImageProvider):
+    name = 'midjourney'
+
+    def __init__(self, service=None):
+        super().__init__()
+        if service is None:
+            from app.services.midjourney import MidjourneyService
+            service = MidjourneyService()
+        self.service = service
+
+    @property
+    def available(self):
+        return bool(self.service.api_key)
+
+    def generate(self, prompt, character_template=None, use_cache=True, cancel_event=None):
+        cancel_event = cancel_event or threading.Event()
+        task = self.service.generate_image(prompt, character_template, strict=True)
+        task_id = task.get('task_id')
+        if task.get('image_url'):
+            return task
+        if not task_id:
+            raise RuntimeError('Midjourney 未返回任务 ID')
+
+        # Midjourney 为异步任务，轮询直到完成；被取消时同时取消远端任务
+        deadline = time.monotonic() + MIDJOURNEY_TIMEOUT
+        while not cancel_event.wait(MIDJOURNEY_POLL_INTERVAL):
+            status = self.service.check_task_status(task_id)
+            if status.get('status') == 'completed' and status.get('image_url'):
+                return {**status, 'task_id': task_id}
+            if status.get('status') == 'failed':
+                raise RuntimeError(status.get('error') or 'Midjourney 任务失败')
+            if time.monotonic() > deadline:
+                self.service.cancel_task(task_id)
+                raise TimeoutError(f'Midjourney 任务超时: {task_id}')
+
+        self.service.cancel_task(task_id)
+        raise ProviderCancelled(self.name)
+
+
+PROVIDER_CLASSES = {
+    GeminiProvider.name: GeminiProvider,
+    MidjourneyProvider.name: MidjourneyProvider,
+}
+
+
+def _detach_template(character_template):
+    """把 ORM 角色模板复制为普通对象，避免在其他线程中访问数据库会话"""
+    if character_template is None:
+        return None
+    return SimpleNamespace(
+        features=dict(getattr(character_template, 'features', None) or {}),
+        description=getattr(character_template, 'description', None) or ''
+    )
+
+
+class ProviderRouter:
+    def __init__(self, providers, hedge=IMAGE_HEDGE_ENABLED, max_workers=None):
+        self.providers = list(providers)
+        self.hedge = hedge
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.late_results = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(4, 2 * int(os.getenv('GENERATION_GLOBAL_CONCURRENCY', '8'))),
+            thread_name_prefix='image-provider'
+        )
+
+    def ranked(self):
+        """可用后端按 (是否健康, p50) 排序，样本不足的后端保持配置顺序"""
+        candidates = [provider for provider in self.providers if provider.available]
+
+        def sort_key(item):
+            index, provider = item
+            snapshot = provider.stats.snapshot()
+            p50 = snapshot['p50'] if snapshot['samples'] >= PROVIDER_MIN_SAMPLES else None
+            return (not provider.healthy(), p50 is None, p50 or 0, index)
+
+        return [provider for _, provider in sorted(enumerate(candidates), key=sort_key)]
+
+    def _hedge_delay(self, provider):
+        snapshot = provider.stats.snapshot()
+        if snapshot['samples'] < PROVIDER_MIN_SAMPLES or snapshot.get(IMAGE_HEDGE_PERCENTILE) is None:
+            return IMAGE_HEDGE_DEFAULT_DELAY
+        return max(IMAGE_HEDGE_MIN_DELAY, snapshot[IMAGE_HEDGE_PERCENTILE])
+
+    def _call(self, provider, prompt, character_template, use_cache, cancel_event):
+        started = time.monotonic()
+        try:
+            result = provider.generate(prompt, character_template, use_cache=use_cache, cancel_event=cancel_event)
+        except ProviderCancelled:
+            raise
+        except Exception:
+            provider.stats.record(time.monotonic() - started, False)
+            raise
+        provider.stats.record(time.monotonic() - started, True)
+        if not result or not result.get('image_url'):
+            raise RuntimeError(f'{provider.name} 未返回图片地址')
+        return {**result, 'provider': provider.name}
+
+    def generate(self, prompt, character_template=None, use_cache=True):
+        """
+        生成图片：按路由顺序调用后端，必要时发出对冲请求
+
+        Returns:
+            dict: 胜出后端的结果，附带 provider 字段
+
+        Raises:
+            ProviderError: 没有可用的后端，或所有后端都失败
+        """
+        ranked = self.ranked()
+        if not ranked:
+            if IMAGE_MOCK_FALLBACK:
+                from app.services.gemini import get_gemini_service
+                return get_gemini_service().generate_image(prompt, character_template, use_cache=use_cache)
+            raise ProviderError('没有可用的图像生成后端')
+
+        character_template = _detach_template(character_template)
+        queue = list(ranked)
+        inflight = {}  # future -> (provider, cancel_event)
+        errors = []
+
+        def launch():
+            provider = queue.pop(0)
+            cancel_event = threading.Event()
+            future = self._executor.submit(self._call, provider, prompt, character_template, use_cache, cancel_event)
+            inflight[future] = (provider, cancel_event)
+            return provider
+
+        primary = launch()
+        hedge_at = time.monotonic() + self._hedge_delay(primary) if self.hedge else None
+
+        try:
+            while inflight:
+                timeout = None
+                if hedge_at is not None and queue:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                done, _ = wait(list(inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    # 首个请求超过耗时分位数仍未返回，向下一个后端发出对冲请求
+                    hedge_at = None
+                    self.hedged += 1
+                    provider = launch()
+                    print(f"ProviderRouter: hedging {primary.name} with {provider.name}")
+                    continue
+
+                for future in done:
+                    provider, _ = inflight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"ProviderRouter: {provider.name} failed: {e}")
+                        errors.append(f'{provider.name}: {e}')
+                        continue
+                    if provider is not primary:
+                        self.hedge_wins += 1
+                    return result
+
+                # 当前请求全部失败，立即切换到下一个后端
+                if not inflight and queue:
+                    primary = launch()
+                    hedge_at = time.monotonic() + self._hedge_delay(primary) if self.hedge else None
+        finally:
+            for future, (provider, cancel_event) in inflight.items():
+                cancel_event.set()
+                future.add_done_callback(partial(self._late_result, provider))
+
+        raise ProviderError('; '.join(errors) or '没有可用的图像生成后端')
+
+    def _late_result(self, provider, future):
+        """落败的请求无法中途打断时 (Gemini)，记录其迟到的结果"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.late_results += 1
+        print(f"ProviderRouter: {provider.name} finished after losing the hedge, "
+              f"kept in its cache only: {future.result().get('image_url')}")
+
+    def stats(self):
+        return {
+            'hedge_enabled': self.hedge,
+            'hedge_percentile': IMAGE_HEDGE_PERCENTILE,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'late_results': self.late_results,
+            'providers': {
+                provider.name: {
+                    'available': provider.available,
+                    'healthy': provider.healthy(),
+                    **provider.stats.snapshot()
+                }
+                for provider in self.providers
+            }
+        }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_provider_router():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                providers = []
+                for name in IMAGE_PROVIDERS:
+                    provider_class = PROVIDER_CLASSES.get(name)
+                    if provider_class is None:
+                        print(f"ProviderRouter: unknown provider {name}, skipped")
+                        continue
+                    providers.append(provider_class())
+                _router = ProviderRouter(providers)
+    return _router
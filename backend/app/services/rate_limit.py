@@ -0,0 +1,292 @@
+"""
+上游模型调用限流模块
+- 令牌桶：文本与图像分别配额，Redis 可用时全集群共享，否则退回到进程内实现
+- 重试：429/5xx 与网络错误按带抖动的指数退避重试，优先遵循上游返回的 retry-after
+- 自适应并发 (AIMD)：成功时线性增加并发上限，仅在被上游限流 (429) 时减半，
+  使配额紧张时吞吐平滑下降，而不是大量请求同时失败后退回模拟数据
+"""
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+from app.services.redis_client import get_redis
+
+# 每分钟请求数配额 (全集群)
+RATE_LIMITS = {
+    'text': float(os.getenv('GEMINI_TEXT_RPM', '60')),
+    'image': float(os.getenv('GEMINI_IMAGE_RPM', '20')),
+}
+# 单个进程内的并发上限
+CONCURRENCY_LIMITS = {
+    'text': int(os.getenv('GEMINI_TEXT_CONCURRENCY', '8')),
+    'image': int(os.getenv('GEMINI_IMAGE_CONCURRENCY', '4')),
+}
+RETRY_MAX_ATTEMPTS = int(os.getenv('UPSTREAM_RETRY_ATTEMPTS', '4'))
+RETRY_BASE_DELAY = float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', '1'))
+RETRY_MAX_DELAY = float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', '30'))
+# 等待令牌的最长时间，超过后放弃本次调用
+ACQUIRE_TIMEOUT = float(os.getenv('UPSTREAM_ACQUIRE_TIMEOUT', '60'))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+THROTTLED_STATUS = {429}
+
+
+class RateLimitTimeout(Exception):
+    """在 ACQUIRE_TIMEOUT 内未能获得调用配额"""
+
+
+# 返回需要等待的秒数，0 表示已获得令牌
+_TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local blocked_until = tonumber(redis.call('GET', KEYS[2]) or '0')
+if blocked_until > now then
+    return tostring(blocked_until - now)
+end
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+if tokens < 1 then
+    return tostring((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return '0'
+"""
+
+
+class TokenBucket:
+    def __init__(self, name, per_minute, capacity=None):
+        self.name = name
+        self.rate = max(per_minute, 0.001) / 60.0
+        self.capacity = capacity or max(1.0, per_minute / 6.0)  # 允许约 10 秒的突发
+        self._tokens = self.capacity
+        self._ts = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._script = None
+
+    @property
+    def _keys(self):
+        return [f'comic:ratelimit:{self.name}', f'comic:ratelimit:{self.name}:blocked']
+
+    def _try_acquire_redis(self, redis_client):
+        if self._script is None:
+            self._script = redis_client.register_script(_TOKEN_BUCKET_SCRIPT)
+        return float(self._script(keys=self._keys, args=[self.rate, self.capacity]))
+
+    def _try_acquire_local(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._blocked_until > now:
+                return self._blocked_until - now
+            self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+            self._ts = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+            return 0.0
+
+    def _try_acquire(self):
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                return self._try_acquire_redis(redis_client)
+            except Exception as e:
+                print(f"RateLimit: Redis bucket failed, using local bucket: {e}")
+        return self._try_acquire_local()
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._try_acquire()
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f'{self.name} 调用配额不足')
+            time.sleep(min(wait, 1.0) + random.uniform(0, 0.05))
+
+    def block_for(self, seconds):
+        """上游返回 retry-after 时，暂停整个集群在该时间内的调用"""
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                until = time.time() + seconds
+                redis_client.set(self._keys[1], until, px=int(seconds * 1000))
+                return
+            except Exception as e:
+                print(f"RateLimit: Redis block failed: {e}")
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    """AIMD 并发控制：成功时每轮 +1，被限流时减半"""
+
+    def __init__(self, name, max_limit, min_limit=1):
+        self.name = name
+        self.max_limit = max(max_limit, min_limit)
+        self.min_limit = min_limit
+        self.limit = float(self.max_limit)
+        self.inflight = 0
+        self.successes = 0
+        self.failures = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.inflight < int(self.limit), timeout=timeout):
+                raise RateLimitTimeout(f'{self.name} 并发已满')
+            self.inflight += 1
+
+    def release(self, outcome):
+        """outcome: 'success' 加性增加，'throttled' 乘性减少，其他结果 (错误 / 未发出调用) 不调整"""
+        with self._cond:
+            self.inflight -= 1
+            if outcome == 'success':
+                self.successes += 1
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            elif outcome == 'throttled':
+                self.failures += 1
+                self.limit = max(self.min_limit, self.limit / 2)
+            self._cond.notify_all()
+
+    def stats(self):
+        return {
+            'limit': round(self.limit, 2),
+            'max_limit': self.max_limit,
+            'inflight': self.inflight,
+            'successes': self.successes,
+            'failures': self.failures
+        }
+
+
+_buckets = {kind: TokenBucket(f'gemini:{kind}', rpm) for kind, rpm in RATE_LIMITS.items()}
+_concurrency = {kind: AdaptiveConcurrency(kind, limit) for kind, limit in CONCURRENCY_LIMITS.items()}
+
+
+def status_code_of(error):
+    """从 SDK / HTTP 异常中提取状态码"""
+    for attr in ('code', 'status_code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, 'response', None)
+    value = getattr(response, 'status_code', None)
+    return value if isinstance(value, int) else None
+
+
+def retry_after_of(error):
+    """解析上游建议的重试等待时间（秒）"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('retry-after') if hasattr(headers, 'get') else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # Gemini 在错误详情中以 RetryInfo.retryDelay (如 "30s") 返回
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?([\d.]+)s", str(getattr(error, 'details', '') or error))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def is_retryable(error):
+    if status_code_of(error) in RETRYABLE_STATUS:
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import httpx
+        return isinstance(error, httpx.TransportError)
+    except ImportError:
+        return False
+
+
+def is_throttled(error):
+    """上游明确的限流响应 (429 / RESOURCE_EXHAUSTED)；普通 5xx 与网络错误不算"""
+    if status_code_of(error) in THROTTLED_STATUS:
+        return True
+    return getattr(error, 'status', None) == 'RESOURCE_EXHAUSTED'
+
+
+def backoff_delay(attempt):
+    """带完全抖动的指数退避"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+@contextmanager
+def rate_limited(kind):
+    """
+    获取一次 kind 类型调用的配额（令牌 + 并发槽位），不做重试
+    用于流式调用等无法整体重放的场景
+
+    先占用并发槽位再取令牌：等待槽位超时不会浪费已取得的令牌
+    """
+    limiter = _concurrency[kind]
+    limiter.acquire()
+    outcome = None
+    try:
+        _buckets[kind].acquire()
+        outcome = 'error'
+        yield
+        outcome = 'success'
+    except Exception as e:
+        if is_throttled(e):
+            outcome = 'throttled'
+        raise
+    finally:
+        limiter.release(outcome)
+
+
+def call_with_limits(kind, fn):
+    """
+    在限流保护下调用上游，429/5xx/网络错误自动退避重试
+
+    Args:
+        kind: 'text' 或 'image'
+        fn: 无参调用，返回上游响应
+    """
+    for attempt in range(RETRY_MAX_ATTEMPTS):
+        try:
+            with rate_limited(kind):
+                return fn()
+        except RateLimitTimeout:
+            raise
+        except Exception as e:
+            if not is_retryable(e) or attempt == RETRY_MAX_ATTEMPTS - 1:
+                raise
+
+            delay = backoff_delay(attempt)
+            retry_after = retry_after_of(e)
+            if retry_after:
+                _buckets[kind].block_for(retry_after)
+                if retry_after > RETRY_MAX_DELAY:
+                    raise
+                delay = max(delay, retry_after)
+            print(f"RateLimit: {kind} call failed ({status_code_of(e) or type(e).__name__}), "
+                  f"retry {attempt + 1}/{RETRY_MAX_ATTEMPTS - 1} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def rate_limit_stats():
+    return {
+        kind: {
+            'per_minute': RATE_LIMITS[kind],
+            'concurrency': _concurrency[kind].stats()
+        }
+        for kind in RATE_LIMITS
+    }
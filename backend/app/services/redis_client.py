@@ -0,0 +1,49 @@
+"""
+Redis 连接模块
+docker-compose 已提供 REDIS_URL；未配置或连接失败时返回 None，
+由调用方退回到进程内 / SQLite 实现
+"""
+import os
+import threading
+import time
+
+_redis_client = None
+_last_failure = 0.0
+_lock = threading.Lock()
+
+# 连接失败后的重试间隔（秒），避免每次调用都等待连接超时
+RETRY_INTERVAL = 30
+
+
+def get_redis():
+    """获取共享的 Redis 客户端，不可用时返回 None"""
+    global _redis_client, _last_failure
+
+    redis_url = os.getenv('REDIS_URL')
+    if not redis_url:
+        return None
+    if _redis_client is not None:
+        return _redis_client
+    if time.monotonic() - _last_failure < RETRY_INTERVAL:
+        return None
+
+    with _lock:
+        if _redis_client is not None:
+            return _redis_client
+        try:
+            import redis
+            client = redis.Redis.from_url(
+                redis_url,
+                socket_connect_timeout=2,
+                socket_timeout=10,
+                health_check_interval=30
+            )
+            client.ping()
+            _redis_client = client
+            print(f"Redis: Connected to {redis_url}")
+        except Exception as e:
+            _last_failure = time.monotonic()
+            print(f"Redis: Unavailable ({e}), using local fallback")
+            return None
+
+    return _redis_client
@@ -0,0 +1,157 @@
+"""
+分镜脚本增量保存模块
+把客户端提交的完整分镜列表与数据库中的现有分镜比对，只写入发生变化的行
+
+- 按内容指纹 (画面描述、镜头、对话、情绪) 判断分镜是否变化：
+  1. 序号与指纹都相同: 不变
+  2. 序号不同但出图相关字段相同 (插入 / 删除分镜导致后续分镜移位): 更新序号，对话有变化时一并更新，保留图片
+  3. 同一序号内容变化: 更新内容；出图相关字段 (描述、镜头、情绪) 未变时保留已生成的图片
+  4. 其余新增分镜批量插入，多余的旧分镜批量删除
+- 未变化的分镜保留 comic_image_id，不需要重新生成图片；自动保存不再整表删除重写
+"""
+import hashlib
+import json
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models.storyboard import Storyboard
+
+CONTENT_FIELDS = ('description', 'camera', 'dialogue', 'mood')
+# 参与构建出图 Prompt 的字段，见 generation.build_storyboard_prompt
+PROMPT_FIELDS = ('description', 'camera', 'mood')
+
+
+def content_fingerprint(scene, fields=CONTENT_FIELDS):
+    """分镜内容指纹，scene 可以是字典或 Storyboard"""
+    if isinstance(scene, dict):
+        values = [scene.get(field) for field in fields]
+    else:
+        values = [getattr(scene, field) for field in fields]
+    raw = json.dumps(values, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _normalize(scenes):
+    """校验并整理提交的分镜，返回 [{'sequence', 'description', 'camera', 'dialogue', 'mood'}]"""
+    if not isinstance(scenes, list):
+        raise ValueError('scenes 必须为数组')
+
+    normalized = []
+    sequences = set()
+    for scene in scenes:
+        if not isinstance(scene, dict) or not scene.get('description'):
+            raise ValueError('分镜缺少画面描述')
+        try:
+            sequence = int(scene['sequence'])
+        except (KeyError, ValueError, TypeError):
+            raise ValueError('分镜缺少有效的序号')
+        if sequence in sequences:
+            raise ValueError(f'分镜序号重复: {sequence}')
+        sequences.add(sequence)
+        normalized.append({
+            'sequence': sequence,
+            'description': scene['description'],
+            'camera': scene.get('camera'),
+            'dialogue': scene.get('dialogue'),
+            'mood': scene.get('mood')
+        })
+    return normalized
+
+
+def sync_storyboards(project_id, scenes):
+    """
+    增量保存项目的分镜脚本
+
+    Args:
+        scenes: 完整的分镜列表，未出现的现有分镜会被删除
+
+    Returns:
+        dict: {'changed': 新增或修改的分镜字典列表, 'deleted': 删除的分镜 ID 列表, 'unchanged': 未变化的数量}
+
+    Raises:
+        ValueError: 分镜数据无效
+    """
+    incoming = _normalize(scenes)
+    existing = db.session.execute(
+        select(Storyboard).where(Storyboard.project_id == project_id)
+    ).scalars().all()
+
+    by_sequence = {row.sequence: row for row in existing}
+    fingerprints = {row.id: content_fingerprint(row) for row in existing}
+    matched = set()
+    remaining = []
+    unchanged = 0
+
+    # 1. 序号与内容都未变化
+    for scene in incoming:
+        scene['fingerprint'] = content_fingerprint(scene)
+        row = by_sequence.get(scene['sequence'])
+        if row is not None and fingerprints[row.id] == scene['fingerprint']:
+            matched.add(row.id)
+            unchanged += 1
+        else:
+            remaining.append(scene)
+
+    # 2. 序号移动的分镜：内容相同时只更新序号；仅对话变化时一并更新内容，保留图片
+    by_prompt = {}
+    for row in sorted(existing, key=lambda r: r.sequence):
+        if row.id not in matched:
+            by_prompt.setdefault(content_fingerprint(row, PROMPT_FIELDS), []).append(row)
+
+    updates = []
+    inserts = []
+    unmatched = []
+    for scene in remaining:
+        candidates = by_prompt.get(content_fingerprint(scene, PROMPT_FIELDS))
+        if not candidates:
+            unmatched.append(scene)
+            continue
+        # 优先选择内容完全相同的分镜
+        row = next((r for r in candidates if fingerprints[r.id] == scene['fingerprint']), candidates[0])
+        candidates.remove(row)
+        matched.add(row.id)
+        mapping = {'id': row.id, 'sequence': scene['sequence']}
+        if fingerprints[row.id] != scene['fingerprint']:
+            mapping.update({field: scene[field] for field in CONTENT_FIELDS})
+        updates.append(mapping)
+
+    # 3. 同一序号的内容修改；4. 新增
+    for scene in unmatched:
+        row = by_sequence.get(scene['sequence'])
+        values = {field: scene[field] for field in CONTENT_FIELDS}
+        if row is not None and row.id not in matched:
+            matched.add(row.id)
+            mapping = {'id': row.id, 'sequence': scene['sequence'], **values}
+            if content_fingerprint(row, PROMPT_FIELDS) != content_fingerprint(scene, PROMPT_FIELDS):
+                # 出图内容已变化，旧图片不再对应该分镜
+                mapping['comic_image_id'] = None
+            updates.append(mapping)
+        else:
+            inserts.append({'project_id': project_id, 'sequence': scene['sequence'], **values})
+
+    deleted = [row.id for row in existing if row.id not in matched]
+
+    if deleted:
+        db.session.execute(delete(Storyboard).where(Storyboard.id.in_(deleted)))
+    if updates:
+        db.session.execute(update(Storyboard), updates)
+    if inserts:
+        db.session.execute(insert(Storyboard), inserts)
+    db.session.commit()
+
+    changed_sequences = [mapping['sequence'] for mapping in updates + inserts]
+    changed = []
+    if changed_sequences:
+        changed = db.session.execute(
+            select(Storyboard).options(joinedload(Storyboard.comic_image)).where(
+                Storyboard.project_id == project_id, Storyboard.sequence.in_(changed_sequences)
+            ).order_by(Storyboard.sequence).execution_options(populate_existing=True)
+        ).scalars().all()
+
+    return {
+        'changed': [storyboard.to_dict() for storyboard in changed],
+        'deleted': deleted,
+        'unchanged': unchanged
+    }
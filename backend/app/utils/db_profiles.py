@@ -0,0 +1,103 @@
+"""
+数据库引擎配置
+按数据库类型生成 SQLAlchemy 引擎参数，并支持把只读接口路由到只读副本
+
+- SQLite: 每个连接启用 WAL (读写互不阻塞)、synchronous=NORMAL 与 busy_timeout，
+  生成任务的写入不会让并发的列表请求报 "database is locked"
+- PostgreSQL: 连接池大小、pre-ping、连接回收与语句超时
+- 只读副本: 配置 DATABASE_REPLICA_URL 后，标记为 @read_replica 的接口的查询发送到副本；
+  写入 (flush / INSERT / UPDATE / DELETE) 始终发送到主库。两个本地 SQLite 文件即可验证路由
+"""
+import os
+import sqlite3
+from functools import wraps
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL') or None
+REPLICA_BIND_KEY = 'replica'
+
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))
+
+
+def engine_options(uri):
+    """数据库 URI 对应的 SQLALCHEMY_ENGINE_OPTIONS"""
+    if not uri:
+        return {}
+    backend = make_url(uri).get_backend_name()
+
+    if backend == 'sqlite':
+        # 等待写锁的时间与 busy_timeout 一致；跨线程使用连接所需的 check_same_thread=False
+        # 由 SQLAlchemy (文件数据库) 与 Flask-SQLAlchemy (内存数据库) 自动设置
+        return {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000}}
+
+    if backend == 'postgresql':
+        return {
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE,
+            'pool_pre_ping': True,
+            'connect_args': {'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'}
+        }
+
+    return {'pool_pre_ping': True}
+
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        # 内存数据库不支持 WAL，会保持 memory 模式
+        cursor.execute(f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')
+        cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+        cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    finally:
+        cursor.close()
+
+
+def configure_database(app):
+    """写入主库与只读副本的引擎配置，需在 db.init_app 之前调用"""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config.get('SQLALCHEMY_DATABASE_URI'))
+    if DATABASE_REPLICA_URL:
+        app.config['SQLALCHEMY_BINDS'] = {
+            REPLICA_BIND_KEY: {'url': DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL)}
+        }
+
+    @app.before_request
+    def _reset_read_replica():
+        # 已存在应用上下文时 (测试) 多个请求共享同一个 g，标记不能延续到下一个请求
+        g.pop('use_read_replica', None)
+
+
+def read_replica(f):
+    """标记只读接口，其查询可发送到只读副本 (未配置副本时无影响)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_read_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+class RoutingSession(Session):
+    """只读接口的查询路由到副本，其余情况与 Flask-SQLAlchemy 默认行为一致"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('use_read_replica') and not self._flushing:
+            replica = self._db.engines.get(REPLICA_BIND_KEY)
+            if replica is not None and not getattr(clause, 'is_dml', False):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
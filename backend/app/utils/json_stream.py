@@ -0,0 +1,68 @@
+import json
+
+
+class IncrementalArrayParser:
+    """
+    增量 JSON 数组解析器
+    逐块喂入模型的流式输出，每当数组中的一个顶层对象的右括号到达时立即解析并返回该对象，
+    无需等待整个数组结束。数组之前的说明文字或 markdown 代码块标记会被忽略
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self._obj = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        """
+        喂入一段文本
+
+        Returns:
+            list: 本次新解析出的完整对象
+        """
+        items = []
+        for ch in text:
+            if self.finished:
+                break
+
+            if not self.started:
+                if ch == '[':
+                    self.started = True
+                continue
+
+            if self._obj is None:
+                if ch == '{':
+                    self._obj = ['{']
+                    self._depth = 1
+                elif ch == ']':
+                    self.finished = True
+                continue
+
+            self._obj.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = ''.join(self._obj)
+                    self._obj = None
+                    try:
+                        items.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        pass
+        return items
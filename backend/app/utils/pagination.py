@@ -0,0 +1,49 @@
+"""
+游标 (keyset) 分页工具
+游标是最后一条记录排序键的不透明编码，下一页以 "排序键 < 游标" 继续，不使用 OFFSET，
+翻页成本与页码无关，翻页期间插入新记录也不会导致重复或遗漏
+"""
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """游标无法解析"""
+
+
+def encode_cursor(*values):
+    raw = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """
+    解析游标
+
+    Args:
+        size: 排序键的个数
+
+    Returns:
+        list: 排序键；token 为空时返回 None
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('无效的分页游标')
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('无效的分页游标')
+    return values
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """解析 limit 参数，限制在 [1, maximum]"""
+    try:
+        return max(1, min(maximum, int(value)))
+    except (ValueError, TypeError):
+        return default
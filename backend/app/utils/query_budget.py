@@ -0,0 +1,162 @@
+"""
+请求级 SQL 查询统计与 N+1 检测
+通过 SQLAlchemy 引擎事件统计每个请求执行的查询数与数据库耗时，并按语句形状 (参数与 IN 列表归一化后的 SQL)
+分组，同一形状重复执行多次时记录日志，便于发现逐行懒加载等 N+1 问题
+
+- 调试模式 (或 QUERY_STATS_HEADER=1) 下在响应头中返回 X-DB-Query-Count 与 Server-Timing
+- 每个接口有查询预算 (默认 QUERY_BUDGET，可用 @query_budget(n) 单独指定)；超出时记录日志，
+  TESTING 配置或 QUERY_BUDGET_STRICT=1 时直接抛出 QueryBudgetExceeded，使测试失败
+- assert_max_queries(n) 上下文管理器可在测试或脚本中断言一段代码的查询数
+- 流式响应在 after_request 之后才输出，输出期间的查询只计入请求结束时的日志；
+  测试需读完响应体，并用 assert_max_queries 统计整个请求
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', '20'))
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', '').lower() in ('1', 'true', 'yes')
+QUERY_STATS_HEADER = os.getenv('QUERY_STATS_HEADER', '').lower() in ('1', 'true', 'yes')
+# 同一语句形状在一个请求中执行达到该次数时视为疑似 N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '5'))
+
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """请求或代码块执行的查询数超出预算"""
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """重复执行达到阈值的语句形状: [(形状, 次数)]"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def statement_shape(statement):
+    """归一化语句：折叠空白与 IN 列表，使只有参数不同的语句得到相同形状"""
+    return _PLACEHOLDER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+# 当前线程上额外的统计目标 (assert_max_queries)
+_local = threading.local()
+
+
+def _collectors():
+    if not hasattr(_local, 'collectors'):
+        _local.collectors = []
+    return _local.collectors
+
+
+def _active_stats():
+    targets = list(_collectors())
+    if has_request_context():
+        stats = g.get('query_stats')
+        if stats is not None:
+            targets.append(stats)
+    return targets
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start_time')
+    duration = time.perf_counter() - starts.pop() if starts else 0.0
+    for stats in _active_stats():
+        stats.record(statement, duration)
+
+
+def query_budget(limit):
+    """为接口指定查询预算 (默认 QUERY_BUDGET)；预算同时记录在视图函数的 query_budget 属性上"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            g.query_budget = limit
+            return f(*args, **kwargs)
+        decorated_function.query_budget = limit
+        return decorated_function
+    return decorator
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """代码块内的查询数超过 limit 时抛出 QueryBudgetExceeded"""
+    stats = QueryStats()
+    _collectors().append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors().remove(stats)
+    if stats.count > limit:
+        detail = '; '.join(f"{count}x {shape[:120]}" for shape, count in stats.shapes.most_common(3))
+        raise QueryBudgetExceeded(f"执行了 {stats.count} 条查询，预算 {limit}: {detail}")
+
+
+def view_budget(view):
+    """视图函数声明的查询预算，未用 @query_budget 声明时为 QUERY_BUDGET"""
+    return getattr(view, 'query_budget', QUERY_BUDGET)
+
+
+def _strict():
+    return QUERY_BUDGET_STRICT or current_app.config.get('TESTING', False)
+
+
+def init_app(app):
+    """在应用上注册请求级统计"""
+
+    @app.before_request
+    def _start_query_stats():
+        g.query_stats = QueryStats()
+        g.pop('query_budget', None)
+
+    @app.after_request
+    def _query_stats_headers(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        if app.debug or QUERY_STATS_HEADER:
+            # 流式响应只包含开始输出之前的查询
+            response.headers['X-DB-Query-Count'] = str(stats.count)
+            response.headers['Server-Timing'] = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+        budget = g.get('query_budget', QUERY_BUDGET)
+        if stats.count > budget and _strict():
+            raise QueryBudgetExceeded(
+                f"{request.method} {request.path} 执行了 {stats.count} 条查询，预算 {budget}"
+            )
+        return response
+
+    @app.teardown_request
+    def _report_query_stats(exc):
+        stats = g.pop('query_stats', None)
+        if stats is None or not stats.count:
+            return
+        budget = g.get('query_budget', QUERY_BUDGET)
+        endpoint = request.endpoint or request.path
+        if stats.count > budget:
+            print(f"QueryBudget: {endpoint} executed {stats.count} queries "
+                  f"({stats.duration * 1000:.1f}ms), budget {budget}")
+        for shape, count in stats.repeated():
+            print(f"QueryBudget: possible N+1 in {endpoint}: {count}x {shape[:200]}")
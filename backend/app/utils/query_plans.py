@@ -0,0 +1,92 @@
+"""
+查询计划回归检查 (tests/test_query_plans.py 与 python manage.py explain)
+对各接口的热点查询执行 EXPLAIN，出现全表扫描时报告失败，防止索引覆盖随接口变化悄悄退化
+
+- SQLite: EXPLAIN QUERY PLAN，明细为 "SCAN <表>" (不带 USING INDEX) 视为全表扫描
+- PostgreSQL: EXPLAIN (FORMAT JSON)，计划中出现 Seq Scan 节点视为全表扫描；
+  检查期间关闭 enable_seqscan，使小表 / 空表上仍能看出是否存在可用索引
+"""
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app import db
+from app.models.character import CharacterTemplate
+from app.models.comic import ComicImage
+from app.models.project import Project
+from app.models.storyboard import Storyboard
+from app.services.jobs import claimable_query
+from app.utils.serializers import serializer_for
+
+_SAMPLE_ID = 1
+_SQLITE_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def hot_queries():
+    """(名称, SQLAlchemy 语句)，使用各接口执行查询时调用的同一个构建函数"""
+    comics = serializer_for(ComicImage)
+    return [
+        ('projects.list', serializer_for(Project).select().where(Project.owner_id == _SAMPLE_ID)),
+        ('projects.dashboard', Project.dashboard_query(_SAMPLE_ID).limit(21)),
+        ('projects.check_access', Project.access_query(_SAMPLE_ID, _SAMPLE_ID)),
+        ('comics.project_images', ComicImage.project_listing_query(comics, _SAMPLE_ID)),
+        ('comics.project_images_page', ComicImage.project_listing_query(comics, _SAMPLE_ID, (0, _SAMPLE_ID)).limit(201)),
+        ('stories.project_storyboards', Storyboard.project_listing_query(serializer_for(Storyboard), _SAMPLE_ID)),
+        ('characters.list', serializer_for(CharacterTemplate).select().where(CharacterTemplate.owner_id == _SAMPLE_ID)),
+        ('jobs.claimable', claimable_query(datetime(2024, 1, 1))),
+    ]
+
+
+def _explain_sqlite(sql):
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+    plan = [row[-1] for row in rows]
+    scans = [match.group(1) for match in map(_SQLITE_FULL_SCAN.match, plan) if match]
+    return plan, scans
+
+
+def _seq_scans(node, found):
+    if node.get('Node Type') == 'Seq Scan':
+        found.append(node.get('Relation Name'))
+    for child in node.get('Plans', []):
+        _seq_scans(child, found)
+    return found
+
+
+def _explain_postgresql(sql):
+    db.session.execute(text('SET LOCAL enable_seqscan = off'))
+    result = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+    root = result[0]['Plan']
+    return [root], _seq_scans(root, [])
+
+
+def explain_statement(statement):
+    """
+    执行单条语句的 EXPLAIN
+
+    Returns:
+        tuple: (计划明细列表, 全表扫描的表名列表)
+    """
+    dialect = db.engine.dialect
+    explain = {'sqlite': _explain_sqlite, 'postgresql': _explain_postgresql}.get(dialect.name)
+    if explain is None:
+        raise RuntimeError(f'不支持的数据库: {dialect.name}')
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    try:
+        return explain(sql)
+    finally:
+        db.session.rollback()
+
+
+def check_query_plans():
+    """
+    执行所有热点查询的 EXPLAIN
+
+    Returns:
+        list: [{'name', 'plan', 'full_scans'}]，full_scans 非空表示出现全表扫描
+    """
+    results = []
+    for name, statement in hot_queries():
+        plan, scans = explain_statement(statement)
+        results.append({'name': name, 'plan': plan, 'full_scans': scans})
+    return results
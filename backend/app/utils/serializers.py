@@ -0,0 +1,161 @@
+"""
+响应序列化层
+列表接口直接查询所需的列，用预编译的行序列化器转换为字典，不构建 ORM 对象、不逐行调用 to_dict
+
+- 每个模型通过 serializer_fields() 声明字段: {键: (依赖的列表达式, 取值函数)}；
+  serializer_for(模型, 字段) 按字段组合编译一次并缓存，之后每行只执行一次字典推导
+- 客户端传入的字段列表 (?fields=) 先经 parse_fields 校验、去重并按声明顺序排列，
+  同一字段集合只对应一个缓存项；缓存另有容量上限 SERIALIZER_CACHE_SIZE
+- 取值函数基于属性名读取，同时适用于 select(列...) 返回的 Row 与 ORM 实例
+- 安装了 orjson 时 jsonify 与流式数组都通过 orjson 编码，否则使用标准库 json
+"""
+import json
+import os
+from functools import lru_cache
+from operator import attrgetter
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+
+try:
+    import orjson
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    orjson = None
+    JSON_BACKEND = 'json'
+
+STREAM_CHUNK_ITEMS = 100
+# 按 (模型, 字段组合) 缓存的序列化器数量上限
+SERIALIZER_CACHE_SIZE = int(os.getenv('SERIALIZER_CACHE_SIZE', '128'))
+
+
+def column(expression, convert=None):
+    """直接输出一列，可选转换函数"""
+    get = attrgetter(expression.key)
+    if convert is None:
+        return (expression,), get
+    return (expression,), lambda row: convert(get(row))
+
+
+def computed(columns, fn):
+    """由多列计算得到的字段"""
+    return tuple(columns), fn
+
+
+def result_key(key):
+    """由调用方在查询中提供的列 (按标签名读取)"""
+    return (), attrgetter(key)
+
+
+def isoformat(value):
+    return value.isoformat() if value else None
+
+
+def or_empty(value):
+    return value or {}
+
+
+class RowSerializer:
+    """预编译的序列化器：columns 为需要查询的列，调用时把一行转换为字典"""
+
+    def __init__(self, spec, fields):
+        unknown = [field for field in fields if field not in spec]
+        if unknown:
+            raise KeyError(', '.join(unknown))
+
+        columns = []
+        keys = set()
+        for field in fields:
+            for expression in spec[field][0]:
+                if expression.key not in keys:
+                    keys.add(expression.key)
+                    columns.append(expression)
+        self.fields = fields
+        self.columns = tuple(columns)
+        self._getters = tuple((field, spec[field][1]) for field in fields)
+
+    def __call__(self, row):
+        return {field: get(row) for field, get in self._getters}
+
+    def select(self, *extra):
+        """只包含所需列的查询，extra 为分页等额外需要的列 (已包含的会跳过)"""
+        keys = {expression.key for expression in self.columns}
+        return select(*self.columns, *(expression for expression in extra if expression.key not in keys))
+
+    def many(self, rows):
+        return [{field: get(row) for field, get in self._getters} for row in rows]
+
+
+@lru_cache(maxsize=None)
+def declared_fields(model):
+    """模型声明的全部字段名，按声明顺序"""
+    return tuple(model.serializer_fields())
+
+
+def parse_fields(model, value):
+    """
+    解析逗号分隔的字段参数：去重并按模型声明的顺序排列，使缓存键只取决于字段集合
+
+    Returns:
+        字段名元组，value 为空时返回 None (使用 model.DEFAULT_FIELDS)
+
+    Raises:
+        KeyError: 包含模型未声明的字段
+    """
+    requested = {field.strip() for field in (value or '').split(',') if field.strip()}
+    if not requested:
+        return None
+    declared = declared_fields(model)
+    unknown = sorted(requested.difference(declared))
+    if unknown:
+        raise KeyError(', '.join(unknown))
+    return tuple(field for field in declared if field in requested)
+
+
+@lru_cache(maxsize=SERIALIZER_CACHE_SIZE)
+def serializer_for(model, fields=None):
+    """
+    模型的序列化器 (按字段组合缓存)；客户端提供的字段需先经 parse_fields 整理
+
+    Args:
+        fields: 字段名元组，None 表示 model.DEFAULT_FIELDS
+
+    Raises:
+        KeyError: 包含模型未声明的字段
+    """
+    return RowSerializer(model.serializer_fields(), tuple(fields or model.DEFAULT_FIELDS))
+
+
+def dumps(obj):
+    """编码为 JSON 字节串"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def iter_json_array(rows, serialize, chunk_items=STREAM_CHUNK_ITEMS):
+    """把行流式编码为 JSON 数组，每块最多 chunk_items 个元素，不在内存中拼接完整列表"""
+    chunk = [b'[']
+    for index, row in enumerate(rows):
+        if index:
+            chunk.append(b',')
+        chunk.append(dumps(serialize(row)))
+        if len(chunk) >= chunk_items * 2:
+            yield b''.join(chunk)
+            chunk = []
+    chunk.append(b']')
+    yield b''.join(chunk)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify 使用 orjson 编码 (未安装时与默认行为一致)；日期等类型仍按 Flask 默认规则转换"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or not set(kwargs) <= {'separators', 'indent'}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
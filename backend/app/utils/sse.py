@@ -0,0 +1,18 @@
+import json
+
+
+def format_sse(data, event=None):
+    """格式化一条 Server-Sent Events 消息"""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    payload = json.dumps(data, ensure_ascii=False)
+    lines.append(f"data: {payload}")
+    return '\n'.join(lines) + '\n\n'
+
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # 关闭 nginx 代理缓冲，保证事件实时送达
+    'X-Accel-Buffering': 'no'
+}
@@ -14,6 +14,8 @@ from app.models.user import User
 from app.models.project import Project
 from app.models.character import CharacterTemplate
 from app.models.comic import ComicImage
+from app.models.job import GenerationJob
+from app.utils.db_profiles import REPLICA_BIND_KEY
 
 def create_tables():
     """创建数据库表"""
@@ -21,6 +23,11 @@ def create_tables():
     with app.app_context():
         print("正在创建数据库表...")
         db.create_all()
+        # 本地验证读写分离时，副本 (另一个 SQLite 文件) 也需要表结构
+        replica = db.engines.get(REPLICA_BIND_KEY)
+        if replica is not None:
+            db.metadata.create_all(bind=replica)
+            print("只读副本表结构已创建")
         print("数据库表创建完成!")
 
 def drop_tables():
@@ -106,9 +113,64 @@ def run_migrations():
         print(f"迁移失败: {e}")
         sys.exit(1)
 
+def run_worker(threads=1):
+    """启动后台任务 worker"""
+    from app.services.jobs import run_worker as run_job_worker
+    app = create_app('development')
+    print(f"正在启动任务 worker (线程数: {threads})...")
+    run_job_worker(app, threads=threads)
+
+def run_gc(args):
+    """清理孤儿图片并合并重复图片"""
+    from app.services.image_gc import GC_GRACE_HOURS, GC_QUARANTINE_DAYS, collect_garbage
+    grace_hours = GC_GRACE_HOURS
+    quarantine_days = GC_QUARANTINE_DAYS
+    for arg in args:
+        if arg.startswith('--grace-hours='):
+            grace_hours = float(arg.split('=', 1)[1])
+        elif arg.startswith('--quarantine-days='):
+            quarantine_days = float(arg.split('=', 1)[1])
+    dry_run = '--dry-run' in args
+
+    app = create_app('development')
+    with app.app_context():
+        print(f"正在清理图片存储 (宽限期: {grace_hours} 小时{', 仅统计' if dry_run else ''})...")
+        stats = collect_garbage(
+            dry_run=dry_run,
+            quarantine='--quarantine' in args,
+            grace_hours=grace_hours,
+            dedup='--no-dedup' not in args,
+            quarantine_days=quarantine_days
+        )
+        for key, value in stats.items():
+            print(f"  {key}: {value}")
+        print("图片清理完成!")
+
+def run_explain():
+    """检查热点查询的执行计划，出现全表扫描时以非零状态退出"""
+    from app.utils.query_plans import check_query_plans
+    app = create_app('development')
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            db.create_all()
+        print(f"正在检查查询计划 ({db.engine.dialect.name})...")
+        failed = False
+        for result in check_query_plans():
+            status = 'FULL SCAN' if result['full_scans'] else 'ok'
+            print(f"  [{status}] {result['name']}")
+            for line in result['plan']:
+                print(f"      {line}")
+            if result['full_scans']:
+                failed = True
+                print(f"      全表扫描: {', '.join(map(str, result['full_scans']))}")
+        if failed:
+            print("存在全表扫描的查询，请检查索引!")
+            sys.exit(1)
+        print("查询计划检查通过!")
+
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print("用法: python manage.py [create|drop|reset|sample|migrate]")
+    if len(sys.argv) < 2:
+        print("用法: python manage.py [create|drop|reset|sample|migrate|worker|gc|explain]")
         sys.exit(1)
     
     command = sys.argv[1]
@@ -123,6 +185,14 @@ if __name__ == '__main__':
         create_sample_data()
     elif command == 'migrate':
         run_migrations()
+    elif command == 'worker':
+        threads = int(sys.argv[2]) if len(sys.argv) > 2 else int(os.getenv('JOB_WORKER_THREADS', '1'))
+        run_worker(threads)
+    elif command == 'gc':
+        # python manage.py gc [--dry-run] [--quarantine] [--no-dedup] [--grace-hours=24] [--quarantine-days=7]
+        run_gc(sys.argv[2:])
+    elif command == 'explain':
+        run_explain()
     else:
-        print("未知命令。可用命令: create, drop, reset, sample, migrate")
+        print("未知命令。可用命令: create, drop, reset, sample, migrate, worker, gc, explain")
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""Add generation jobs table
+
+Revision ID: 003_generation_jobs
+Revises: 002_collaboration_features
+Create Date: 2024-01-03 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003_generation_jobs'
+down_revision = '002_collaboration_features'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 后台生成任务表
+    op.create_table('generation_jobs',
+        sa.Column('id', sa.String(36), nullable=False),
+        sa.Column('kind', sa.String(50), nullable=False),
+        sa.Column('payload', sa.JSON()),
+        sa.Column('status', sa.String(20), server_default='queued'),
+        sa.Column('progress', sa.Integer(), server_default='0'),
+        sa.Column('result', sa.JSON()),
+        sa.Column('error', sa.Text()),
+        sa.Column('attempts', sa.Integer(), server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), server_default='3'),
+        sa.Column('user_id', sa.Integer()),
+        sa.Column('project_id', sa.Integer()),
+        sa.Column('worker_id', sa.String(100)),
+        sa.Column('available_at', sa.DateTime(), server_default=sa.text('now()')),
+        sa.Column('heartbeat_at', sa.DateTime()),
+        sa.Column('lease_expires_at', sa.DateTime()),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('finished_at', sa.DateTime()),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_generation_jobs_status', 'generation_jobs', ['status'])
+
+def downgrade():
+    op.drop_index('ix_generation_jobs_status', table_name='generation_jobs')
+    op.drop_table('generation_jobs')
@@ -0,0 +1,22 @@
+"""Add image derivatives column
+
+Revision ID: 004_image_derivatives
+Revises: 003_generation_jobs
+Create Date: 2024-01-04 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004_image_derivatives'
+down_revision = '003_generation_jobs'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # WebP 缩略图 URL，按宽度索引
+    op.add_column('comic_images', sa.Column('derivatives', sa.JSON()))
+
+def downgrade():
+    op.drop_column('comic_images', 'derivatives')
@@ -0,0 +1,34 @@
+"""Add unique (project_id, user_id) index on project collaborators
+
+Revision ID: 005_collaborator_access_index
+Revises: 004_image_derivatives
+Create Date: 2024-01-05 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005_collaborator_access_index'
+down_revision = '004_image_derivatives'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 先删除重复的协作记录 (保留最早的一条)，再建立唯一索引
+    op.execute("""
+        DELETE FROM project_collaborators
+        WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id FROM project_collaborators GROUP BY project_id, user_id
+            ) AS keep
+        )
+    """)
+    # 权限检查的 EXISTS 查询按 (project_id, user_id) 精确查找
+    op.create_index(
+        'ix_project_collaborators_project_user', 'project_collaborators',
+        ['project_id', 'user_id'], unique=True
+    )
+
+def downgrade():
+    op.drop_index('ix_project_collaborators_project_user', table_name='project_collaborators')
@@ -0,0 +1,33 @@
+"""Add indexes for hot queries
+
+Revision ID: 007_hot_query_indexes
+Revises: 006_storyboards_table
+Create Date: 2024-01-07 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007_hot_query_indexes'
+down_revision = '006_storyboards_table'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 画布图层: WHERE project_id = ? ORDER BY layer_order
+    op.create_index('ix_comic_images_project_layer', 'comic_images', ['project_id', 'layer_order'])
+    # 旧版任务状态查询
+    op.create_index('ix_comic_images_midjourney_task_id', 'comic_images', ['midjourney_task_id'])
+    # 分镜列表: WHERE project_id = ? ORDER BY sequence
+    op.create_index('ix_storyboards_project_sequence', 'storyboards', ['project_id', 'sequence'])
+    # 角色模板与项目列表按所有者过滤
+    op.create_index('ix_character_templates_owner_id', 'character_templates', ['owner_id'])
+    op.create_index('ix_projects_owner_id', 'projects', ['owner_id'])
+
+def downgrade():
+    op.drop_index('ix_projects_owner_id', table_name='projects')
+    op.drop_index('ix_character_templates_owner_id', table_name='character_templates')
+    op.drop_index('ix_storyboards_project_sequence', table_name='storyboards')
+    op.drop_index('ix_comic_images_midjourney_task_id', table_name='comic_images')
+    op.drop_index('ix_comic_images_project_layer', table_name='comic_images')
@@ -0,0 +1,22 @@
+"""Add user_id index on project collaborators
+
+Revision ID: 008_collaborator_user_index
+Revises: 007_hot_query_indexes
+Create Date: 2024-01-08 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_collaborator_user_index'
+down_revision = '007_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 项目面板按用户查找参与协作的项目
+    op.create_index('ix_project_collaborators_user_id', 'project_collaborators', ['user_id'])
+
+def downgrade():
+    op.drop_index('ix_project_collaborators_user_id', table_name='project_collaborators')
@@ -0,0 +1,25 @@
+"""Make comic_images.layer_order non-null
+
+Revision ID: 009_comic_layer_order_not_null
+Revises: 008_collaborator_user_index
+Create Date: 2024-01-09 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009_comic_layer_order_not_null'
+down_revision = '008_collaborator_user_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 图片列表按 (layer_order, id) 排序与分页，NULL 在 SQLite 中排在最前、在 PostgreSQL 中排在最后，游标无法定位
+    op.execute('UPDATE comic_images SET layer_order = 0 WHERE layer_order IS NULL')
+    with op.batch_alter_table('comic_images') as batch_op:
+        batch_op.alter_column('layer_order', existing_type=sa.Integer(), nullable=False, server_default='0')
+
+def downgrade():
+    with op.batch_alter_table('comic_images') as batch_op:
+        batch_op.alter_column('layer_order', existing_type=sa.Integer(), nullable=True, server_default=None)
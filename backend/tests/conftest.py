@@ -0,0 +1,87 @@
+"""
+测试公共夹具
+导入应用之前把图片目录与缓存文件指向临时目录并关闭 Redis，测试不依赖外部服务
+"""
+import os
+import tempfile
+
+TEST_DATA_DIR = tempfile.mkdtemp(prefix='comic-editor-tests-')
+os.environ['IMAGE_SAVE_DIR'] = os.path.join(TEST_DATA_DIR, 'images')
+os.environ['CACHE_DB_PATH'] = os.path.join(TEST_DATA_DIR, 'cache.db')
+os.environ['STORAGE_BACKEND'] = 'local'
+os.environ.pop('STORAGE_LOCAL_ROOT', None)
+os.environ.pop('REDIS_URL', None)
+os.environ.pop('DATABASE_REPLICA_URL', None)
+
+import pytest
+
+from app import create_app, db as _db
+from app.models.project import Project
+from app.models.user import User
+from app.utils.query_budget import assert_max_queries, view_budget
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        _db.create_all()
+        yield app
+        _db.session.remove()
+        _db.drop_all()
+
+
+@pytest.fixture
+def db(app):
+    return _db
+
+
+def _create_user(name):
+    user = User(username=name, email=f'{name}@example.com')
+    user.set_password('password')
+    _db.session.add(user)
+    _db.session.commit()
+    return user
+
+
+@pytest.fixture
+def user(db):
+    return _create_user('alice')
+
+
+@pytest.fixture
+def other_user(db):
+    return _create_user('bob')
+
+
+@pytest.fixture
+def auth_headers(user):
+    return {'Authorization': f'Bearer {user.generate_token()}'}
+
+
+@pytest.fixture
+def project(db, user):
+    project = Project(name='测试项目', owner_id=user.id)
+    db.session.add(project)
+    db.session.commit()
+    return project
+
+
+@pytest.fixture
+def call_within_budget(app, client):
+    """
+    调用接口并读完响应体 (流式响应输出期间的查询同样计入)，
+    断言整个请求的查询数不超过接口声明的预算；返回的响应带有 query_count 属性
+    """
+    adapter = app.url_map.bind('localhost')
+
+    def call(method, path, **kwargs):
+        endpoint, _ = adapter.match(path.split('?', 1)[0], method=method)
+        with assert_max_queries(view_budget(app.view_functions[endpoint])) as stats:
+            response = client.open(path, method=method, **kwargs)
+            response.get_data()
+            response.close()
+        response.query_count = stats.count
+        return response
+
+    return call
@@ -0,0 +1,71 @@
+import pytest
+
+moto = pytest.importorskip('moto')
+boto3 = pytest.importorskip('boto3')
+
+from app.services.blob_storage import S3Backend
+from app.services.image_store import ImageStore
+
+BUCKET = 'comic-test'
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+@pytest.fixture
+def s3_backend(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket=BUCKET)
+        yield S3Backend(bucket=BUCKET, prefix='images', region='us-east-1')
+
+
+@pytest.fixture
+def store(tmp_path, s3_backend):
+    return ImageStore(root=tmp_path / 'cache', backend=s3_backend)
+
+
+def test_save_uploads_to_bucket(store, s3_backend):
+    path, url = store.save(PNG, 'png', prefix='gemini-')
+    relative = store.relative_from_url(url)
+
+    assert relative == store.relative_path(path.name)
+    assert s3_backend.exists(relative)
+    head = s3_backend.client.head_object(Bucket=BUCKET, Key=f'images/{relative}')
+    assert head['ContentType'] == 'image/png'
+    assert 'immutable' in head['CacheControl']
+
+
+def test_read_through_after_local_cache_is_cleared(store):
+    path, url = store.save(PNG, 'png', prefix='gemini-')
+    path.unlink()
+
+    assert store.exists(path.name)
+    local = store.ensure_local(store.relative_from_url(url))
+    assert local == path
+    assert local.read_bytes() == PNG
+
+
+def test_delete_removes_object(store, s3_backend):
+    path, url = store.save(PNG, 'png', prefix='gemini-')
+    relative = store.relative_from_url(url)
+    path.unlink()
+
+    s3_backend.delete(relative)
+
+    assert not s3_backend.exists(relative)
+    assert not store.exists(path.name)
+    assert store.ensure_local(relative) is None
+
+
+def test_iter_keys_and_presigned_url(store, s3_backend):
+    _, url = store.save(PNG, 'png', prefix='gemini-')
+    relative = store.relative_from_url(url)
+
+    assert [key for key, size, _ in s3_backend.iter_keys()] == [relative]
+    assert BUCKET in s3_backend.read_url(relative)
+
+
+def test_relative_from_url_rejects_foreign_urls(store):
+    assert store.relative_from_url('https://example.com/images/a.png') is None
+    assert store.relative_from_url('/api/images/../secret.png') is None
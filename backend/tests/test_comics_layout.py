@@ -0,0 +1,85 @@
+import pytest
+
+from app.models.comic import ComicImage
+
+
+@pytest.fixture
+def images(db, project):
+    images = [ComicImage(project_id=project.id, prompt=f'p{index}', layer_order=index) for index in range(3)]
+    db.session.add_all(images)
+    db.session.commit()
+    return [image.id for image in images]
+
+
+def test_patch_layout_updates_in_one_batch(client, auth_headers, project, images):
+    response = client.patch(f'/api/comics/project/{project.id}/layout', headers=auth_headers, json={
+        'changes': [{'id': images[0], 'position_x': 10, 'layer_order': 5}, {'id': images[1], 'width': 300}]
+    })
+
+    assert response.status_code == 200
+    assert response.get_json() == {'updated': 2}
+
+
+def test_patch_layout_rejects_foreign_images(client, auth_headers, project, images):
+    response = client.patch(f'/api/comics/project/{project.id}/layout', headers=auth_headers, json={
+        'changes': [{'id': 999, 'position_x': 1}]
+    })
+
+    assert response.status_code == 400
+    assert response.get_json()['ids'] == [999]
+
+
+def test_reorder_updates_layer_order(client, db, auth_headers, project, images):
+    response = client.post('/api/comics/reorder', headers=auth_headers, json={
+        'project_id': project.id,
+        'image_orders': [{'image_id': images[0], 'order': 2}, {'image_id': images[2], 'order': 0}]
+    })
+
+    assert response.status_code == 200
+    orders = dict(db.session.query(ComicImage.id, ComicImage.layer_order))
+    assert orders == {images[0]: 2, images[1]: 1, images[2]: 0}
+
+
+@pytest.mark.parametrize('image_orders', [
+    [{'image_id': 1}],
+    [{'order': 1}],
+    [{'image_id': '1', 'order': 1}],
+    [{'image_id': 1, 'order': 'top'}],
+    ['not-an-object'],
+    {'image_id': 1, 'order': 1},
+])
+def test_reorder_rejects_invalid_payload(client, auth_headers, project, images, image_orders):
+    response = client.post('/api/comics/reorder', headers=auth_headers, json={
+        'project_id': project.id, 'image_orders': image_orders
+    })
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('method', ['PUT', 'POST'])
+def test_null_layer_order_is_rejected(client, auth_headers, project, images, method):
+    if method == 'PUT':
+        response = client.put(f'/api/comics/{images[0]}', headers=auth_headers, json={'layer_order': None})
+    else:
+        response = client.post('/api/comics', headers=auth_headers, json={
+            'project_id': project.id, 'prompt': 'p', 'layer_order': None
+        })
+
+    assert response.status_code == 400
+
+
+def test_cursor_pages_cover_every_image_once(client, db, auth_headers, project, images):
+    db.session.add_all([ComicImage(project_id=project.id, prompt='same', layer_order=1) for _ in range(3)])
+    db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        url = f'/api/comics/project/{project.id}?limit=2&fields=id' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url, headers=auth_headers)
+        seen += [item['id'] for item in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+
+    assert seen == [row.id for row in db.session.query(ComicImage.id).order_by(ComicImage.layer_order, ComicImage.id)]
+    assert len(seen) == len(set(seen)) == 6
@@ -0,0 +1,39 @@
+import pytest
+
+from app.services import derivatives
+from app.services.image_store import ImageStore
+from app.services.blob_storage import BlobBackend
+
+
+class UnreachableBackend(BlobBackend):
+    name = 'unreachable'
+
+    def exists(self, key):
+        raise ConnectionError('storage unavailable')
+
+    def put_file(self, key, path, immutable=False):
+        pass
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ImageStore(root=tmp_path, backend=UnreachableBackend())
+    monkeypatch.setattr(derivatives, 'get_image_store', lambda: store)
+    monkeypatch.setattr(derivatives, 'DERIVATIVES_ENABLED', True)
+    monkeypatch.setattr(derivatives, 'DERIVATIVE_WIDTHS', [160, 400])
+    return store
+
+
+def test_request_path_lookup_does_not_touch_remote_storage(store):
+    name = 'gemini-' + 'a' * 32 + '.png'
+    thumbnail = store.path_for(derivatives.derivative_name(name, 160))
+    thumbnail.parent.mkdir(parents=True, exist_ok=True)
+    thumbnail.write_bytes(b'webp')
+
+    urls = derivatives.derivative_urls(store.url_for(name), render=False)
+
+    assert urls == {'160': store.url_for(derivatives.derivative_name(name, 160))}
+
+
+def test_external_url_has_no_derivatives(store):
+    assert derivatives.derivative_urls('https://example.com/a.png', render=False) == {}
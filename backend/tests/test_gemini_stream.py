@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.gemini import GeminiService
+
+
+class DictCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+@pytest.fixture
+def service():
+    service = GeminiService()
+    service.analysis_cache = DictCache()
+    return service
+
+
+def _stream(service, chunks):
+    def generate_content_stream(model, contents):
+        return iter([SimpleNamespace(text=chunk) for chunk in chunks])
+    service.client = SimpleNamespace(models=SimpleNamespace(generate_content_stream=generate_content_stream))
+
+
+def test_complete_stream_is_cached(service):
+    _stream(service, ['[{"sequence": 1, "description": "a"},', ' {"sequence": 2, "description": "b"}]'])
+
+    scenes = list(service.analyze_story_stream('故事'))
+
+    assert [scene['sequence'] for scene in scenes] == [1, 2]
+    assert list(service.analysis_cache.values.values()) == [scenes]
+
+
+def test_truncated_stream_is_not_cached(service):
+    _stream(service, ['[{"sequence": 1, "description": "a"},', ' {"sequence": 2, "descri'])
+
+    scenes = list(service.analyze_story_stream('故事'))
+
+    assert [scene['sequence'] for scene in scenes] == [1]
+    assert service.analysis_cache.values == {}
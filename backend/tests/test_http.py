@@ -0,0 +1,45 @@
+from app.services import http
+
+
+def _session(monkeypatch, proxy=None):
+    monkeypatch.setattr(http, '_sessions', {})
+    monkeypatch.setattr(http, '_httpx_metrics', {})
+    for variable in ('HTTPS_PROXY', 'HTTP_PROXY'):
+        monkeypatch.delenv(variable, raising=False)
+    if proxy:
+        monkeypatch.setenv('HTTPS_PROXY', proxy)
+    return http.get_http_session('upstream')
+
+
+def _record(pool, requests_count, connections):
+    pool.num_requests = requests_count
+    pool.num_connections = connections
+
+
+def test_direct_pools_are_counted(monkeypatch):
+    session = _session(monkeypatch)
+    adapter = session.get_adapter('https://example.com')
+    _record(adapter.poolmanager.connection_from_url('https://example.com'), 4, 1)
+
+    stats = http.transport_stats()['upstream']
+
+    assert (stats['requests'], stats['new_connections'], stats['reused_connections']) == (4, 1, 3)
+
+
+def test_proxy_manager_pools_are_counted(monkeypatch):
+    session = _session(monkeypatch, proxy='http://proxy.local:3128')
+    adapter = session.get_adapter('https://example.com')
+    manager = adapter.proxy_manager_for('http://proxy.local:3128')
+    _record(manager.connection_from_url('https://example.com'), 5, 2)
+
+    stats = http.transport_stats()['upstream']
+
+    assert (stats['requests'], stats['new_connections']) == (5, 2)
+
+
+def test_unknown_pool_container_is_ignored(monkeypatch):
+    session = _session(monkeypatch)
+    adapter = session.get_adapter('https://example.com')
+    monkeypatch.setattr(adapter.poolmanager, 'pools', object())
+
+    assert http.transport_stats()['upstream']['requests'] == 0
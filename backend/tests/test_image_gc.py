@@ -0,0 +1,98 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.character import CharacterTemplate
+from app.models.comic import ComicImage
+from app.models.job import GenerationJob
+from app.services import image_gc
+from app.services.blob_storage import LocalBackend
+from app.services.image_store import ImageStore
+
+OLD = time.time() - 30 * 86400
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ImageStore(root=tmp_path, backend=LocalBackend(tmp_path))
+    monkeypatch.setattr(image_gc, 'get_image_store', lambda: store)
+    return store
+
+
+def _put(store, name, data):
+    path = store.path_for(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    os.utime(path, (OLD, OLD))
+    return store.url_for(name)
+
+
+def test_duplicates_are_repointed_in_every_referencing_column(db, store, project, user):
+    first = _put(store, 'upload-a.png', b'same bytes')
+    second = _put(store, 'upload-b.png', b'same bytes')
+    # 被任务结果引用的副本无法改写，作为保留的副本
+    pinned = _put(store, 'upload-c.png', b'same bytes')
+    image = ComicImage(project_id=project.id, prompt='p', image_url=first)
+    character = CharacterTemplate(name='c', owner_id=user.id, reference_images=[second, 'https://example.com/x.png'])
+    job = GenerationJob(id='job-1', kind='generate_image', status='completed', result={'image_url': pinned})
+    db.session.add_all([image, character, job])
+    db.session.commit()
+
+    stats = image_gc.collect_garbage(grace_hours=1)
+
+    db.session.expire_all()
+    assert stats['duplicate_files'] == 2
+    assert stats['rewritten_images'] == 2
+    assert image.image_url == pinned
+    assert character.reference_images == [pinned, 'https://example.com/x.png']
+    assert store.path_for('upload-c.png').is_file()
+    assert not store.path_for('upload-a.png').exists()
+    assert not store.path_for('upload-b.png').exists()
+
+
+def test_dedup_buckets_do_not_change_result(db, store):
+    for index in range(6):
+        _put(store, f'upload-{index}.png', b'x' * (index % 3 + 1))
+
+    assert image_gc.deduplicate(store, dry_run=True, buckets=1)['duplicate_files'] == 3
+    assert image_gc.deduplicate(store, dry_run=True, buckets=4)['duplicate_files'] == 3
+
+
+def test_quarantined_files_expire(db, store):
+    _put(store, 'orphan.png', b'orphan')
+
+    stats = image_gc.collect_garbage(grace_hours=1, quarantine=True, quarantine_days=7)
+    assert stats['removed_files'] == 1
+    quarantined = [key for key, _, _ in store.backend.iter_keys(prefix=image_gc.QUARANTINE_DIR)]
+    assert len(quarantined) == 1
+
+    # 移入隔离目录时刷新修改时间，未到期前不会被删除
+    assert image_gc.purge_quarantine(store, max_age_days=7) == 0
+    os.utime(store.root / quarantined[0], (OLD, OLD))
+    assert image_gc.purge_quarantine(store, max_age_days=7) == 1
+    assert list(store.backend.iter_keys(prefix=image_gc.QUARANTINE_DIR)) == []
+
+
+def test_finished_job_results_stop_pinning_after_grace(db, store, project, user):
+    replaced = _put(store, 'gemini-old.png', b'old panel')
+    current = _put(store, 'gemini-new.png', b'new panel')
+    running = _put(store, 'gemini-running.png', b'in progress')
+    long_ago = datetime.utcnow() - timedelta(days=30)
+    # 旧的批量任务结果中的分镜图片已被重新生成替换，ComicImage 只引用新图
+    db.session.add_all([
+        GenerationJob(id='job-old', kind='generate_all', status='completed', project_id=project.id,
+                      result={'images': [{'image_url': replaced}]}, finished_at=long_ago, updated_at=long_ago),
+        GenerationJob(id='job-running', kind='generate_image', status='running', user_id=user.id,
+                      result={'image_url': running}, updated_at=long_ago),
+        ComicImage(project_id=project.id, prompt='p', image_url=current)
+    ])
+    db.session.commit()
+
+    stats = image_gc.collect_garbage(grace_hours=1)
+
+    assert stats['removed_files'] == 1
+    assert not store.path_for('gemini-old.png').exists()
+    assert store.path_for('gemini-new.png').is_file()
+    assert store.path_for('gemini-running.png').is_file()
@@ -0,0 +1,47 @@
+from app.models.job import GenerationJob
+from app.services import jobs
+
+
+@jobs.job_handler('test_failing')
+def _failing_handler(payload, ctx):
+    raise RuntimeError('boom')
+
+
+@jobs.job_handler('test_succeeding')
+def _succeeding_handler(payload, ctx):
+    return {'value': payload['value']}
+
+
+def _run_once(app, kind, payload, max_attempts=3):
+    job = jobs.enqueue_job(kind, payload, max_attempts=max_attempts)
+    job_id = jobs.claim_next_job('test-worker')
+    assert job_id == job.id
+    jobs.execute_job(app, job_id, 'test-worker')
+    jobs.db.session.expire_all()
+    return jobs.db.session.get(GenerationJob, job_id)
+
+
+def test_failed_job_is_requeued_with_backoff(app):
+    job = _run_once(app, 'test_failing', {})
+
+    assert job.status == 'queued'
+    assert job.attempts == 1
+    assert job.worker_id is None
+    assert job.error == 'boom'
+    assert job.available_at > job.updated_at
+
+
+def test_job_fails_after_last_attempt(app):
+    job = _run_once(app, 'test_failing', {}, max_attempts=1)
+
+    assert job.status == 'failed'
+    assert job.attempts == 1
+    assert job.finished_at is not None
+
+
+def test_completed_job_stores_result(app):
+    job = _run_once(app, 'test_succeeding', {'value': 42})
+
+    assert job.status == 'completed'
+    assert job.progress == 100
+    assert job.result == {'value': 42}
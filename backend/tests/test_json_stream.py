@@ -0,0 +1,44 @@
+from app.utils.json_stream import IncrementalArrayParser
+
+
+def _feed_all(parser, chunks):
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items
+
+
+def test_objects_split_across_chunks_are_emitted_when_complete():
+    parser = IncrementalArrayParser()
+
+    assert parser.feed('```json\n[{"sequence": 1, "desc') == []
+    assert parser.feed('ription": "a"}, {"sequence"') == [{'sequence': 1, 'description': 'a'}]
+    assert parser.feed(': 2, "camera": {"angle": "low"}}]\n```') == [{'sequence': 2, 'camera': {'angle': 'low'}}]
+    assert parser.finished
+
+
+def test_braces_and_brackets_inside_strings_are_ignored():
+    text = '[{"dialogue": "他说：\\"{不要走]\\"", "mood": "}["}, {"sequence": 2}]'
+    parser = IncrementalArrayParser()
+
+    items = _feed_all(parser, [text[i:i + 3] for i in range(0, len(text), 3)])
+
+    assert items == [{'dialogue': '他说："{不要走]"', 'mood': '}['}, {'sequence': 2}]
+    assert parser.finished
+
+
+def test_truncated_array_yields_complete_objects_and_stays_unfinished():
+    parser = IncrementalArrayParser()
+
+    items = _feed_all(parser, ['[{"sequence": 1}, ', '{"sequence": 2, "description": "未完'])
+
+    assert items == [{'sequence': 1}]
+    assert parser.started
+    assert not parser.finished
+
+
+def test_text_after_closing_bracket_is_ignored():
+    parser = IncrementalArrayParser()
+
+    assert parser.feed('说明文字 [{"a": 1}] 之后 [{"b": 2}]') == [{'a': 1}]
+    assert parser.feed('{"c": 3}') == []
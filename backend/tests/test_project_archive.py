@@ -0,0 +1,32 @@
+from app.models.comic import ComicImage
+from app.models.storyboard import Storyboard
+from app.services.image_store import get_image_store
+from app.services.project_archive import archive_pages
+from app.utils.query_budget import assert_max_queries
+
+
+def test_archive_pages_orders_storyboards_first_in_two_queries(db, project):
+    store = get_image_store()
+    images = [
+        ComicImage(project_id=project.id, prompt=f'p{index}', layer_order=index,
+                   image_url=store.url_for(f'panel-{index}.png'))
+        for index in range(4)
+    ]
+    images.append(ComicImage(project_id=project.id, prompt='mock', layer_order=9, image_url='https://example.com/x.png'))
+    db.session.add_all(images)
+    db.session.flush()
+    db.session.add_all([
+        Storyboard(project_id=project.id, sequence=1, description='a', dialogue='你好', mood='平静',
+                   comic_image_id=images[2].id),
+        Storyboard(project_id=project.id, sequence=2, description='b', comic_image_id=images[0].id),
+        Storyboard(project_id=project.id, sequence=3, description='c'),
+    ])
+    project_id = project.id
+    db.session.commit()
+
+    with assert_max_queries(2):
+        pages = archive_pages(project_id)
+
+    assert [page[0] for page in pages] == [images[2].id, images[0].id, images[1].id, images[3].id]
+    assert pages[0][2:] == ('你好', '平静')
+    assert pages[0][1] == store.relative_path('panel-2.png')
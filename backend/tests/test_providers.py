@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from app.services import providers
+from app.services.providers import ImageProvider, ProviderCancelled, ProviderError, ProviderRouter
+
+
+class StubProvider(ImageProvider):
+    def __init__(self, name, delay=0.0, error=None, available=True):
+        super().__init__()
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self._available = available
+        self.calls = 0
+        self.cancelled = threading.Event()
+
+    @property
+    def available(self):
+        return self._available
+
+    def generate(self, prompt, character_template=None, use_cache=True, cancel_event=None):
+        self.calls += 1
+        if cancel_event.wait(self.delay):
+            self.cancelled.set()
+            raise ProviderCancelled(self.name)
+        if self.error:
+            raise RuntimeError(self.error)
+        return {'task_id': f'{self.name}-1', 'image_url': f'/api/images/{self.name}.png'}
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(providers, 'IMAGE_HEDGE_DEFAULT_DELAY', 0.05)
+
+
+def test_hedge_wins_when_primary_is_slow():
+    slow, fast = StubProvider('slow', delay=5), StubProvider('fast')
+    router = ProviderRouter([slow, fast])
+
+    result = router.generate('prompt')
+
+    assert result['provider'] == 'fast'
+    assert router.hedged == 1
+    assert router.hedge_wins == 1
+    assert slow.cancelled.wait(1)
+
+
+def test_primary_wins_before_hedge_delay():
+    primary, backup = StubProvider('primary'), StubProvider('backup')
+    router = ProviderRouter([primary, backup])
+
+    result = router.generate('prompt')
+
+    assert result['provider'] == 'primary'
+    assert router.hedged == 0
+    assert backup.calls == 0
+
+
+def test_losing_uninterruptible_call_is_counted():
+    class Blocking(StubProvider):
+        def generate(self, prompt, character_template=None, use_cache=True, cancel_event=None):
+            time.sleep(self.delay)
+            return {'task_id': 'late', 'image_url': '/api/images/late.png'}
+
+    router = ProviderRouter([Blocking('blocking', delay=0.2), StubProvider('fast')])
+
+    assert router.generate('prompt')['provider'] == 'fast'
+    deadline = time.monotonic() + 2
+    while router.late_results == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert router.late_results == 1
+
+
+def test_fails_over_and_raises_when_all_providers_fail():
+    first, second = StubProvider('first', error='down'), StubProvider('second', error='quota')
+    router = ProviderRouter([first, second])
+
+    with pytest.raises(ProviderError) as excinfo:
+        router.generate('prompt')
+
+    assert 'first: down' in str(excinfo.value)
+    assert 'second: quota' in str(excinfo.value)
+    assert first.calls == second.calls == 1
+
+
+def test_raises_when_no_provider_is_available():
+    router = ProviderRouter([StubProvider('unconfigured', available=False)])
+
+    with pytest.raises(ProviderError):
+        router.generate('prompt')
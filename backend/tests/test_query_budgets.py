@@ -0,0 +1,140 @@
+"""
+逐个调用各蓝图的接口，断言整个请求 (包括流式响应体输出期间) 的查询数不超过接口声明的预算
+"""
+import io
+import uuid
+
+import pytest
+from PIL import Image
+
+from app.models.character import CharacterTemplate
+from app.models.comic import ComicImage
+from app.models.job import GenerationJob
+from app.models.storyboard import Storyboard
+from app.services.image_store import get_image_store
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (200, 40, 40)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def ids(db, user, project):
+    """项目下的角色、两张已保存的图片、分镜与一个已完成的批量生成任务"""
+    _, image_url = get_image_store().save(_png(), 'png', prefix='test-')
+    character = CharacterTemplate(name='主角', owner_id=user.id, features={}, reference_images=[])
+    images = [
+        ComicImage(project_id=project.id, prompt=f'p{index}', image_url=image_url, status='completed', layer_order=index)
+        for index in range(2)
+    ]
+    db.session.add(character)
+    db.session.add_all(images)
+    db.session.flush()
+    storyboard = Storyboard(project_id=project.id, sequence=1, description='开场', comic_image_id=images[0].id)
+    job = GenerationJob(
+        id=str(uuid.uuid4()), kind='generate_all', status='completed', progress=100,
+        user_id=user.id, project_id=project.id
+    )
+    db.session.add_all([storyboard, job])
+    db.session.commit()
+    return {
+        'project': project.id,
+        'character': character.id,
+        'image': images[0].id,
+        'other_image': images[1].id,
+        'job': job.id,
+        'image_path': image_url
+    }
+
+
+# (方法, 路径模板, 请求体, 期望状态码)；路径与请求体中的 {name} 由 ids 夹具填充
+CASES = [
+    # auth
+    ('POST', '/api/auth/register', {'username': 'carol', 'email': 'carol@example.com', 'password': 'pw'}, 201),
+    ('POST', '/api/auth/login', {'email': 'alice@example.com', 'password': 'password'}, 200),
+    ('GET', '/api/auth/me', None, 200),
+    # projects
+    ('GET', '/api/projects', None, 200),
+    ('GET', '/api/projects/dashboard?limit=5', None, 200),
+    ('POST', '/api/projects', {'name': '新项目'}, 201),
+    ('GET', '/api/projects/{project}', None, 200),
+    ('PUT', '/api/projects/{project}', {'name': '改名'}, 200),
+    ('DELETE', '/api/projects/{project}', None, 200),
+    ('GET', '/api/projects/{project}/export?format=png', None, 200),
+    ('GET', '/api/projects/{project}/export.cbz', None, 200),
+    # characters
+    ('GET', '/api/characters', None, 200),
+    ('POST', '/api/characters', {'name': '配角'}, 201),
+    ('GET', '/api/characters/{character}', None, 200),
+    ('PUT', '/api/characters/{character}', {'description': '新的描述'}, 200),
+    ('DELETE', '/api/characters/{character}', None, 200),
+    # comics
+    ('POST', '/api/comics', {'project_id': '{project}', 'prompt': '新画面'}, 201),
+    ('GET', '/api/comics/{image}', None, 200),
+    ('GET', '/api/comics/{image}/derivatives', None, 200),
+    ('GET', '/api/comics/project/{project}', None, 200),
+    ('GET', '/api/comics/project/{project}?limit=1', None, 200),
+    ('GET', '/api/comics/project/{project}?fields=id,image_url,thumbnail_url', None, 200),
+    ('PUT', '/api/comics/{image}', {'position_x': 20, 'layer_order': 3}, 200),
+    ('DELETE', '/api/comics/{other_image}', None, 200),
+    ('PATCH', '/api/comics/project/{project}/layout', {'changes': [{'id': '{image}', 'position_y': 5}]}, 200),
+    ('POST', '/api/comics/reorder', {
+        'project_id': '{project}', 'image_orders': [{'image_id': '{image}', 'order': 1}]
+    }, 200),
+    ('POST', '/api/comics/generate', {'prompt': '一只猫', 'project_id': '{project}'}, 202),
+    ('GET', '/api/comics/status/{job}', None, 200),
+    ('GET', '/api/comics/cache/stats', None, 200),
+    ('GET', '/api/comics/transport/stats', None, 200),
+    ('GET', '/api/comics/ratelimit/stats', None, 200),
+    ('GET', '/api/comics/providers/stats', None, 200),
+    # stories (分析接口依赖上游模型，只验证参数校验路径)
+    ('POST', '/api/stories/analyze', {'story_text': ''}, 400),
+    ('POST', '/api/stories/analyze/stream', {'story_text': ''}, 400),
+    ('POST', '/api/stories/save', {
+        'project_id': '{project}', 'scenes': [{'sequence': 1, 'description': '开场'}, {'sequence': 2, 'description': '结尾'}]
+    }, 200),
+    ('POST', '/api/stories/generate_all', {'project_id': '{project}'}, 202),
+    ('GET', '/api/stories/generate_all/{job}/events', None, 200),
+    ('GET', '/api/stories/list/{project}', None, 200),
+    # images
+    ('GET', '{image_path}', None, 200),
+]
+
+
+def _fill(value, ids):
+    """把请求体中的 '{name}' 占位替换为 ids 中的值 (保持原类型)"""
+    if isinstance(value, dict):
+        return {key: _fill(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, ids) for item in value]
+    if isinstance(value, str) and value.startswith('{') and value.endswith('}'):
+        return ids[value[1:-1]]
+    return value
+
+
+@pytest.mark.parametrize('method, path, body, status', CASES, ids=[f'{case[0]} {case[1]}' for case in CASES])
+def test_route_within_query_budget(call_within_budget, auth_headers, ids, method, path, body, status):
+    kwargs = {'headers': auth_headers}
+    if body is not None:
+        kwargs['json'] = _fill(body, ids)
+
+    response = call_within_budget(method, path.format(**ids), **kwargs)
+
+    assert response.status_code == status, response.get_data(as_text=True)
+
+
+def test_streamed_project_comics_are_counted(call_within_budget, auth_headers, ids):
+    response = call_within_budget('GET', f"/api/comics/project/{ids['project']}", headers=auth_headers)
+
+    assert [item['id'] for item in response.get_json()] == [ids['image'], ids['other_image']]
+    assert response.query_count > 0
+
+
+def test_generate_all_events_stream_ends_for_finished_job(call_within_budget, auth_headers, ids):
+    response = call_within_budget('GET', f"/api/stories/generate_all/{ids['job']}/events", headers=auth_headers)
+
+    body = response.get_data(as_text=True)
+    assert 'event: snapshot' in body
+    assert 'event: done' in body
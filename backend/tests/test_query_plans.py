@@ -0,0 +1,21 @@
+import pytest
+from sqlalchemy import select
+
+from app.models.comic import ComicImage
+from app.utils.query_plans import explain_statement, hot_queries
+
+HOT_QUERIES = hot_queries()
+
+
+@pytest.mark.parametrize('statement', [statement for _, statement in HOT_QUERIES],
+                         ids=[name for name, _ in HOT_QUERIES])
+def test_hot_query_uses_an_index(db, statement):
+    plan, full_scans = explain_statement(statement)
+
+    assert not full_scans, '\n'.join(plan)
+
+
+def test_detects_full_table_scan(db):
+    _, full_scans = explain_statement(select(ComicImage).where(ComicImage.prompt == 'x'))
+
+    assert full_scans == ['comic_images']
@@ -0,0 +1,56 @@
+import pytest
+
+from app.services import rate_limit
+from app.services.rate_limit import AdaptiveConcurrency, RateLimitTimeout, TokenBucket
+
+
+class UpstreamError(Exception):
+    def __init__(self, code):
+        super().__init__(f'upstream {code}')
+        self.code = code
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    bucket = TokenBucket('test', per_minute=60, capacity=1)
+    limiter = AdaptiveConcurrency('test', max_limit=4)
+    monkeypatch.setitem(rate_limit._buckets, 'test', bucket)
+    monkeypatch.setitem(rate_limit._concurrency, 'test', limiter)
+    return bucket, limiter
+
+
+def test_slot_timeout_does_not_consume_token(limits, monkeypatch):
+    bucket, limiter = limits
+
+    def slots_full(timeout=None):
+        raise RateLimitTimeout('test 并发已满')
+
+    monkeypatch.setattr(limiter, 'acquire', slots_full)
+
+    with pytest.raises(RateLimitTimeout):
+        with rate_limit.rate_limited('test'):
+            pass
+
+    assert bucket._tokens == 1
+
+
+def test_server_error_does_not_halve_concurrency(limits):
+    _, limiter = limits
+
+    with pytest.raises(UpstreamError):
+        with rate_limit.rate_limited('test'):
+            raise UpstreamError(503)
+
+    assert limiter.limit == 4
+    assert limiter.inflight == 0
+
+
+def test_throttled_call_halves_concurrency(limits):
+    _, limiter = limits
+
+    with pytest.raises(UpstreamError):
+        with rate_limit.rate_limited('test'):
+            raise UpstreamError(429)
+
+    assert limiter.limit == 2
+    assert limiter.failures == 1
@@ -0,0 +1,88 @@
+"""
+只读副本路由：主库与副本为两个 SQLite 文件，@read_replica 接口从副本读取，写入进入主库
+"""
+import pytest
+from flask import g
+from sqlalchemy import insert, select
+
+from app import create_app, db as _db
+from app.models.project import Project
+from app.models.user import User
+from app.utils import db_profiles
+
+
+@pytest.fixture
+def replica_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(db_profiles, 'DATABASE_REPLICA_URL', f"sqlite:///{tmp_path / 'replica.db'}")
+    app = create_app('development')
+    app.config['TESTING'] = True
+    with app.app_context():
+        _db.create_all()
+        replica = _db.engines[db_profiles.REPLICA_BIND_KEY]
+        _db.metadata.create_all(replica)
+        yield app
+        _db.session.remove()
+        for engine in _db.engines.values():
+            engine.dispose()
+    # init_app 为副本创建的空 MetaData 留在全局 db 上，会让其他测试的 create_all 查找副本引擎
+    _db.metadatas.pop(db_profiles.REPLICA_BIND_KEY, None)
+
+
+@pytest.fixture
+def replica_user(replica_app):
+    """主库与副本中同一用户，名下项目名称不同，便于区分读取来源"""
+    user = User(username='alice', email='alice@example.com')
+    user.set_password('password')
+    _db.session.add(user)
+    _db.session.flush()
+    _db.session.add(Project(name='主库项目', owner_id=user.id))
+    _db.session.commit()
+
+    with _db.engines[db_profiles.REPLICA_BIND_KEY].begin() as conn:
+        conn.execute(insert(User.__table__).values(
+            id=user.id, username=user.username, email=user.email, password_hash=user.password_hash
+        ))
+        conn.execute(insert(Project.__table__).values(name='副本项目', owner_id=user.id))
+    return user
+
+
+def _project_names(engine):
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(Project.name)).scalars())
+
+
+def test_session_routes_reads_to_replica_only_when_marked(replica_app):
+    replica = _db.engines[db_profiles.REPLICA_BIND_KEY]
+    with replica_app.test_request_context():
+        assert _db.session.get_bind() is _db.engine
+        g.use_read_replica = True
+        assert _db.session.get_bind() is replica
+        assert _db.session.get_bind(clause=insert(Project.__table__)) is _db.engine
+
+
+def test_get_reads_replica_and_post_writes_primary(replica_app, replica_user):
+    client = replica_app.test_client()
+    headers = {'Authorization': f'Bearer {replica_user.generate_token()}'}
+
+    response = client.get('/api/projects', headers=headers)
+    assert response.status_code == 200
+    assert [project['name'] for project in response.get_json()] == ['副本项目']
+
+    response = client.post('/api/projects', headers=headers, json={'name': '新项目'})
+    assert response.status_code == 201
+    assert _project_names(_db.engine) == ['主库项目', '新项目']
+    assert _project_names(_db.engines[db_profiles.REPLICA_BIND_KEY]) == ['副本项目']
+
+
+def test_dashboard_cursor_on_replica(replica_app, replica_user):
+    client = replica_app.test_client()
+    headers = {'Authorization': f'Bearer {replica_user.generate_token()}'}
+    with _db.engines[db_profiles.REPLICA_BIND_KEY].begin() as conn:
+        conn.execute(insert(Project.__table__).values(name='副本项目 2', owner_id=replica_user.id))
+
+    first = client.get('/api/projects/dashboard?limit=1', headers=headers).get_json()
+    second = client.get(f"/api/projects/dashboard?limit=1&cursor={first['next_cursor']}", headers=headers).get_json()
+
+    names = [project['name'] for page in (first, second) for project in page['projects']]
+    assert sorted(names) == ['副本项目', '副本项目 2']
@@ -0,0 +1,39 @@
+import pytest
+
+from app.models.comic import ComicImage
+from app.models.storyboard import Storyboard
+from app.utils.serializers import declared_fields, parse_fields, serializer_for
+
+
+def test_parse_fields_dedupes_and_uses_declared_order():
+    assert parse_fields(ComicImage, ' thumbnail_url,id ,image_url,id,') == ('id', 'image_url', 'thumbnail_url')
+
+
+def test_parse_fields_empty_means_default():
+    assert parse_fields(ComicImage, None) is None
+    assert parse_fields(ComicImage, ' , ') is None
+
+
+def test_parse_fields_rejects_undeclared_fields():
+    with pytest.raises(KeyError) as excinfo:
+        parse_fields(ComicImage, 'id,__class__,secret')
+
+    assert excinfo.value.args[0] == '__class__, secret'
+
+
+def test_same_field_set_shares_one_cached_serializer(app):
+    first = serializer_for(ComicImage, parse_fields(ComicImage, 'image_url,id'))
+    second = serializer_for(ComicImage, parse_fields(ComicImage, 'id,image_url,id'))
+
+    assert first is second
+
+
+def test_storyboard_declares_every_default_field(app):
+    assert set(Storyboard.DEFAULT_FIELDS) <= set(declared_fields(Storyboard))
+
+
+def test_project_comics_rejects_unknown_fields(client, auth_headers, project):
+    response = client.get(f'/api/comics/project/{project.id}?fields=id,bogus', headers=auth_headers)
+
+    assert response.status_code == 400
+    assert 'bogus' in response.get_json()['error']
@@ -0,0 +1,99 @@
+import pytest
+
+from app.models.comic import ComicImage
+from app.models.storyboard import Storyboard
+from app.services.storyboard_sync import sync_storyboards
+
+
+def _scene(sequence, description, dialogue=None):
+    return {'sequence': sequence, 'description': description, 'camera': '中景', 'dialogue': dialogue, 'mood': '平静'}
+
+
+def _rows(db, project_id):
+    """[(序号, 分镜 ID, 画面描述, 对话, 图片 ID)]，直接读取数据库，不经过会话缓存"""
+    return [tuple(row) for row in db.session.query(
+        Storyboard.sequence, Storyboard.id, Storyboard.description, Storyboard.dialogue, Storyboard.comic_image_id
+    ).filter(Storyboard.project_id == project_id).order_by(Storyboard.sequence)]
+
+
+@pytest.fixture
+def storyboards(db, project):
+    """三个已出图的分镜 A/B/C，返回 {画面描述: (分镜 ID, 图片 ID)}"""
+    result = {}
+    for sequence, description in enumerate('ABC', start=1):
+        image = ComicImage(project_id=project.id, prompt=description, image_url=f'/api/images/{description}.png')
+        db.session.add(image)
+        db.session.flush()
+        storyboard = Storyboard(project_id=project.id, comic_image_id=image.id, **_scene(sequence, description))
+        db.session.add(storyboard)
+        db.session.flush()
+        result[description] = (storyboard.id, image.id)
+    db.session.commit()
+    return result
+
+
+def test_unchanged_scenes_write_nothing(db, project, storyboards):
+    before = _rows(db, project.id)
+
+    result = sync_storyboards(project.id, [_scene(1, 'A'), _scene(2, 'B'), _scene(3, 'C')])
+
+    assert result == {'changed': [], 'deleted': [], 'unchanged': 3}
+    assert _rows(db, project.id) == before
+
+
+def test_insert_in_middle_shifts_sequences_and_keeps_images(db, project, storyboards):
+    result = sync_storyboards(project.id, [_scene(1, 'A'), _scene(2, 'N'), _scene(3, 'B'), _scene(4, 'C')])
+
+    assert result['unchanged'] == 1
+    assert result['deleted'] == []
+    assert [item['sequence'] for item in result['changed']] == [2, 3, 4]
+    rows = _rows(db, project.id)
+    assert [row[2] for row in rows] == ['A', 'N', 'B', 'C']
+    assert rows[1][4] is None
+    assert (rows[2][1], rows[2][4]) == storyboards['B']
+    assert (rows[3][1], rows[3][4]) == storyboards['C']
+
+
+def test_delete_removes_row_and_shifts_following(db, project, storyboards):
+    result = sync_storyboards(project.id, [_scene(1, 'A'), _scene(2, 'C')])
+
+    assert result['deleted'] == [storyboards['B'][0]]
+    rows = _rows(db, project.id)
+    assert [(row[0], row[2]) for row in rows] == [(1, 'A'), (2, 'C')]
+    assert (rows[1][1], rows[1][4]) == storyboards['C']
+
+
+def test_reorder_moves_rows_with_their_images(db, project, storyboards):
+    result = sync_storyboards(project.id, [_scene(1, 'B'), _scene(2, 'A'), _scene(3, 'C')])
+
+    assert result['unchanged'] == 1
+    assert result['deleted'] == []
+    rows = _rows(db, project.id)
+    assert [(row[2], (row[1], row[4])) for row in rows] == [
+        ('B', storyboards['B']), ('A', storyboards['A']), ('C', storyboards['C'])
+    ]
+
+
+def test_dialogue_edit_keeps_image_but_description_edit_clears_it(db, project, storyboards):
+    sync_storyboards(project.id, [_scene(1, 'A', dialogue='你好'), _scene(2, 'B2'), _scene(3, 'C')])
+
+    rows = _rows(db, project.id)
+    assert rows[0][1:] == (storyboards['A'][0], 'A', '你好', storyboards['A'][1])
+    assert rows[1][1:] == (storyboards['B'][0], 'B2', None, None)
+    assert (rows[2][1], rows[2][4]) == storyboards['C']
+
+
+@pytest.mark.parametrize('scenes', [
+    [_scene(1, 'A'), _scene(1, 'B')],
+    [{'sequence': 1, 'camera': '中景'}],
+    [{'description': 'A'}],
+    {'sequence': 1, 'description': 'A'},
+])
+def test_save_rejects_invalid_scenes(client, db, auth_headers, project, storyboards, scenes):
+    before = _rows(db, project.id)
+
+    response = client.post('/api/stories/save', headers=auth_headers, json={'project_id': project.id, 'scenes': scenes})
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert _rows(db, project.id) == before
@@ -3,7 +3,7 @@ import { useParams } from 'react-router-dom';
 import { useSelector, useDispatch } from 'react-redux';
 import { 
   fetchProjectComics,
-  updateComicImage,
+  saveLayout,
   selectLayers,
   selectSelectedLayer,
   selectCurrentTool,
@@ -16,6 +16,9 @@ import LayerPanel from './LayerPanel';
 import CharacterPanel from './CharacterPanel';
 import ScriptPanel from './ScriptPanel';
 
+// 拖拽结束后合并保存的等待时间 (毫秒)
+const LAYOUT_SAVE_DELAY = 800;
+
 const ComicEditor = () => {
   const { projectId } = useParams();
   const dispatch = useDispatch();
@@ -24,6 +27,10 @@ const ComicEditor = () => {
   const currentTool = useSelector(selectCurrentTool);
   const canvasRef = useRef(null);
 
+  // 待保存的布局修改: 图层 ID -> 修改，延迟后以一次批量请求提交
+  const pendingLayout = useRef(new Map());
+  const layoutTimer = useRef(null);
+
   // 侧边栏状态：'layers', 'characters', 'script'
   const [activePanel, setActivePanel] = useState('layers');
 
@@ -37,6 +44,25 @@ const ComicEditor = () => {
     }
   }, [dispatch, projectId]);
 
+  const flushLayout = () => {
+    clearTimeout(layoutTimer.current);
+    layoutTimer.current = null;
+    if (pendingLayout.current.size === 0) return;
+    const changes = Array.from(pendingLayout.current.values());
+    pendingLayout.current = new Map();
+    dispatch(saveLayout({ projectId, changes }));
+  };
+
+  // 离开编辑器前提交尚未保存的修改
+  useEffect(() => flushLayout, [projectId]); // eslint-disable-line react-hooks/exhaustive-deps
+
+  const queueLayoutChange = (change) => {
+    const previous = pendingLayout.current.get(change.id) || {};
+    pendingLayout.current.set(change.id, { ...previous, ...change });
+    clearTimeout(layoutTimer.current);
+    layoutTimer.current = setTimeout(flushLayout, LAYOUT_SAVE_DELAY);
+  };
+
   const handleLayerSelect = (layer, e) => {
     if (e) e.stopPropagation();
     dispatch(setSelectedLayer(layer));
@@ -85,14 +111,14 @@ const ComicEditor = () => {
   const handleMouseUp = (e) => {
     if (!isDragging || !dragStart.layerId) return;
 
-    // 拖拽结束，发送请求保存到后端
+    // 拖拽结束，合并到待保存的批量修改中
     const layer = layers.find(l => l.id === dragStart.layerId);
     if (layer) {
-      dispatch(updateComicImage({
+      queueLayoutChange({
         id: layer.id,
-        position_x: layer.position_x,
-        position_y: layer.position_y
-      }));
+        position_x: Math.round(layer.position_x),
+        position_y: Math.round(layer.position_y)
+      });
     }
 
     setIsDragging(false);
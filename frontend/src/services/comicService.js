@@ -1,8 +1,10 @@
 import apiClient from '../utils/apiClient';
 
 const comicService = {
-  getProjectComics: async (projectId) => {
-    const response = await apiClient.get(`/comics/project/${projectId}`);
+  // params: { fields: 'id,position_x,position_y,thumbnail_url', limit, cursor }
+  // 分页时下一页游标在响应头 X-Next-Cursor 中
+  getProjectComics: async (projectId, params) => {
+    const response = await apiClient.get(`/comics/project/${projectId}`, { params });
     return response.data;
   },
 
@@ -33,6 +35,12 @@ const comicService = {
     return response.data;
   },
 
+  // 批量修改位置、尺寸与图层顺序: changes = [{ id, position_x, position_y, width, height, layer_order }]
+  patchLayout: async (projectId, changes) => {
+    const response = await apiClient.patch(`/comics/project/${projectId}/layout`, { changes });
+    return response.data;
+  },
+
   generateImage: async (comicData) => {
     const response = await apiClient.post('/comics/generate', comicData);
     return response.data;
@@ -6,6 +6,12 @@ const projectService = {
     return response.data;
   },
 
+  // 自己拥有及参与协作的项目，游标分页：返回 { projects, next_cursor }
+  getDashboard: async ({ cursor, limit } = {}) => {
+    const response = await apiClient.get('/projects/dashboard', { params: { cursor, limit } });
+    return response.data;
+  },
+
   getProject: async (projectId) => {
     const response = await apiClient.get(`/projects/${projectId}`);
     return response.data;
@@ -1,22 +1,107 @@
 import apiClient from '../utils/apiClient';
 
+const API_BASE_URL = process.env.REACT_APP_API_URL || '/api';
+
+// 解析一段 SSE 文本块，返回 { event, data }
+const parseSSEBlock = (block) => {
+  let event = 'message';
+  const dataLines = [];
+  block.split('\n').forEach((line) => {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice(5).trim());
+    }
+  });
+  return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+};
+
+// 发起请求并逐条读取 SSE 事件；onEvent 返回 true 时停止读取
+const streamSSE = async (path, options, onEvent) => {
+  const token = localStorage.getItem('token');
+  const response = await fetch(`${API_BASE_URL}${path}`, {
+    ...options,
+    headers: {
+      'Content-Type': 'application/json',
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`请求失败 (${response.status})`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const { event, data } = parseSSEBlock(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+      if (data !== null && onEvent(event, data)) {
+        reader.cancel();
+        return;
+      }
+      boundary = buffer.indexOf('\n\n');
+    }
+  }
+};
+
 const storyService = {
   analyzeStory: async (storyText) => {
     const response = await apiClient.post('/stories/analyze', { story_text: storyText });
     return response.data;
   },
 
+  // 流式分析：每收到一个分镜就回调 onScene，结束后返回完整列表
+  analyzeStoryStream: async (storyText, onScene) => {
+    const scenes = [];
+    await streamSSE('/stories/analyze/stream', {
+      method: 'POST',
+      body: JSON.stringify({ story_text: storyText }),
+    }, (event, data) => {
+      if (event === 'scene') {
+        scenes.push(data);
+        onScene(data);
+      } else if (event === 'error') {
+        throw new Error(data.error || '分析故事失败');
+      }
+      return event === 'done';
+    });
+    return { scenes };
+  },
+
   saveStoryboards: async (projectId, scenes) => {
-    const response = await apiClient.post('/stories/save', { 
+    const response = await apiClient.post('/stories/save', {
       project_id: projectId,
-      scenes 
+      scenes
     });
     return response.data;
   },
 
-  generateAllImages: async (projectId) => {
+  // 提交批量生成任务，并通过服务端推送逐个接收完成的分镜图片
+  generateAllImages: async (projectId, onPanel = () => {}) => {
     const response = await apiClient.post('/stories/generate_all', { project_id: projectId });
-    return response.data;
+    let job = response.data;
+
+    await streamSSE(`/stories/generate_all/${job.task_id}/events`, { method: 'GET' }, (event, data) => {
+      if (event === 'panel') {
+        onPanel(data);
+      } else if (event === 'snapshot' || event === 'done') {
+        job = data;
+      }
+      return event === 'done';
+    });
+
+    if (job.status === 'failed') {
+      throw new Error(job.error || '批量生成失败');
+    }
+    return { ...job.result, task_id: job.task_id };
   },
 
   fetchStoryboards: async (projectId) => {
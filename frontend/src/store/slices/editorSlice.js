@@ -62,6 +62,17 @@ export const reorderComicImages = createAsyncThunk(
   }
 );
 
+export const saveLayout = createAsyncThunk(
+  'editor/saveLayout',
+  async ({ projectId, changes }, { rejectWithValue }) => {
+    try {
+      return await comicService.patchLayout(projectId, changes);
+    } catch (error) {
+      return rejectWithValue(error.response?.data?.error || '保存布局失败');
+    }
+  }
+);
+
 export const generateImage = createAsyncThunk(
   'editor/generateImage',
   async (comicData, { rejectWithValue }) => {
@@ -202,6 +213,10 @@ const editorSlice = createSlice({
       .addCase(reorderComicImages.rejected, (state, action) => {
         state.error = action.payload;
       })
+      // 批量保存布局 (本地状态在拖拽时已更新)
+      .addCase(saveLayout.rejected, (state, action) => {
+        state.error = action.payload;
+      })
       // 生成图片
       .addCase(generateImage.pending, (state) => {
         state.generating = true;
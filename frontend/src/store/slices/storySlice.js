@@ -4,12 +4,20 @@ import storyService from '../../services/storyService';
 // 1. 内容理解与分镜生成
 export const analyzeStory = createAsyncThunk(
   'story/analyze',
-  async (storyText, { rejectWithValue }) => {
+  async (storyText, { dispatch, rejectWithValue }) => {
     try {
-      const data = await storyService.analyzeStory(storyText);
+      // 流式接收分镜，第一个分镜到达即可开始编辑
+      const data = await storyService.analyzeStoryStream(storyText, (scene) => {
+        dispatch(storySlice.actions.appendScene(scene));
+      });
       return data.scenes;
-    } catch (error) {
-      return rejectWithValue(error.response?.data?.error || '分析故事失败');
+    } catch (streamError) {
+      try {
+        const data = await storyService.analyzeStory(storyText);
+        return data.scenes;
+      } catch (error) {
+        return rejectWithValue(error.response?.data?.error || '分析故事失败');
+      }
     }
   }
 );
@@ -30,12 +38,21 @@ export const saveStoryboards = createAsyncThunk(
 // 3. 批量生成图片
 export const generateAllImages = createAsyncThunk(
   'story/generateAll',
-  async (projectId, { rejectWithValue }) => {
+  async (projectId, { dispatch, rejectWithValue }) => {
     try {
-      const data = await storyService.generateAllImages(projectId);
+      // 每个分镜完成后立即填充图片
+      const data = await storyService.generateAllImages(projectId, (panel) => {
+        if (panel.image) {
+          dispatch(storySlice.actions.setSceneImage({
+            sequence: panel.sequence,
+            image_url: panel.image.image_url,
+            comic_image_id: panel.image.id,
+          }));
+        }
+      });
       return data.images;
     } catch (error) {
-      return rejectWithValue(error.response?.data?.error || '批量生成失败');
+      return rejectWithValue(error.response?.data?.error || error.message || '批量生成失败');
     }
   }
 );
@@ -69,6 +86,18 @@ const storySlice = createSlice({
       const { index, field, value } = action.payload;
       state.scenes[index][field] = value;
     },
+    appendScene: (state, action) => {
+      state.scenes.push(action.payload);
+      state.activeStep = 1;
+    },
+    setSceneImage: (state, action) => {
+      const { sequence, image_url, comic_image_id } = action.payload;
+      const scene = state.scenes.find((s) => s.sequence === sequence);
+      if (scene) {
+        scene.image_url = image_url;
+        scene.comic_image_id = comic_image_id;
+      }
+    },
     setActiveStep: (state, action) => {
       state.activeStep = action.payload;
     },
@@ -82,6 +111,7 @@ const storySlice = createSlice({
       .addCase(analyzeStory.pending, (state) => {
         state.analyzing = true;
         state.error = null;
+        state.scenes = [];
       })
       .addCase(analyzeStory.fulfilled, (state, action) => {
         state.analyzing = false;
@@ -127,7 +157,7 @@ const storySlice = createSlice({
   },
 });
 
-export const { updateScene, setActiveStep, resetStory } = storySlice.actions;
+export const { updateScene, appendScene, setSceneImage, setActiveStep, resetStory } = storySlice.actions;
 
 export const selectStoryScenes = (state) => state.story.scenes;
 export const selectStoryStatus = (state) => ({